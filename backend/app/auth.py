@@ -4,10 +4,13 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from sqlalchemy import exc as sa_exc
 from sqlalchemy.orm import Session
 import os
 
 from . import schemas, models, database
+from .cache import response_cache, USERS_NAMESPACE
+from .principal_cache import principal_cache
 
 # Config
 SECRET_KEY = os.getenv("JWT_SECRET")
@@ -37,40 +40,35 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)):
+# 以下两个依赖故意写成同步函数：FastAPI 会把它们放到线程池里执行，
+# 缓存未命中时按 email 查用户的同步查询不会阻塞事件循环（async 接口也能放心依赖它们）。
+# 返回的 User 属于本次请求的 get_db 会话，同步接口可以直接修改并 commit。
+# token 解码结果和用户快照由 principal_cache 缓存，命中时不查库（见 principal_cache.py）。
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-    except JWTError:
+    email = principal_cache.subject(token, SECRET_KEY, ALGORITHM)
+    if email is None:
         raise credentials_exception
     
-    user = db.query(models.User).filter(models.User.email == email).first()
+    user = principal_cache.load_user(db, email)
     if user is None:
         raise credentials_exception
     return user
 
 oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="/api/auth/login", auto_error=False)
 
-async def get_current_user_optional(token: Optional[str] = Depends(oauth2_scheme_optional), db: Session = Depends(database.get_db)):
+def get_current_user_optional(token: Optional[str] = Depends(oauth2_scheme_optional), db: Session = Depends(database.get_db)):
     if not token:
         return None
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            return None
-    except JWTError:
+    email = principal_cache.subject(token, SECRET_KEY, ALGORITHM)
+    if email is None:
         return None
     
-    user = db.query(models.User).filter(models.User.email == email).first()
-    return user
+    return principal_cache.load_user(db, email)
 
 @router.post("/register", response_model=schemas.UserOut, status_code=status.HTTP_201_CREATED)
 def register(user: schemas.UserCreate, db: Session = Depends(database.get_db)):
@@ -116,8 +114,8 @@ def register(user: schemas.UserCreate, db: Session = Depends(database.get_db)):
         logger.info(f"User registered successfully: {user.email}")
         return new_user
         
-    except HTTPException:
-        # Re-raise HTTP exceptions (validation errors, etc.)
+    except (HTTPException, sa_exc.TimeoutError):
+        # Re-raise HTTP exceptions (validation errors, etc.) and pool exhaustion (503)
         raise
     except Exception as e:
         # Rollback transaction on error
@@ -189,6 +187,9 @@ def update_me(
 
     db.add(current_user)
     db.commit()
+    # 帖子/商品响应里内嵌了作者信息
+    response_cache.invalidate(USERS_NAMESPACE)
+    principal_cache.invalidate(current_user.email)
     db.refresh(current_user)
     return current_user
 
@@ -203,4 +204,5 @@ def change_password(
     
     current_user.password_hash = get_password_hash(password_data.new_password)
     db.commit()
+    principal_cache.invalidate(current_user.email)
     return {"message": "Password updated successfully"}
@@ -2,12 +2,17 @@ from typing import List
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from . import schemas, models, database, auth
+from .cache import response_cache
 
 router = APIRouter(prefix="/api/badges", tags=["badges"])
 
 @router.get("/", response_model=List[schemas.BadgeOut])
 def get_all_badges(db: Session = Depends(database.get_db)):
-    return db.query(models.Badge).all()
+    # Badge definitions only change on deploy (init_badges_data), so they are always cacheable
+    return response_cache.get_or_load("badges", "all", lambda: [
+        schemas.BadgeOut.model_validate(b).model_dump(mode="json")
+        for b in db.query(models.Badge).all()
+    ])
 
 @router.get("/me", response_model=List[schemas.UserBadgeOut])
 def get_my_badges(
@@ -0,0 +1,223 @@
+"""
+缓存层 - 进程内 LRU+TTL（一级）+ 可选 Redis（二级）
+
+公开读接口（匿名访问的帖子列表/详情、商品列表、徽章列表）的响应结果按命名空间缓存。
+失效采用版本号方式：每个命名空间有一个版本号，缓存键里带上版本号，
+写操作只需把版本号 +1，旧键自然失效（随 TTL/LRU 淘汰），不需要逐个删除。
+命名空间划分：
+- "posts" / "items"：列表页
+- "post:{id}" / "item:{id}"：单条详情，点赞、评论等只影响这一条和列表页
+- "users"：响应里内嵌的作者/卖家信息，用户资料变更、删除用户时失效，列表和详情都依赖它
+Redis 启用时版本号保存在 Redis 中，所有 worker 共享，进程内再缓存 CACHE_VERSION_TTL_SECONDS 秒，
+避免每次读取都访问 Redis（其他 worker 的失效最多晚这么久可见）；未启用时退化为仅进程内缓存。
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+import redis
+
+# Redis connection - optional
+# Redis is disabled by default. Set REDIS_ENABLED=true to enable it.
+REDIS_ENABLED = os.getenv("REDIS_ENABLED", "false").lower() == "true"
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+redis_available = False
+r = None
+
+if REDIS_ENABLED:
+    try:
+        r = redis.from_url(REDIS_URL, socket_connect_timeout=1, socket_timeout=1, decode_responses=False)
+        r.ping()
+        redis_available = True
+        print("Redis connected successfully (cache)")
+    except Exception as e:
+        # Silently fail - Redis is optional
+        redis_available = False
+        r = None
+        print(f"Redis connection failed (optional, cache): {e}")
+
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", 30))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 1024))
+CACHE_VERSION_TTL_SECONDS = float(os.getenv("CACHE_VERSION_TTL_SECONDS", 1))
+
+_MISSING = object()
+
+
+class LRUCache:
+    """线程安全的进程内 LRU 缓存，每个条目带过期时间"""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int, ttl: int, version_ttl: float = 1):
+        self.ttl = ttl
+        self.local = LRUCache(max_entries, ttl)
+        self._local_versions: Dict[str, int] = {}
+        # Redis 版本号的进程内副本，过期后再从 Redis 读取
+        self._versions = LRUCache(max_entries, version_ttl)
+        self._lock = threading.Lock()
+        # 仅有进程内版本号时，重启或换一个 worker 后版本号会从 0 重新计数
+        self._epoch = uuid.uuid4().hex[:8]
+        self.stats = {"local_hits": 0, "redis_hits": 0, "misses": 0, "invalidations": 0, "redis_errors": 0}
+
+    def _count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _version_tag(self, namespaces: Iterable[str]) -> str:
+        """取多个命名空间的版本号，拼成缓存键的一部分；Redis 上的版本号一次 MGET 取回"""
+        namespaces = list(namespaces)
+        if not (redis_available and r):
+            return ".".join(str(self._local_versions.get(ns, 0)) for ns in namespaces)
+
+        versions = {ns: self._versions.get(ns) for ns in namespaces}
+        missing = [ns for ns, v in versions.items() if v is None]
+        if missing:
+            try:
+                values = r.mget([f"cache_version:{ns}" for ns in missing])
+                for ns, value in zip(missing, values):
+                    versions[ns] = int(value) if value else 0
+                    self._versions.set(ns, versions[ns])
+            except Exception:
+                self._count("redis_errors")
+                for ns in missing:
+                    versions[ns] = self._local_versions.get(ns, 0)
+        return ".".join(str(versions[ns]) for ns in namespaces)
+
+    def version_tag(self, *namespaces: str) -> str:
+        """
+        命名空间的当前版本，供 ETag 使用，任一命名空间失效后都会变化。
+        没有 Redis 时各 worker 只看得到自己的失效，因此带上进程标识，并每 ttl 秒轮换一次，
+        过期程度和缓存的响应体相同。
+        """
+        tag = self._version_tag(namespaces)
+        if redis_available and r:
+            return tag
+        return f"{self._epoch}.{int(time.time() // max(self.ttl, 1))}.{tag}"
+
+    def invalidate(self, *namespaces: str):
+        """写操作后调用：版本号 +1，该命名空间下的旧缓存全部失效"""
+        for namespace in namespaces:
+            with self._lock:
+                self._local_versions[namespace] = self._local_versions.get(namespace, 0) + 1
+            if redis_available and r:
+                try:
+                    # 本进程立即看到新版本，其他 worker 在版本号副本过期后看到
+                    self._versions.set(namespace, r.incr(f"cache_version:{namespace}"))
+                except Exception:
+                    self._versions.delete(namespace)
+                    self._count("redis_errors")
+            self._count("invalidations")
+
+    def get_or_load(
+        self,
+        namespace: str,
+        key: str,
+        loader: Callable[[], Any],
+        depends: Iterable[str] = (),
+        refresh: bool = False,
+    ) -> Any:
+        """
+        先查进程内缓存，再查 Redis，都未命中时调用 loader 并回填两级缓存。
+        depends 里的命名空间失效时这条缓存也随之失效。
+        refresh=True 时跳过查找，直接调用 loader 并覆盖缓存。
+        loader 的返回值必须可以 JSON 序列化。
+        """
+        if not CACHE_ENABLED:
+            return loader()
+
+        full_key = f"cache:{namespace}:v{self._version_tag([namespace, *depends])}:{key}"
+
+        value = _MISSING if refresh else self.local.get(full_key, _MISSING)
+        if value is not _MISSING:
+            self._count("local_hits")
+            return value
+
+        if redis_available and r and not refresh:
+            try:
+                raw = r.get(full_key)
+                if raw is not None:
+                    value = json.loads(raw)
+                    self.local.set(full_key, value)
+                    self._count("redis_hits")
+                    return value
+            except Exception:
+                self._count("redis_errors")
+
+        self._count("misses")
+        value = loader()
+        self.local.set(full_key, value)
+        if redis_available and r:
+            try:
+                r.setex(full_key, self.ttl, json.dumps(value))
+            except Exception:
+                self._count("redis_errors")
+        return value
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats["local_hits"] + stats["redis_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["local_hits"] + stats["redis_hits"]) / lookups, 4) if lookups else 0.0
+        stats["local_entries"] = len(self.local)
+        stats["redis_enabled"] = redis_available
+        return stats
+
+
+response_cache = ResponseCache(CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS, CACHE_VERSION_TTL_SECONDS)
+
+# 依赖内嵌用户信息的缓存（帖子、商品）都带上这个命名空间
+USERS_NAMESPACE = "users"
+
+
+def post_namespace(post_id: int) -> str:
+    return f"post:{post_id}"
+
+
+def item_namespace(item_id: int) -> str:
+    return f"item:{item_id}"
+
+
+def cache_key(**params) -> str:
+    """把查询参数拼成稳定的缓存键"""
+    return "&".join(f"{k}={params[k]}" for k in sorted(params) if params[k] is not None)
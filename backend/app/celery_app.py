@@ -6,6 +6,21 @@ from celery import Celery
 REDIS_ENABLED = os.getenv("REDIS_ENABLED", "false").lower() == "true"
 REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
 
+# 周期任务：(名称, 任务名, 间隔秒数)
+# Redis 启用时由 Celery beat 调度（celery -A app.celery_app worker --beat），
+# 否则由进程内调度器执行（见 app/scheduler.py）
+PERIODIC_TASKS = [
+    # 定期用明细表校正帖子上的反规范化计数
+    ("reconcile-post-counters", "app.services.counter_service.reconcile_post_counters_task",
+     float(os.getenv("COUNTER_RECONCILE_INTERVAL_SECONDS", 3600))),
+    # 把表存储的时间线截断到 TIMELINE_MAX_LENGTH 条
+    ("trim-timelines", "app.services.timeline_service.trim_timelines_task",
+     float(os.getenv("TIMELINE_TRIM_INTERVAL_SECONDS", 600))),
+    # 重新计算热门排行
+    ("compute-hot-scores", "app.services.ranking_service.compute_hot_scores_task",
+     float(os.getenv("HOT_SCORE_INTERVAL_SECONDS", 300))),
+]
+
 # Celery app - optional, only works if Redis is available
 # Always use memory backend to prevent connection attempts when Redis is disabled
 # This ensures Celery doesn't try to connect to Redis on import/startup
@@ -19,12 +34,16 @@ if REDIS_ENABLED:
             result_serializer='json',
             timezone='UTC',
             enable_utc=True,
-            imports=['app.translator'], # Ensure tasks are found
+            imports=['app.translator', 'app.services.counter_service', 'app.services.timeline_service', 'app.services.ranking_service', 'app.services.badge_queue'], # Ensure tasks are found
             broker_connection_retry_on_startup=False,  # Don't retry on startup
             broker_connection_retry=False,  # Don't retry connections
             broker_connection_max_retries=0,  # No retries
             broker_connection_timeout=1,  # Very short timeout
-            result_backend_transport_options={'master_name': 'mymaster'} if 'redis://' in REDIS_URL else {}
+            result_backend_transport_options={'master_name': 'mymaster'} if 'redis://' in REDIS_URL else {},
+            beat_schedule={
+                name: {'task': task, 'schedule': interval}
+                for name, task, interval in PERIODIC_TASKS
+            },
         )
         print("Celery app initialized (background tasks require Redis)")
     except Exception as e:
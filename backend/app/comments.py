@@ -1,7 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlalchemy.orm import Session
 from . import schemas, models, database, auth
-from .services.badge_service import check_badges_for_user
+from .notifications import create_notification
+from .services.badge_queue import badge_queue
+from .services.counter_service import bump_counter
+from .services.comment_service import assign_path, list_replies, delete_subtree, detach_subtree
+from .cache import response_cache, post_namespace
 import redis
 import os
 
@@ -48,6 +53,12 @@ def create_comment(
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
 
+    parent = None
+    if comment.parent_id is not None:
+        parent = db.query(models.Comment).filter(models.Comment.id == comment.parent_id).first()
+        if not parent or parent.post_id != comment.post_id:
+            raise HTTPException(status_code=400, detail="Parent comment not found on this post")
+
     new_comment = models.Comment(
         post_id=comment.post_id,
         author_id=current_user.id,
@@ -55,24 +66,19 @@ def create_comment(
         parent_id=comment.parent_id
     )
     db.add(new_comment)
+    db.flush()
+    assign_path(new_comment, parent)
+    bump_counter(db, comment.post_id, "comment_count", 1)
     db.commit()
+    response_cache.invalidate("posts", post_namespace(comment.post_id))
     db.refresh(new_comment)
     
     # Create notification for post author (don't notify if commenting on own post)
-    if post.author_id != current_user.id:
-        notification = models.Notification(
-            user_id=post.author_id,
-            type="comment",
-            actor_id=current_user.id,
-            target_type="post",
-            target_id=comment.post_id,
-        )
-        db.add(notification)
-        db.commit()
+    create_notification(db, post.author_id, "comment", current_user.id, "post", comment.post_id)
     
     try:
-        # Check badges after creating comment (comment_king, etc.)
-        check_badges_for_user(current_user.id, db)
+        # Update badge progress (comment_king, etc.)
+        badge_queue.enqueue("comment_created", current_user.id)
     except Exception as e:
         print(f"Badge check failed after comment creation: {e}")
     
@@ -84,15 +90,32 @@ def create_comment(
     return new_comment
 
 
+@router.get("/{comment_id}/replies", response_model=List[schemas.CommentOut])
+def get_comment_replies(
+    comment_id: int,
+    response: Response,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: Session = Depends(database.get_db)
+):
+    """评论的全部回复（整个子树，按树的先序），用于“加载更多回复”，游标通过 X-Next-Cursor 返回"""
+    comment = db.query(models.Comment).filter(models.Comment.id == comment_id).first()
+    if not comment:
+        raise HTTPException(status_code=404, detail="Comment not found")
+    return list_replies(db, comment, limit, cursor=cursor, response=response)
+
+
 @router.delete("/{comment_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_comment(
     comment_id: int,
+    cascade: bool = Query(False),
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(auth.get_current_user)
 ):
     """
     删除评论：仅评论作者或管理员可删除。
-    处理方式：若存在子评论，先将其 parent_id 置空，避免外键约束问题。
+    默认只删除这一条，它的回复整体上移（直接回复变成顶层评论）；
+    cascade=true 时连同整个回复子树一起删除。两种方式都只执行一条批量语句。
     """
     comment = db.query(models.Comment).filter(models.Comment.id == comment_id).first()
     if not comment:
@@ -101,11 +124,14 @@ def delete_comment(
     if comment.author_id != current_user.id and getattr(current_user, "role", "user") != "admin":
         raise HTTPException(status_code=403, detail="Not authorized to delete this comment")
 
-    # Detach children to avoid FK constraint issues
-    children = db.query(models.Comment).filter(models.Comment.parent_id == comment.id).all()
-    for child in children:
-        child.parent_id = None
-
-    db.delete(comment)
+    post_id = comment.post_id
+    if cascade:
+        deleted = delete_subtree(db, comment)
+    else:
+        detach_subtree(db, comment)
+        db.delete(comment)
+        deleted = 1
+    bump_counter(db, post_id, "comment_count", -deleted)
     db.commit()
+    response_cache.invalidate("posts", post_namespace(post_id))
     return
\ No newline at end of file
@@ -1,13 +1,19 @@
 from dotenv import load_dotenv
 import os
+import threading
+import time
+import uuid
 from urllib.parse import urlparse, urlunparse
 
 # 在所有其他导入之前加载环境变量
 load_dotenv()
 
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, text, make_url
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
@@ -57,7 +63,103 @@ if db_name == 'memoluck':
             # Other connection errors, just print warning
             print(f"Warning: Database connection issue: {e}")
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+# 连接池配置（同步、异步引擎各有一个池，每个 worker 最多占用 2 * (DB_POOL_SIZE + DB_MAX_OVERFLOW) 个连接）
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 5))
+# 池满时最多等待的秒数；超时抛 sqlalchemy.exc.TimeoutError，main.py 转成 503
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", 2))
+# 连接最长复用时间，应小于数据库/PgBouncer/负载均衡的空闲断开时间
+DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", 1800))
+# 每次取连接前先 ping（多一次往返）；有 pool_recycle 兜底时可以关掉
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "false").lower() == "true"
+# 经 PgBouncer（transaction 模式）连接时关闭 asyncpg 的预编译语句缓存
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "false").lower() == "true"
+
+
+class MeteredPoolMixin:
+    """记录取连接的等待时间和超时次数（checkout 之前没有事件钩子，只能包一层 _do_get）"""
+
+    def _metrics(self) -> dict:
+        metrics = self.__dict__.get("_wait_metrics")
+        if metrics is None:
+            metrics = self.__dict__.setdefault("_wait_metrics", {
+                "lock": threading.Lock(), "checkouts": 0, "timeouts": 0,
+                "wait_total_seconds": 0.0, "wait_max_seconds": 0.0,
+            })
+        return metrics
+
+    def _do_get(self):
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except sa_exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            metrics = self._metrics()
+            with metrics["lock"]:
+                metrics["checkouts"] += 1
+                metrics["timeouts"] += timed_out
+                metrics["wait_total_seconds"] += waited
+                metrics["wait_max_seconds"] = max(metrics["wait_max_seconds"], waited)
+
+    def get_stats(self) -> dict:
+        metrics = self._metrics()
+        with metrics["lock"]:
+            stats = {k: v for k, v in metrics.items() if k != "lock"}
+        stats["wait_avg_seconds"] = stats["wait_total_seconds"] / stats["checkouts"] if stats["checkouts"] else 0.0
+        stats.update({
+            "size": self.size(),
+            "checked_in": self.checkedin(),
+            "checked_out": self.checkedout(),
+            # QueuePool 的 overflow() 从 -pool_size 开始计数，这里换成实际的溢出连接数
+            "overflow": max(self.overflow(), 0),
+            "max_overflow": self._max_overflow,
+            "timeout_seconds": self._timeout,
+        })
+        return stats
+
+
+class MeteredQueuePool(MeteredPoolMixin, QueuePool):
+    pass
+
+
+class MeteredAsyncAdaptedQueuePool(MeteredPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def pool_options(url: str, async_driver: bool = False) -> dict:
+    """create_engine / create_async_engine 的连接池参数；SQLite 保持默认池"""
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    options = {
+        "poolclass": MeteredAsyncAdaptedQueuePool if async_driver else MeteredQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    if async_driver and DB_PGBOUNCER:
+        # PgBouncer 的 transaction 模式下同一会话可能换到别的服务端连接，具名预编译语句会冲突
+        options["connect_args"] = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+    return options
+
+
+def pool_stats(bind) -> dict:
+    pool = bind.pool
+    if isinstance(pool, MeteredPoolMixin):
+        return pool.get_stats()
+    return {"pool": type(pool).__name__, "status": pool.status()}
+
+
+engine = create_engine(DATABASE_URL, **pool_options(DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -68,3 +170,34 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# Async engine (asyncpg / aiosqlite) for routers migrated to AsyncSession.
+# Same database and models as the sync engine; both coexist while routers are migrated one by one.
+ASYNC_DRIVERS = {
+    "postgres": "postgresql+asyncpg",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def to_async_url(url: str) -> str:
+    """把同步驱动的 URL 换成对应的异步驱动；asyncpg 不认识 libpq 的 sslmode 参数，改成 ssl"""
+    parsed = make_url(url)
+    drivername = ASYNC_DRIVERS.get(parsed.drivername, parsed.drivername)
+    query = dict(parsed.query)
+    if drivername == "postgresql+asyncpg" and "sslmode" in query:
+        query["ssl"] = query.pop("sslmode")
+    return parsed.set(drivername=drivername, query=query).render_as_string(hide_password=False)
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_url(DATABASE_URL)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **pool_options(ASYNC_DATABASE_URL, async_driver=True))
+# expire_on_commit=False: 提交后不再隐式加载属性（异步会话里不能懒加载）
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
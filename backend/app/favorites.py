@@ -1,7 +1,12 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Response
 from sqlalchemy.orm import Session
 from . import models, database, auth, schemas
+from .notifications import create_notification
+from .services.feed_service import with_feed_options, assemble_feed
+from .services.counter_service import bump_counter
+from .utils.pagination import keyset_paginate
+from .cache import response_cache, post_namespace
 
 router = APIRouter(prefix="/api/favorites", tags=["favorites"])
 
@@ -27,19 +32,12 @@ def add_favorite(
     
     favorite = models.Favorite(post_id=post_id, user_id=current_user.id)
     db.add(favorite)
+    bump_counter(db, post_id, "favorite_count", 1)
     db.commit()
+    response_cache.invalidate("posts", post_namespace(post_id))
     
     # Create notification for post author
-    if post.author_id != current_user.id:
-        notification = models.Notification(
-            user_id=post.author_id,
-            type="favorite",
-            actor_id=current_user.id,
-            target_type="post",
-            target_id=post_id,
-        )
-        db.add(notification)
-        db.commit()
+    create_notification(db, post.author_id, "favorite", current_user.id, "post", post_id)
     
     return {"status": "favorited", "message": "Post favorited successfully"}
 
@@ -59,56 +57,34 @@ def remove_favorite(
         raise HTTPException(status_code=404, detail="Favorite not found")
     
     db.delete(favorite)
+    bump_counter(db, post_id, "favorite_count", -1)
     db.commit()
+    response_cache.invalidate("posts", post_namespace(post_id))
     
     return {"status": "unfavorited", "message": "Post unfavorited successfully"}
 
 @router.get("/me", response_model=List[schemas.PostOut])
 def get_my_favorites(
+    response: Response,
     skip: int = 0,
     limit: int = 20,
+    cursor: Optional[str] = None,
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(auth.get_current_user)
 ):
     """获取我收藏的帖子"""
-    favorites = db.query(models.Favorite).filter(
+    # 游标基于收藏时间 (favorites.created_at, favorites.id)
+    query = with_feed_options(
+        db.query(models.Post, models.Favorite.created_at, models.Favorite.id)
+    ).join(
+        models.Favorite, models.Favorite.post_id == models.Post.id
+    ).filter(
         models.Favorite.user_id == current_user.id
-    ).offset(skip).limit(limit).all()
+    )
+    rows = keyset_paginate(
+        query, models.Favorite.created_at, models.Favorite.id,
+        limit, cursor=cursor, skip=skip, response=response,
+        key=lambda row: (row[1], row[2])
+    )
     
-    post_ids = [f.post_id for f in favorites]
-    if not post_ids:
-        return []
-    posts = db.query(models.Post).filter(models.Post.id.in_(post_ids)).all()
-    
-    results = []
-    for p in posts:
-        liked = db.query(models.Like).filter(
-            models.Like.post_id == p.id,
-            models.Like.user_id == current_user.id
-        ).first() is not None
-        
-        favorited = db.query(models.Favorite).filter(
-            models.Favorite.post_id == p.id,
-            models.Favorite.user_id == current_user.id
-        ).first() is not None
-        
-        results.append({
-            "id": p.id,
-            "title": p.title,
-            "content": p.content,
-            "source_language": p.source_language,
-            "category": p.category,
-            "tags": p.tags.split(",") if p.tags else [],
-            "restriction_type": p.restriction_type,
-            "author": p.author,
-            "translated_cache": p.translated_cache,
-            "is_translated": p.is_translated,
-            "likes": len(p.likes),
-            "liked_by_me": liked,
-            "favorited_by_me": favorited,
-            "comments": p.comments,
-            "created_at": p.created_at
-        })
-    
-    return results
-
+    return assemble_feed(db, [row[0] for row in rows], current_user.id)
@@ -1,9 +1,13 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from . import schemas, models, database, auth
-from .services.badge_service import check_badges_for_user
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
+from sqlalchemy.orm import Session, joinedload
+from . import schemas, models, database, auth, replicas
+from .services.badge_queue import badge_queue
+from .services.tag_service import normalize_tags, normalize_tag, set_item_tags, item_ids_with_tag
+from .utils.pagination import keyset_paginate, NEXT_CURSOR_HEADER
+from .utils.conditional import make_etag, check_not_modified
+from .cache import response_cache, cache_key, item_namespace, USERS_NAMESPACE
 
 router = APIRouter(prefix="/api/items", tags=["items"])
 
@@ -28,20 +32,72 @@ def _item_to_out(item: models.Item):
         "created_at": item.created_at,
     }
 
+def _dump_item(item: models.Item):
+    # Plain JSON data, safe to keep in the response cache
+    return schemas.ItemOut.model_validate(_item_to_out(item), from_attributes=True).model_dump(mode="json")
+
+def _item_validator(db: Session, item_id: int) -> Optional[dict]:
+    """商品和卖家的行版本及最后修改时间，跟详情一起缓存在该商品的命名空间里"""
+    def load():
+        row = db.query(
+            models.Item.version, models.Item.updated_at, models.User.version, models.User.updated_at
+        ).outerjoin(
+            models.User, models.User.id == models.Item.user_id
+        ).filter(models.Item.id == item_id).first()
+        if row is None:
+            return None
+        item_version, item_updated, owner_version, owner_updated = row
+        updated = max((t for t in (item_updated, owner_updated) if t is not None), default=None)
+        return {
+            "version": f"{item_version}.{owner_version or 0}",
+            "updated_at": updated.isoformat() if updated else None,
+        }
+
+    return response_cache.get_or_load(item_namespace(item_id), "validator", load, depends=(USERS_NAMESPACE,))
+
 @router.get("/", response_model=List[schemas.ItemOut])
 def get_items(
+    request: Request,
+    response: Response,
     skip: int = 0, 
     limit: int = 20, 
     category: str = None,
-    db: Session = Depends(database.get_db)
+    tag: Optional[str] = None,
+    cursor: Optional[str] = None,
+    db: Session = Depends(replicas.get_read_db)
 ):
-    query = db.query(models.Item)
-    if category and category != 'all':
-        query = query.filter(models.Item.category == category)
-        
-    items = query.order_by(desc(models.Item.created_at)).offset(skip).limit(limit).all()
+    # 与写入时相同的规则规范化，"  Python "、"a,b" 之类的输入也能命中标签
+    tag = normalize_tag(tag)
+    key = cache_key(skip=skip, limit=limit, cursor=cursor, category=category, tag=tag)
+
+    etag = make_etag("items", response_cache.version_tag("items", USERS_NAMESPACE), key)
+    not_modified = check_not_modified(request, response, etag)
+    if not_modified:
+        return not_modified
+
+    def load_items():
+        query = db.query(models.Item).options(joinedload(models.Item.owner))
+        if category and category != 'all':
+            query = query.filter(models.Item.category == category)
+        if tag:
+            query = query.filter(models.Item.id.in_(item_ids_with_tag(db, tag)))
+            
+        items = keyset_paginate(
+            query, models.Item.created_at, models.Item.id,
+            limit, cursor=cursor, skip=skip, response=response
+        )
+        return {
+            "items": [_dump_item(i) for i in items],
+            "next_cursor": response.headers.get(NEXT_CURSOR_HEADER),
+        }
     
-    return [_item_to_out(i) for i in items]
+    # 刚写过的用户跳过缓存从主库读取，并顺便用主库数据覆盖缓存
+    cached = response_cache.get_or_load(
+        "items", key, load_items, depends=(USERS_NAMESPACE,), refresh=replicas.read_your_writes(request)
+    )
+    if cached["next_cursor"]:
+        response.headers[NEXT_CURSOR_HEADER] = cached["next_cursor"]
+    return cached["items"]
 
 @router.post("/", response_model=schemas.ItemOut, status_code=status.HTTP_201_CREATED)
 def create_item(
@@ -57,13 +113,14 @@ def create_item(
     if item.price is None or item.price < 0:
         raise HTTPException(status_code=400, detail="Price must be a non-negative number")
     
+    tag_names = normalize_tags(item.tags)
     new_item = models.Item(
         title=item.title.strip(),
         description=item.description.strip() if item.description else None,
         price=item.price,
         status=item.status or "selling",
         category=item.category or "other",
-        tags=",".join(item.tags) if item.tags else "",
+        tags=",".join(tag_names),
         image_urls=item.image_urls,
         contact_method=item.contact_method,
         is_anonymous=item.is_anonymous if item.is_anonymous is not None else False,
@@ -74,24 +131,40 @@ def create_item(
     # attachments字段只在Post模型中存在
     
     db.add(new_item)
+    db.flush()
+    set_item_tags(db, new_item.id, tag_names)
     db.commit()
+    response_cache.invalidate("items", item_namespace(new_item.id))
     db.refresh(new_item)
     
-    try:
-        # Check badges after creating item (top_seller, etc.)
-        check_badges_for_user(current_user.id, db)
-    except Exception as e:
-        # Don't fail item creation if badge check fails
-        print(f"Badge check failed after item creation: {e}")
+    if new_item.status == "sold":
+        # Update badge progress (top_seller)
+        badge_queue.enqueue("item_sold", current_user.id)
     
     return _item_to_out(new_item)
 
 @router.get("/{id}", response_model=schemas.ItemOut)
-def get_item(id: int, db: Session = Depends(database.get_db)):
-    item = db.query(models.Item).filter(models.Item.id == id).first()
-    if not item:
+def get_item(id: int, request: Request, response: Response, db: Session = Depends(database.get_db)):
+    validator = _item_validator(db, id)
+    if validator is not None:
+        etag = make_etag(
+            "item", id, validator["version"], response_cache.version_tag(item_namespace(id), USERS_NAMESPACE)
+        )
+        last_modified = datetime.fromisoformat(validator["updated_at"]) if validator["updated_at"] else None
+        not_modified = check_not_modified(request, response, etag, last_modified)
+        if not_modified:
+            return not_modified
+
+    def load_item():
+        item = db.query(models.Item).filter(models.Item.id == id).first()
+        return _dump_item(item) if item else None
+
+    result = response_cache.get_or_load(
+        item_namespace(id), "detail", load_item, depends=(USERS_NAMESPACE,)
+    )
+    if result is None:
         raise HTTPException(status_code=404, detail="Item not found")
-    return _item_to_out(item)
+    return result
 
 @router.delete("/{id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_item(
@@ -107,8 +180,10 @@ def delete_item(
     if item.user_id != current_user.id and getattr(current_user, "role", "user") != "admin":
         raise HTTPException(status_code=403, detail="Not authorized to delete this item")
         
+    set_item_tags(db, item.id, [])
     db.delete(item)
     db.commit()
+    response_cache.invalidate("items", item_namespace(id))
     return
 
 
@@ -132,12 +207,15 @@ def update_item(
         item.description = payload.description
     if payload.price is not None:
         item.price = payload.price
+    was_sold = item.status == "sold"
     if payload.status is not None:
         item.status = payload.status
     if payload.category is not None:
         item.category = payload.category
     if payload.tags is not None:
-        item.tags = ",".join(payload.tags) if payload.tags else ""
+        tag_names = normalize_tags(payload.tags)
+        item.tags = ",".join(tag_names)
+        set_item_tags(db, item.id, tag_names)
     if payload.image_urls is not None:
         item.image_urls = payload.image_urls
     if payload.contact_method is not None:
@@ -149,5 +227,8 @@ def update_item(
 
     db.add(item)
     db.commit()
+    response_cache.invalidate("items", item_namespace(id))
     db.refresh(item)
+    if (item.status == "sold") != was_sold:
+        badge_queue.enqueue("item_sold", item.user_id, delta=1 if item.status == "sold" else -1)
     return _item_to_out(item)
@@ -1,7 +1,18 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from sqlalchemy import text
-from . import models, database, auth, posts, badges, comments, items, uploads, favorites, users, notifications, messages
+from sqlalchemy import exc as sa_exc
+from . import models, database, auth, posts, badges, comments, items, uploads, favorites, users, notifications, messages, tags
+from .cache import response_cache
+from .principal_cache import principal_cache
+from .replicas import replica_router, mark_request_write
+from .scheduler import scheduler, start_periodic_tasks
+from .services.translation_memory import translation_memory
+from .services.translation_service import single_flight
+from .services.segment_translation import segment_translator
+from .services.badge_queue import badge_queue
+from .utils.pagination import NEXT_CURSOR_HEADER
 
 # Initialize database tables (delayed until after database connection is established)
 def init_database():
@@ -21,12 +32,55 @@ def migrate_database():
         "ALTER TABLE users ADD COLUMN IF NOT EXISTS grade VARCHAR(64);",
         "ALTER TABLE users ADD COLUMN IF NOT EXISTS cover_image_url TEXT;",
         "ALTER TABLE users ADD COLUMN IF NOT EXISTS bio TEXT;",
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS follower_count INT NOT NULL DEFAULT 0;",
+        "CREATE INDEX IF NOT EXISTS idx_follows_following_follower ON follows (following_id, follower_id);",
         # Posts table migrations
         "ALTER TABLE posts ADD COLUMN IF NOT EXISTS image_urls TEXT;",
         "ALTER TABLE posts ADD COLUMN IF NOT EXISTS attachments JSONB;",
         "ALTER TABLE posts ADD COLUMN IF NOT EXISTS is_anonymous BOOLEAN DEFAULT FALSE;",
+        "ALTER TABLE posts ADD COLUMN IF NOT EXISTS like_count INT NOT NULL DEFAULT 0;",
+        "ALTER TABLE posts ADD COLUMN IF NOT EXISTS comment_count INT NOT NULL DEFAULT 0;",
+        "ALTER TABLE posts ADD COLUMN IF NOT EXISTS favorite_count INT NOT NULL DEFAULT 0;",
+        # Full-text search (tokens are produced in Python, see services/search_service.py)
+        "ALTER TABLE posts ADD COLUMN IF NOT EXISTS search_title TEXT;",
+        "ALTER TABLE posts ADD COLUMN IF NOT EXISTS search_body TEXT;",
+        # search_vector used to be 'simple' only; drop it once so it is regenerated per language,
+        # and clear the token columns so backfill_search_index() re-tokenizes with CJK unigrams
+        "DO $$ BEGIN IF EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name = 'posts' "
+        "AND column_name = 'search_vector' AND generation_expression NOT LIKE '%english%') "
+        "THEN ALTER TABLE posts DROP COLUMN search_vector; "
+        "UPDATE posts SET search_title = NULL, search_body = NULL; END IF; END $$;",
+        "ALTER TABLE posts ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS "
+        "(CASE WHEN source_language = 'en' THEN "
+        "setweight(to_tsvector('english', coalesce(search_title, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(search_body, '')), 'B') ELSE "
+        "setweight(to_tsvector('simple', coalesce(search_title, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(search_body, '')), 'B') END) STORED;",
+        "CREATE INDEX IF NOT EXISTS idx_posts_search_vector ON posts USING GIN (search_vector);",
+        # Comment tree (materialized path, see services/comment_service.py)
+        "ALTER TABLE comments ADD COLUMN IF NOT EXISTS path VARCHAR(1024);",
+        "ALTER TABLE comments ADD COLUMN IF NOT EXISTS depth INT NOT NULL DEFAULT 0;",
+        "ALTER TABLE comments ADD COLUMN IF NOT EXISTS root_id INT;",
+        "CREATE INDEX IF NOT EXISTS idx_comments_root_path ON comments (root_id, path);",
+        "CREATE INDEX IF NOT EXISTS idx_comments_path ON comments (path text_pattern_ops);",
         # Items table migrations
         "ALTER TABLE items ADD COLUMN IF NOT EXISTS is_anonymous BOOLEAN DEFAULT FALSE;",
+        # Keyset pagination indexes
+        "CREATE INDEX IF NOT EXISTS idx_posts_created_id ON posts (created_at, id);",
+        "CREATE INDEX IF NOT EXISTS idx_items_created_id ON items (created_at, id);",
+        "CREATE INDEX IF NOT EXISTS idx_favorites_user_created_id ON favorites (user_id, created_at, id);",
+        "CREATE INDEX IF NOT EXISTS idx_notifications_user_created_id ON notifications (user_id, created_at, id);",
+        "CREATE INDEX IF NOT EXISTS idx_comments_post_created_id ON comments (post_id, created_at, id);",
+        # Row versions for ETag / Last-Modified (bumped by the ORM on every UPDATE)
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS version INT NOT NULL DEFAULT 1;",
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT now();",
+        "ALTER TABLE posts ADD COLUMN IF NOT EXISTS version INT NOT NULL DEFAULT 1;",
+        "ALTER TABLE posts ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT now();",
+        "ALTER TABLE items ADD COLUMN IF NOT EXISTS version INT NOT NULL DEFAULT 1;",
+        "ALTER TABLE items ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT now();",
+        "ALTER TABLE notifications ADD COLUMN IF NOT EXISTS actor_count INT NOT NULL DEFAULT 1;",
+        "ALTER TABLE notifications ADD COLUMN IF NOT EXISTS actor_ids JSON;",
+        "CREATE INDEX IF NOT EXISTS idx_notifications_group ON notifications (user_id, type, target_type, target_id, created_at);",
     ]
     
     try:
@@ -85,6 +139,107 @@ def init_badges_data():
 # Initialize badges on startup
 init_badges_data()
 
+# Backfill search tokens for posts created before full-text search existed
+def backfill_search_index():
+    from .services.search_service import reindex_posts
+
+    db = database.SessionLocal()
+    try:
+        count = reindex_posts(db)
+        if count:
+            print(f"Search index backfilled for {count} posts")
+    except Exception as e:
+        print(f"Warning: Search index backfill encountered an error: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+backfill_search_index()
+
+# Materialized paths for comments created before threaded comments existed
+def backfill_comment_tree():
+    from .services.comment_service import backfill_comment_paths
+
+    db = database.SessionLocal()
+    try:
+        count = backfill_comment_paths(db)
+        if count:
+            print(f"Comment paths backfilled for {count} comments")
+    except Exception as e:
+        print(f"Warning: Comment path backfill encountered an error: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+backfill_comment_tree()
+
+# Follower counts decide fan-out on write vs. on read; timelines are rebuilt from
+# posts + follows when the store is empty (first start, or after switching backends)
+def backfill_timelines():
+    from .services.timeline_service import (
+        reconcile_follower_counts, rebuild_all_timelines, trim_timelines, get_store,
+    )
+
+    db = database.SessionLocal()
+    try:
+        fixed = reconcile_follower_counts(db)
+        if fixed:
+            print(f"Follower counts reconciled for {fixed} users")
+        if get_store().is_empty(db):
+            count = rebuild_all_timelines(db)
+            if count:
+                print(f"Timelines rebuilt for {count} users")
+        else:
+            trim_timelines(db)
+    except Exception as e:
+        print(f"Warning: Timeline backfill encountered an error: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+backfill_timelines()
+
+# Populate post_tags / item_tags from the comma separated tag strings on first start,
+# afterwards only repair drifted usage counts on tags
+def backfill_tag_index():
+    from .models import PostTag, ItemTag
+    from .services.tag_service import backfill_tags, recount_tags
+
+    db = database.SessionLocal()
+    try:
+        if db.query(PostTag.post_id).first() is None and db.query(ItemTag.item_id).first() is None:
+            count = backfill_tags(db)
+            if count:
+                print(f"Tag index backfilled for {count} posts/items")
+        fixed = recount_tags(db)
+        if fixed:
+            print(f"Tag counts recounted for {fixed} tags")
+    except Exception as e:
+        print(f"Warning: Tag index backfill encountered an error: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+backfill_tag_index()
+
+# Recompute denormalized counters (columns added by migration start at 0, and
+# database-level cascades such as user deletion bypass the application counters)
+def backfill_post_counters():
+    from .services.counter_service import reconcile_post_counters
+
+    db = database.SessionLocal()
+    try:
+        fixed = reconcile_post_counters(db)
+        if fixed:
+            print(f"Post counters reconciled for {fixed} posts")
+    except Exception as e:
+        print(f"Warning: Post counter reconciliation encountered an error: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+backfill_post_counters()
+
 app = FastAPI(title="Memolucky API")
 
 # CORS - Configure allowed origins
@@ -107,7 +262,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["*"],
+    # 带凭据的跨域请求里 "*" 不生效，需要显式列出前端要读取的响应头
+    expose_headers=["*", NEXT_CURSOR_HEADER, "ETag"],
 )
 
 # Include Routers
@@ -121,6 +277,37 @@ app.include_router(favorites.router)
 app.include_router(users.router)
 app.include_router(notifications.router)
 app.include_router(messages.router)
+app.include_router(tags.router)
+
+@app.middleware("http")
+async def mark_recent_writes(request: Request, call_next):
+    response = await call_next(request)
+    # 写请求之后一段时间内，该用户的读请求走主库（读己之写，见 app/replicas.py）
+    mark_request_write(request)
+    return response
+
+@app.exception_handler(sa_exc.TimeoutError)
+async def pool_exhausted_handler(request: Request, exc: sa_exc.TimeoutError):
+    # 连接池在 DB_POOL_TIMEOUT_SECONDS 内取不到连接：直接 503，让客户端/负载均衡稍后重试，而不是继续排队
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Database busy, please retry"},
+        headers={"Retry-After": "1"},
+    )
+
+@app.on_event("startup")
+def start_scheduler():
+    # 未启用 Redis（没有 Celery beat）时在进程内执行周期任务
+    start_periodic_tasks()
+    # 配置了只读副本时定期检查复制延迟
+    replica_router.start_monitor()
+
+@app.on_event("shutdown")
+def stop_scheduler():
+    scheduler.stop()
+    replica_router.monitor.stop()
+    # 进程内还没处理的徽章事件
+    badge_queue.flush()
 
 @app.get("/")
 def read_root():
@@ -129,3 +316,40 @@ def read_root():
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
+
+@app.get("/health/cache")
+def cache_stats():
+    return response_cache.get_stats()
+
+@app.get("/health/principals")
+def principal_cache_stats():
+    return principal_cache.get_stats()
+
+@app.get("/health/db")
+def db_pool_stats():
+    return {
+        "sync": database.pool_stats(database.engine),
+        "async": database.pool_stats(database.async_engine.sync_engine),
+    }
+
+@app.get("/health/replicas")
+def replica_stats():
+    return replica_router.get_stats()
+
+@app.get("/health/translation-memory")
+def translation_memory_stats():
+    return {**translation_memory.get_stats(), "segments": segment_translator.get_stats()}
+
+@app.get("/health/translations")
+def on_demand_translation_stats():
+    from .translator import translation_client
+
+    return {"on_demand": single_flight.get_stats(), "client": translation_client.get_stats()}
+
+@app.get("/health/badges")
+def badge_queue_stats():
+    return badge_queue.get_stats()
+
+@app.get("/health/scheduler")
+def scheduler_stats():
+    return scheduler.get_stats()
@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, ForeignKey, DateTime, Numeric, JSON, UniqueConstraint
-from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy import Column, Integer, String, Text, Boolean, ForeignKey, DateTime, Date, Numeric, JSON, UniqueConstraint, Index, Float
+from sqlalchemy.orm import relationship, deferred
+from sqlalchemy.sql import func, literal_column
 from .database import Base
 
 class User(Base):
@@ -18,6 +18,12 @@ class User(Base):
     cover_image_url = Column(String)  # 个人背景图
     bio = Column(Text)  # 个人简介
     role = Column(String, default="user")
+    # Denormalized, maintained on follow/unfollow; decides fan-out on write vs. on read
+    follower_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # Bumped by every UPDATE of the row (ORM flush or bulk update); ETag/Last-Modified validators
+    version = Column(Integer, nullable=False, default=1, server_default="1",
+                     onupdate=literal_column("users.version + 1"))
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     posts = relationship("Post", back_populates="author")
@@ -45,6 +51,23 @@ class UserBadge(Base):
     user = relationship("User", back_populates="badges")
     badge = relationship("Badge", back_populates="user_badges")
 
+class UserBadgeProgress(Base):
+    """Per-user counters maintained by badge events (services/badge_service.py); rebuildable from history"""
+    __tablename__ = "user_badge_progress"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    post_count = Column(Integer, nullable=False, default=0)
+    night_post_count = Column(Integer, nullable=False, default=0)
+    languages = Column(String, nullable=False, default="")  # comma-separated source languages seen
+    last_post_date = Column(Date)
+    current_streak = Column(Integer, nullable=False, default=0)
+    longest_streak = Column(Integer, nullable=False, default=0)
+    likes_received = Column(Integer, nullable=False, default=0)
+    comment_count = Column(Integer, nullable=False, default=0)
+    items_sold = Column(Integer, nullable=False, default=0)
+    awarded = Column(String, nullable=False, default="")  # comma-separated badge names already awarded
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
 class Post(Base):
     __tablename__ = "posts"
 
@@ -61,8 +84,25 @@ class Post(Base):
     translated_cache = Column(JSON)
     is_translated = Column(Boolean, default=False)
     is_anonymous = Column(Boolean, default=False)
+    # Denormalized counters, maintained on write (see services/counter_service.py)
+    like_count = Column(Integer, nullable=False, default=0, server_default="0")
+    comment_count = Column(Integer, nullable=False, default=0, server_default="0")
+    favorite_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # Tokenized text for full-text search (see services/search_service.py);
+    # on PostgreSQL the generated column posts.search_vector is built from these
+    search_title = deferred(Column(Text))
+    search_body = deferred(Column(Text))
+    # Bumped by every UPDATE of the row (ORM flush or bulk update); ETag/Last-Modified validators
+    version = Column(Integer, nullable=False, default=1, server_default="1",
+                     onupdate=literal_column("posts.version + 1"))
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        # Keyset pagination: ORDER BY created_at DESC, id DESC
+        Index("idx_posts_created_id", "created_at", "id"),
+    )
+
     author = relationship("User", back_populates="posts")
     comments = relationship("Comment", back_populates="post")
     likes = relationship("Like", back_populates="post")
@@ -79,6 +119,16 @@ class Translation(Base):
 
     post = relationship("Post", back_populates="translations")
 
+class TranslationMemory(Base):
+    """Translations keyed by source-text hash, shared across posts and edits; no FK so entries outlive posts"""
+    __tablename__ = "translation_memory"
+
+    text_hash = Column(String(64), primary_key=True)  # sha256 hex of the source text
+    source = Column(String(16), primary_key=True)  # LibreTranslate code, may be "auto"
+    target = Column(String(16), primary_key=True)
+    translated_text = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
 class Comment(Base):
     __tablename__ = "comments"
 
@@ -87,8 +137,21 @@ class Comment(Base):
     author_id = Column(Integer, ForeignKey("users.id"))
     content = Column(Text, nullable=False)
     parent_id = Column(Integer, ForeignKey("comments.id"), nullable=True)
+    # Materialized path of the thread (see services/comment_service.py):
+    # "0000000012/0000000034/" = comment 34 replying to top-level comment 12
+    path = Column(String(1024))
+    depth = Column(Integer, nullable=False, default=0, server_default="0")
+    root_id = Column(Integer)  # id of the top-level comment of the thread (own id for top-level)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        # Per-post comment pages and the latest-N preview
+        Index("idx_comments_post_created_id", "post_id", "created_at", "id"),
+        # Whole threads / subtrees in display order
+        Index("idx_comments_root_path", "root_id", "path"),
+        Index("idx_comments_path", "path", postgresql_ops={"path": "text_pattern_ops"}),
+    )
+
     post = relationship("Post", back_populates="comments")
     author = relationship("User", back_populates="comments")
     parent = relationship("Comment", remote_side=[id])
@@ -118,10 +181,51 @@ class Item(Base):
     image_urls = Column(Text)
     contact_method = Column(Text)
     is_anonymous = Column(Boolean, default=False)
+    # Bumped by every UPDATE of the row (ORM flush or bulk update); ETag/Last-Modified validators
+    version = Column(Integer, nullable=False, default=1, server_default="1",
+                     onupdate=literal_column("items.version + 1"))
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        Index("idx_items_created_id", "created_at", "id"),
+    )
+
     owner = relationship("User", back_populates="items")
 
+class Tag(Base):
+    __tablename__ = "tags"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, unique=True, nullable=False)
+    # Usage counters, maintained on write (see services/tag_service.py)
+    post_count = Column(Integer, nullable=False, default=0, server_default="0")
+    item_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+
+class PostTag(Base):
+    __tablename__ = "post_tags"
+
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), primary_key=True)
+    tag_id = Column(Integer, ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True)
+
+    __table_args__ = (
+        # Tag filter: WHERE tag_id = ? -> post ids
+        Index("idx_post_tags_tag_post", "tag_id", "post_id"),
+    )
+
+
+class ItemTag(Base):
+    __tablename__ = "item_tags"
+
+    item_id = Column(Integer, ForeignKey("items.id", ondelete="CASCADE"), primary_key=True)
+    tag_id = Column(Integer, ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True)
+
+    __table_args__ = (
+        Index("idx_item_tags_tag_item", "tag_id", "item_id"),
+    )
+
+
 class Favorite(Base):
     __tablename__ = "favorites"
 
@@ -130,6 +234,10 @@ class Favorite(Base):
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        Index("idx_favorites_user_created_id", "user_id", "created_at", "id"),
+    )
+
     post = relationship("Post")
     user = relationship("User")
 
@@ -144,6 +252,8 @@ class Follow(Base):
 
     __table_args__ = (
         UniqueConstraint("follower_id", "following_id", name="uq_follows_follower_following"),
+        # Followers of an author (timeline fan-out)
+        Index("idx_follows_following_follower", "following_id", "follower_id"),
     )
 
     follower = relationship("User", foreign_keys=[follower_id])
@@ -156,11 +266,19 @@ class Notification(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     type = Column(String, nullable=False)  # 'like', 'favorite', 'follow', 'comment', 'message'
-    actor_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    actor_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)  # latest actor
     target_type = Column(String, nullable=True)  # 'post', 'user', 'item'
     target_id = Column(Integer, nullable=True)  # post_id, user_id, or item_id
+    actor_count = Column(Integer, nullable=False, default=1, server_default="1")  # distinct actors in this group
+    actor_ids = Column(JSON)  # latest actors first, at most NOTIFICATION_GROUP_MAX_ACTORS
     read = Column(Boolean, default=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now())  # time of the latest activity
+
+    __table_args__ = (
+        Index("idx_notifications_user_created_id", "user_id", "created_at", "id"),
+        # 写入时查找可合并的通知（见 app/notifications.py create_notification）
+        Index("idx_notifications_group", "user_id", "type", "target_type", "target_id", "created_at"),
+    )
 
     user = relationship("User", foreign_keys=[user_id])
     actor = relationship("User", foreign_keys=[actor_id])
@@ -178,4 +296,35 @@ class ItemMessage(Base):
 
     item = relationship("Item")
     sender = relationship("User", foreign_keys=[sender_id])
-    receiver = relationship("User", foreign_keys=[receiver_id])
\ No newline at end of file
+    receiver = relationship("User", foreign_keys=[receiver_id])
+
+class TimelineEntry(Base):
+    """Per-user home timeline (fan-out on write), see services/timeline_service.py"""
+    __tablename__ = "timeline_entries"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), primary_key=True)
+    author_id = Column(Integer, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False)  # copied from posts.created_at
+
+    __table_args__ = (
+        Index("idx_timeline_user_created_post", "user_id", "created_at", "post_id"),
+        Index("idx_timeline_user_author", "user_id", "author_id"),
+    )
+
+
+class PostScore(Base):
+    """Precomputed hot ranking, rewritten by services/ranking_service.py on a schedule"""
+    __tablename__ = "post_scores"
+
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), primary_key=True)
+    category = Column(String(50))  # copied from posts.category for per-category leaderboards
+    score = Column(Float, nullable=False)
+    rank = Column(Integer, nullable=False)  # 1 = hottest overall
+    category_rank = Column(Integer, nullable=False)  # 1 = hottest within the category
+    computed_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index("idx_post_scores_rank", "rank"),
+        Index("idx_post_scores_category_rank", "category", "category_rank"),
+    )
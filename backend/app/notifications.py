@@ -1,11 +1,21 @@
+import os
+from datetime import datetime, timedelta, timezone
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from . import models, database, auth, schemas
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload
+from . import models, database, auth, schemas, replicas
+from .utils.pagination import keyset_paginate_async
 
 router = APIRouter(prefix="/api/notifications", tags=["notifications"])
 
+# 同一目标上的同类通知在这个时间窗口内合并成一条（0 表示不合并）
+NOTIFICATION_GROUP_WINDOW_SECONDS = int(os.getenv("NOTIFICATION_GROUP_WINDOW_SECONDS", 86400))
+NOTIFICATION_GROUP_MAX_ACTORS = int(os.getenv("NOTIFICATION_GROUP_MAX_ACTORS", 3))
+# message 每条内容不同，不合并
+GROUPED_TYPES = {"like", "favorite", "comment", "follow"}
+
 
 def create_notification(
     db: Session,
@@ -15,94 +25,147 @@ def create_notification(
     target_type: Optional[str] = None,
     target_id: Optional[int] = None,
 ):
-    """创建通知的辅助函数"""
+    """
+    创建通知的辅助函数（写入时聚合）
+
+    like / favorite / comment / follow 在 NOTIFICATION_GROUP_WINDOW_SECONDS 内落到同一个
+    (user_id, type, target_type, target_id) 的未读通知上：actor 换成最新的人，actor_count 加一，
+    actor_ids 保留最近 NOTIFICATION_GROUP_MAX_ACTORS 个人，created_at 更新为最近一次动作的时间（列表按它排序）。
+    已读的、超出窗口的通知不再合并，开一条新的。
+    """
     # 不给自己发通知
     if actor_id and actor_id == user_id:
         return None
-    
-    notification = models.Notification(
-        user_id=user_id,
-        type=notification_type,
-        actor_id=actor_id,
-        target_type=target_type,
-        target_id=target_id,
-    )
-    db.add(notification)
+
+    notification = None
+    if notification_type in GROUPED_TYPES and NOTIFICATION_GROUP_WINDOW_SECONDS > 0:
+        since = datetime.now(timezone.utc) - timedelta(seconds=NOTIFICATION_GROUP_WINDOW_SECONDS)
+        notification = db.query(models.Notification).filter(
+            models.Notification.user_id == user_id,
+            models.Notification.type == notification_type,
+            models.Notification.target_type == target_type,
+            models.Notification.target_id == target_id,
+            models.Notification.read == False,
+            models.Notification.created_at >= since,
+        ).order_by(models.Notification.created_at.desc()).limit(1).with_for_update().first()
+
+    if notification is None:
+        notification = models.Notification(
+            user_id=user_id,
+            type=notification_type,
+            actor_id=actor_id,
+            target_type=target_type,
+            target_id=target_id,
+            actor_count=1,
+            actor_ids=[actor_id] if actor_id else [],
+        )
+        db.add(notification)
+    else:
+        actor_ids = list(notification.actor_ids or ([notification.actor_id] if notification.actor_id else []))
+        # 同一个人重复动作（取消后再点赞、连续评论）不重复计数
+        if actor_id not in actor_ids:
+            notification.actor_count = (notification.actor_count or 1) + 1
+        if actor_id:
+            actor_ids = [actor_id] + [i for i in actor_ids if i != actor_id]
+        notification.actor_ids = actor_ids[:NOTIFICATION_GROUP_MAX_ACTORS]
+        notification.actor_id = actor_id
+        notification.created_at = datetime.now(timezone.utc)
     db.commit()
     db.refresh(notification)
     return notification
 
 
+async def _attach_actors(db: AsyncSession, notifications: List[models.Notification]):
+    """一次查询加载每条通知最近的几个 actor（聚合前的旧通知只有 actor）"""
+    ids = {i for n in notifications for i in (n.actor_ids or [])}
+    users = {}
+    if ids:
+        result = await db.execute(select(models.User).where(models.User.id.in_(ids)))
+        users = {u.id: u for u in result.scalars()}
+    for n in notifications:
+        if n.actor_ids:
+            n.actors = [users[i] for i in n.actor_ids if i in users]
+        else:
+            n.actors = [n.actor] if n.actor else []
+
+
 @router.get("/", response_model=List[schemas.NotificationOut])
-def get_notifications(
+async def get_notifications(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
     unread_only: bool = Query(False),
-    db: Session = Depends(database.get_db),
+    db: AsyncSession = Depends(replicas.get_async_read_db),
     current_user: models.User = Depends(auth.get_current_user),
 ):
-    """获取当前用户的通知列表"""
-    query = db.query(models.Notification).filter(
+    """获取当前用户的通知列表（聚合后的形式：最近的 actor、actor_count 和最近几个 actors）"""
+    # actor 用户信息随通知一起 JOIN 加载（异步会话里不能懒加载）
+    stmt = select(models.Notification).options(
+        joinedload(models.Notification.actor)
+    ).where(
         models.Notification.user_id == current_user.id
     )
     
     if unread_only:
-        query = query.filter(models.Notification.read == False)
-    
-    notifications = query.order_by(desc(models.Notification.created_at)).offset(skip).limit(limit).all()
-    
-    # 加载关联的actor用户信息
-    for notif in notifications:
-        if notif.actor_id:
-            notif.actor = db.query(models.User).filter(models.User.id == notif.actor_id).first()
+        stmt = stmt.where(models.Notification.read == False)
     
+    notifications = await keyset_paginate_async(
+        db, stmt, models.Notification.created_at, models.Notification.id,
+        limit, cursor=cursor, skip=skip, response=response
+    )
+    await _attach_actors(db, notifications)
     return notifications
 
 
 @router.get("/unread/count", response_model=dict)
-def get_unread_count(
-    db: Session = Depends(database.get_db),
+async def get_unread_count(
+    db: AsyncSession = Depends(replicas.get_async_read_db),
     current_user: models.User = Depends(auth.get_current_user),
 ):
     """获取未读通知数量"""
-    count = db.query(models.Notification).filter(
-        models.Notification.user_id == current_user.id,
-        models.Notification.read == False
-    ).count()
+    count = await db.scalar(
+        select(func.count(models.Notification.id)).where(
+            models.Notification.user_id == current_user.id,
+            models.Notification.read == False
+        )
+    )
     
-    return {"count": count}
+    return {"count": count or 0}
 
 
 @router.put("/{notification_id}/read", status_code=200)
-def mark_as_read(
+async def mark_as_read(
     notification_id: int,
-    db: Session = Depends(database.get_db),
+    db: AsyncSession = Depends(database.get_async_db),
     current_user: models.User = Depends(auth.get_current_user),
 ):
     """标记通知为已读"""
-    notification = db.query(models.Notification).filter(
-        models.Notification.id == notification_id,
-        models.Notification.user_id == current_user.id
-    ).first()
+    result = await db.execute(
+        update(models.Notification).where(
+            models.Notification.id == notification_id,
+            models.Notification.user_id == current_user.id
+        ).values(read=True)
+    )
     
-    if not notification:
+    if result.rowcount == 0:
         raise HTTPException(status_code=404, detail="Notification not found")
     
-    notification.read = True
-    db.commit()
+    await db.commit()
     return {"status": "read"}
 
 
 @router.put("/read-all", status_code=200)
-def mark_all_as_read(
-    db: Session = Depends(database.get_db),
+async def mark_all_as_read(
+    db: AsyncSession = Depends(database.get_async_db),
     current_user: models.User = Depends(auth.get_current_user),
 ):
     """标记所有通知为已读"""
-    db.query(models.Notification).filter(
-        models.Notification.user_id == current_user.id,
-        models.Notification.read == False
-    ).update({"read": True})
-    db.commit()
+    await db.execute(
+        update(models.Notification).where(
+            models.Notification.user_id == current_user.id,
+            models.Notification.read == False
+        ).values(read=True)
+    )
+    await db.commit()
     return {"status": "all_read"}
-
@@ -1,13 +1,29 @@
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query, BackgroundTasks
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, desc
-from . import schemas, models, database, auth
+from datetime import datetime
+from typing import Dict, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query, BackgroundTasks, Request, Response
+from sqlalchemy import select
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload
+from . import schemas, models, database, auth, replicas
+from .notifications import create_notification
 import redis
 import os
 import bleach
-from .services.badge_service import check_badges_for_user
+from .services.badge_queue import badge_queue
+from .services.feed_service import with_feed_options, assemble_feed, assemble_post, dump_posts
+from .services.counter_service import bump_counter, get_counter
+from .services.search_service import index_post, apply_search, search_posts, make_snippet
+from .services.tag_service import normalize_tags, normalize_tag, set_post_tags, post_ids_with_tag
+from .services.comment_service import list_threads, REPLY_PREVIEW_SIZE
+from .services.timeline_service import dispatch_fan_out, get_timeline, on_post_deleted
+from .services.ranking_service import hot_paginate, category_leaderboards
+from .translator import cached_translations, set_post_translations
+from .services.translation_service import localize_posts, LANG_PATTERN
 from .utils.restriction_validators import validate_restriction
+from .utils.pagination import keyset_paginate, keyset_paginate_async, NEXT_CURSOR_HEADER
+from .utils.conditional import make_etag, check_not_modified
+from .cache import response_cache, cache_key, post_namespace, USERS_NAMESPACE
 
 
 # Redis connection - optional
@@ -38,88 +54,97 @@ else:
 
 router = APIRouter(prefix="/api/posts", tags=["posts"])
 
+def _post_validator(db: Session, post_id: int) -> Optional[dict]:
+    """帖子和作者的行版本及最后修改时间，跟详情一起缓存在该帖子的命名空间里"""
+    def load():
+        row = db.query(
+            models.Post.version, models.Post.updated_at, models.User.version, models.User.updated_at
+        ).outerjoin(
+            models.User, models.User.id == models.Post.author_id
+        ).filter(models.Post.id == post_id).first()
+        if row is None:
+            return None
+        post_version, post_updated, author_version, author_updated = row
+        updated = max((t for t in (post_updated, author_updated) if t is not None), default=None)
+        return {
+            "version": f"{post_version}.{author_version or 0}",
+            "updated_at": updated.isoformat() if updated else None,
+        }
+
+    return response_cache.get_or_load(post_namespace(post_id), "validator", load, depends=(USERS_NAMESPACE,))
+
 @router.get("/", response_model=List[schemas.PostOut])
 def get_posts(
+    request: Request,
+    response: Response,
     skip: int = 0, 
     limit: int = 20, 
+    cursor: Optional[str] = None,
     category: Optional[str] = None,
     tag: Optional[str] = None,
-    lang: Optional[str] = "ja",
+    lang: Optional[str] = Query(None, pattern=LANG_PATTERN),
     q: Optional[str] = None,
-    db: Session = Depends(database.get_db),
+    sort: str = Query("new", pattern="^(new|hot)$"),
+    db: Session = Depends(replicas.get_read_db),
     current_user: Optional[models.User] = Depends(auth.get_current_user_optional) # Optional auth for viewing
 ):
-    try:
+    # 与写入时相同的规则规范化，"  Python "、"a,b" 之类的输入也能命中标签
+    tag = normalize_tag(tag)
+    key = cache_key(skip=skip, limit=limit, cursor=cursor, category=category, tag=tag, q=q, sort=sort)
+
+    # 列表随任一帖子或用户信息的写入失效，ETag 取这两个命名空间的版本号（liked_by_me 因人而异，带上用户）
+    viewer_id = current_user.id if current_user else 0
+    etag = make_etag("posts", response_cache.version_tag("posts", USERS_NAMESPACE), key, viewer_id, lang)
+    not_modified = check_not_modified(request, response, etag)
+    if not_modified:
+        return not_modified
+
+    def load_posts():
         query = db.query(models.Post)
         
         if category:
             query = query.filter(models.Post.category == category)
         
         if tag:
-            # Simple string match for now, ideally use Postgres Array or separate table
-            query = query.filter(models.Post.tags.contains(tag))
+            # Index lookup on post_tags (tag_id, post_id)
+            query = query.filter(models.Post.id.in_(post_ids_with_tag(db, tag)))
             
         if q:
-            query = query.filter(or_(
-                models.Post.title.contains(q),
-                models.Post.content.contains(q)
-            ))
+            query = apply_search(db, query, q)
             
-        posts = query.order_by(desc(models.Post.created_at)).offset(skip).limit(limit).all()
+        if sort == "hot":
+            # 按定时任务预计算的排名读取（见 services/ranking_service.py）
+            posts = hot_paginate(with_feed_options(query), limit, cursor=cursor, category=category, response=response)
+        else:
+            posts = keyset_paginate(
+                with_feed_options(query), models.Post.created_at, models.Post.id,
+                limit, cursor=cursor, skip=skip, response=response
+            )
         
-        # Process posts for display (translation fallback)
-        results = []
+        # 不带 lang 时返回原文和全部已有译文，由前端决定显示哪个
         user_id = current_user.id if current_user else None
-        
-        for p in posts:
-            # Check if liked
-            liked = False
-            if user_id:
-                liked = db.query(models.Like).filter(
-                    models.Like.post_id == p.id, 
-                    models.Like.user_id == user_id
-                ).first() is not None
-                
-            # Translation logic
-            # If requested lang is not source, check cache
-            # This logic is simplified for the response model
-            # The frontend usually requests the full object and decides what to show
-            # But here we can populate the 'content' field if we wanted to enforce lang
-            
-            # Check if favorited
-            favorited = False
-            if user_id:
-                favorited = db.query(models.Favorite).filter(
-                    models.Favorite.post_id == p.id,
-                    models.Favorite.user_id == user_id
-                ).first() is not None
-            
-            # Hide author information if post is anonymous
-            author_info = None if p.is_anonymous else p.author
-            
-            results.append({
-                "id": p.id,
-                "title": p.title,
-                "content": p.content, # Return original, let frontend switch
-                "source_language": p.source_language,
-                "category": p.category,
-                "tags": p.tags.split(",") if p.tags else [],
-                "restriction_type": p.restriction_type,
-                "image_urls": p.image_urls,  # Add image_urls
-                "attachments": p.attachments,  # Add file attachments
-                "author": author_info,
-                "author_id": p.author_id,  # Always include author_id for delete permission check
-                "translated_cache": p.translated_cache,
-                "is_translated": p.is_translated,
-                "is_anonymous": p.is_anonymous,
-                "likes": len(p.likes),
-                "liked_by_me": liked,
-                "favorited_by_me": favorited,
-                "comments": p.comments,
-                "created_at": p.created_at
-            })
-        
-        return results
+        return assemble_feed(db, posts, user_id)
+
+    try:
+        if current_user:
+            posts = load_posts()
+            return localize_posts(db, posts, lang) if lang else posts
+
+        # Anonymous viewers all get the same page (no liked_by_me etc.), so it is cacheable
+        def load_cached():
+            return {
+                "posts": dump_posts(load_posts()),
+                "next_cursor": response.headers.get(NEXT_CURSOR_HEADER),
+            }
+
+        cached = response_cache.get_or_load("posts", key, load_cached, depends=(USERS_NAMESPACE,))
+        if cached["next_cursor"]:
+            response.headers[NEXT_CURSOR_HEADER] = cached["next_cursor"]
+        # 缓存里是全部译文，按 lang 挑选（缺的触发翻译）放在缓存之外做
+        return localize_posts(db, cached["posts"], lang) if lang else cached["posts"]
+    except (HTTPException, sa_exc.TimeoutError):
+        # 连接池耗尽交给 main.py 的处理器返回 503
+        raise
     except Exception as e:
         import logging
         logger = logging.getLogger("uvicorn")
@@ -158,24 +183,28 @@ def create_post(
         
         # Sanitize content
         sanitized_content = bleach.clean(post.content, tags=['b', 'i', 'u', 'em', 'strong', 'a'], attributes={'a': ['href', 'title']})
+        tag_names = normalize_tags(post.tags)
         
         new_post = models.Post(
             title=post.title,
             content=sanitized_content,
             source_language=post.source_language,
             category=post.category,
-            tags=",".join(post.tags) if post.tags else "",
+            tags=",".join(tag_names),
             restriction_type=post.restriction_type,
             image_urls=post.image_urls,
             attachments=post.attachments,
             is_anonymous=post.is_anonymous if post.is_anonymous is not None else False,
             author_id=current_user.id
         )
+        index_post(new_post)
         db.add(new_post)
+        db.flush()
+        set_post_tags(db, new_post.id, tag_names)
         db.commit()
         db.refresh(new_post)
-    except HTTPException:
-        # Re-raise HTTP exceptions (validation errors, rate limits, etc.)
+    except (HTTPException, sa_exc.TimeoutError):
+        # Re-raise HTTP exceptions (validation errors, rate limits, etc.) and pool exhaustion (503)
         raise
     except Exception as e:
         # Rollback transaction on error
@@ -188,14 +217,23 @@ def create_post(
         )
     
     try:
-        # Check badges after creating post (first_post badge, night_owl, streak_poster, etc.)
-        check_badges_for_user(current_user.id, db)
+        # Update badge progress (first_post badge, night_owl, streak_poster, etc.)
+        badge_queue.enqueue("post_created", current_user.id, at=new_post.created_at, language=new_post.source_language)
     except Exception as e:
         # Don't fail post creation if badge check fails
         print(f"Badge check failed after post creation: {e}")
     
     # NOTE: 已取消"翻译到当前语言"功能，暂不自动触发翻译任务
     
+    response_cache.invalidate("posts", post_namespace(new_post.id))
+
+    try:
+        # Push the post into followers' home timelines
+        dispatch_fan_out(db, new_post)
+    except Exception as e:
+        db.rollback()
+        print(f"Timeline fan-out failed after post creation: {e}")
+    
     # Set rate limit
     # Set rate limit (Redis) - optional
     if redis_available and r:
@@ -210,7 +248,7 @@ def create_post(
         "content": new_post.content,
         "source_language": new_post.source_language,
         "category": new_post.category,
-        "tags": post.tags,
+        "tags": tag_names,
         "restriction_type": new_post.restriction_type,
         "image_urls": new_post.image_urls,
         "attachments": new_post.attachments,
@@ -220,56 +258,150 @@ def create_post(
         "is_translated": False,
         "is_anonymous": new_post.is_anonymous,
         "likes": 0,
+        "comment_count": 0,
+        "favorite_count": 0,
         "liked_by_me": False,
         "comments": [],
         "created_at": new_post.created_at
     }
 
+@router.get("/timeline", response_model=List[schemas.PostOut])
+def get_home_timeline(
+    response: Response,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """关注的人（和自己）的帖子，新→旧，游标通过 X-Next-Cursor 返回"""
+    posts = get_timeline(db, current_user.id, limit, cursor=cursor, response=response)
+    return assemble_feed(db, posts, current_user.id)
+
+@router.get("/leaderboards", response_model=Dict[str, List[schemas.PostOut]])
+def get_leaderboards(
+    per_category: int = Query(5, ge=1, le=50),
+    db: Session = Depends(database.get_db),
+    current_user: Optional[models.User] = Depends(auth.get_current_user_optional)
+):
+    """各分类的热门帖子前 per_category 名"""
+    boards = category_leaderboards(db, per_category)
+    user_id = current_user.id if current_user else None
+    return {category: assemble_feed(db, posts, user_id) for category, posts in boards.items()}
+
+@router.get("/search", response_model=List[schemas.PostSearchResult])
+def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=50),
+    category: Optional[str] = None,
+    source_language: Optional[str] = None,
+    db: Session = Depends(database.get_db),
+    current_user: Optional[models.User] = Depends(auth.get_current_user_optional)
+):
+    """全文检索：按相关度排序，附带高亮片段"""
+    query = with_feed_options(db.query(models.Post))
+    if category:
+        query = query.filter(models.Post.category == category)
+    if source_language:
+        query = query.filter(models.Post.source_language == source_language)
+
+    hits = search_posts(db, query, q, skip=skip, limit=limit)
+    user_id = current_user.id if current_user else None
+    posts = assemble_feed(db, [post for post, _ in hits], user_id)
+
+    return [
+        {
+            "post": post_out,
+            "rank": rank,
+            "title_snippet": make_snippet(post.title, q),
+            "snippet": make_snippet(post.content, q),
+        }
+        for post_out, (post, rank) in zip(posts, hits)
+    ]
+
 @router.get("/{id}", response_model=schemas.PostOut)
 def get_post(
     id: int, 
+    request: Request,
+    response: Response,
+    lang: Optional[str] = Query(None, pattern=LANG_PATTERN),
     db: Session = Depends(database.get_db),
     current_user: Optional[models.User] = Depends(auth.get_current_user_optional)
 ):
-    post = db.query(models.Post).filter(models.Post.id == id).first()
-    if not post:
+    validator = _post_validator(db, id)
+    if validator is not None:
+        viewer_id = current_user.id if current_user else 0
+        etag = make_etag(
+            "post", id, validator["version"],
+            response_cache.version_tag(post_namespace(id), USERS_NAMESPACE), viewer_id, lang,
+        )
+        last_modified = datetime.fromisoformat(validator["updated_at"]) if validator["updated_at"] else None
+        not_modified = check_not_modified(request, response, etag, last_modified)
+        if not_modified:
+            return not_modified
+
+    def load_post():
+        post = with_feed_options(db.query(models.Post)).filter(models.Post.id == id).first()
+        if not post:
+            return None
+        user_id = current_user.id if current_user else None
+        return assemble_post(db, post, user_id)
+
+    def load_cached():
+        result = load_post()
+        return dump_posts([result])[0] if result else None
+
+    if current_user:
+        result = load_post()
+    else:
+        result = response_cache.get_or_load(
+            post_namespace(id), "detail", load_cached, depends=(USERS_NAMESPACE,)
+        )
+    if result is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    if lang:
+        # 只返回请求的语言；没有译文时触发翻译（同一帖子同一语言只翻译一次），稍等后仍没有则返回原文 + pending
+        result = localize_posts(db, [result], lang)[0]
+    return result
+
+@router.get("/{id}/comments", response_model=List[schemas.CommentOut])
+async def get_post_comments(
+    id: int,
+    response: Response,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(database.get_async_db)
+):
+    """帖子的评论列表（新→旧），游标分页，作者随评论一起 JOIN 加载"""
+    exists = await db.scalar(select(models.Post.id).where(models.Post.id == id))
+    if not exists:
         raise HTTPException(status_code=404, detail="Post not found")
-        
-    user_id = current_user.id if current_user else None
-    liked = False
-    if user_id:
-        liked = db.query(models.Like).filter(
-            models.Like.post_id == post.id, 
-            models.Like.user_id == user_id
-        ).first() is not None
-
-    # Check if favorited
-    favorited = False
-    if user_id:
-        favorited = db.query(models.Favorite).filter(
-            models.Favorite.post_id == post.id,
-            models.Favorite.user_id == user_id
-        ).first() is not None
-    
-    return {
-        "id": post.id,
-        "title": post.title,
-        "content": post.content,
-        "source_language": post.source_language,
-        "category": post.category,
-        "tags": post.tags.split(",") if post.tags else [],
-        "restriction_type": post.restriction_type,
-        "image_urls": post.image_urls,
-        "attachments": post.attachments,
-        "author": post.author,
-        "translated_cache": post.translated_cache,
-        "is_translated": post.is_translated,
-        "likes": len(post.likes),
-        "liked_by_me": liked,
-        "favorited_by_me": favorited,
-        "comments": post.comments,
-        "created_at": post.created_at
-    }
+
+    stmt = select(models.Comment).options(
+        joinedload(models.Comment.author)
+    ).where(models.Comment.post_id == id)
+    return await keyset_paginate_async(
+        db, stmt, models.Comment.created_at, models.Comment.id,
+        limit, cursor=cursor, response=response
+    )
+
+@router.get("/{id}/threads", response_model=List[schemas.CommentThreadOut])
+def get_post_threads(
+    id: int,
+    response: Response,
+    limit: int = Query(10, ge=1, le=50),
+    cursor: Optional[str] = None,
+    replies: int = Query(REPLY_PREVIEW_SIZE, ge=0, le=20),
+    db: Session = Depends(database.get_db)
+):
+    """
+    帖子的评论线程：顶层评论（新→旧，游标分页）+ 每个线程按树的先序排列的前 replies 条回复。
+    回复未取完的线程带 replies_cursor，交给 GET /api/comments/{id}/replies 继续加载。
+    """
+    exists = db.query(models.Post.id).filter(models.Post.id == id).first()
+    if not exists:
+        raise HTTPException(status_code=404, detail="Post not found")
+    return list_threads(db, id, limit, cursor=cursor, replies=replies, response=response)
 
 @router.post("/{id}/like")
 def like_post(
@@ -291,26 +423,17 @@ def like_post(
         
     new_like = models.Like(post_id=id, user_id=current_user.id)
     db.add(new_like)
+    bump_counter(db, id, "like_count", 1)
     db.commit()
+    response_cache.invalidate("posts", post_namespace(id))
     
     # Create notification for post author
-    if post.author_id != current_user.id:
-        notification = models.Notification(
-            user_id=post.author_id,
-            type="like",
-            actor_id=current_user.id,
-            target_type="post",
-            target_id=id,
-        )
-        db.add(notification)
-        db.commit()
+    create_notification(db, post.author_id, "like", current_user.id, "post", id)
     
-    # Check badges (Popularity) - usually done async or in badge service
-    # For simplicity, we can trigger a check here or rely on the async task
-    # Check badges (Popularity)
-    check_badges_for_user(post.author_id, db)
+    # Update badge progress (heart_collector)
+    badge_queue.enqueue("like_received", post.author_id)
     
-    return {"status": "liked", "likes": len(post.likes)}
+    return {"status": "liked", "likes": get_counter(db, id, "like_count")}
 
 @router.delete("/{id}/like")
 def unlike_post(
@@ -327,10 +450,14 @@ def unlike_post(
         raise HTTPException(status_code=400, detail="Not liked")
         
     db.delete(existing_like)
+    bump_counter(db, id, "like_count", -1)
     db.commit()
+    response_cache.invalidate("posts", post_namespace(id))
+
+    author_id = db.query(models.Post.author_id).filter(models.Post.id == id).scalar()
+    badge_queue.enqueue("like_received", author_id, delta=-1)
     
-    post = db.query(models.Post).filter(models.Post.id == id).first()
-    return {"status": "unliked", "likes": len(post.likes)}
+    return {"status": "unliked", "likes": get_counter(db, id, "like_count")}
 
 @router.put("/{id}", response_model=schemas.PostOut)
 def update_post(
@@ -348,60 +475,32 @@ def update_post(
     if post.author_id != current_user.id and current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized to update this post")
     
+    content_changed = post.content != post_update.content
+
     # Update fields
     post.title = post_update.title
     post.content = post_update.content
     post.category = post_update.category
-    post.tags = ",".join(post_update.tags) if post_update.tags else ""
+    tag_names = normalize_tags(post_update.tags)
+    post.tags = ",".join(tag_names)
+    set_post_tags(db, post.id, tag_names)
     post.restriction_type = post_update.restriction_type
     post.image_urls = post_update.image_urls
     post.attachments = post_update.attachments
     if post_update.is_anonymous is not None:
         post.is_anonymous = post_update.is_anonymous
+    index_post(post)
     
-    # If content changed, clear translation cache (translation feature disabled)
-    if post.content != post_update.content:
-        post.is_translated = False
-        post.translated_cache = None
+    # 内容变了：旧译文作废；新内容如果翻译过（撤销编辑、与其他帖子相同的文字），直接从翻译记忆补上
+    if content_changed:
+        set_post_translations(db, post, cached_translations(db, post), replace=True)
     
     db.commit()
-    db.refresh(post)
+    response_cache.invalidate("posts", post_namespace(id))
     
     # Return updated post
-    liked = db.query(models.Like).filter(
-        models.Like.post_id == post.id,
-        models.Like.user_id == current_user.id
-    ).first() is not None
-    
-    favorited = db.query(models.Favorite).filter(
-        models.Favorite.post_id == post.id,
-        models.Favorite.user_id == current_user.id
-    ).first() is not None
-    
-    # Hide author information if post is anonymous
-    author_info = None if post.is_anonymous else post.author
-    
-    return {
-        "id": post.id,
-        "title": post.title,
-        "content": post.content,
-        "source_language": post.source_language,
-        "category": post.category,
-        "tags": post.tags.split(",") if post.tags else [],
-        "restriction_type": post.restriction_type,
-        "image_urls": post.image_urls,
-        "attachments": post.attachments,
-        "author": author_info,
-        "author_id": post.author_id,  # Always include author_id for delete permission check
-        "translated_cache": post.translated_cache,
-        "is_translated": post.is_translated,
-        "is_anonymous": post.is_anonymous,
-        "likes": len(post.likes),
-        "liked_by_me": liked,
-        "favorited_by_me": favorited,
-        "comments": post.comments,
-        "created_at": post.created_at
-    }
+    post = with_feed_options(db.query(models.Post)).filter(models.Post.id == id).populate_existing().first()
+    return assemble_post(db, post, current_user.id)
 
 @router.delete("/{id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_post(
@@ -416,6 +515,10 @@ def delete_post(
     if post.author_id != current_user.id and current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized to delete this post")
         
+    # Release tag usage counts before the post_tags rows go away
+    set_post_tags(db, post.id, [])
+    on_post_deleted(db, post.id)
     db.delete(post)
     db.commit()
+    response_cache.invalidate("posts", post_namespace(id))
     return
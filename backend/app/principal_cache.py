@@ -0,0 +1,165 @@
+"""
+登录用户（principal）缓存
+
+每个已登录请求都要解码 JWT 并按 email（JWT 的 sub）查一次 users 表。这里缓存两样东西：
+- token -> (sub, exp)：只在进程内，省掉重复的签名校验；过期时间不超过 token 本身的 exp
+- sub -> 用户快照：users 行的常用字段（不含 password_hash），进程内 LRU+TTL，Redis 启用时再加一层共享缓存
+
+命中时把快照还原成 User 并以“已持久化、未修改”的状态并入本次请求的会话（不发 SQL），
+同步接口照常修改 current_user 并 commit；没有放进快照的字段（password_hash）在首次访问时才加载。
+
+用户资料、密码、头像/背景图、角色变化以及删除用户后必须调用 invalidate(email)。
+Redis 启用时快照以 Redis 为准，进程内只保留 PRINCIPAL_LOCAL_TTL_SECONDS 秒，
+其他 worker 的失效最多晚这么久可见；未启用时只有进程内缓存。
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Optional, Tuple
+from jose import JWTError, jwt
+from sqlalchemy.orm import Session, make_transient_to_detached
+from . import models
+from .cache import LRUCache, r, redis_available
+
+PRINCIPAL_CACHE_ENABLED = os.getenv("PRINCIPAL_CACHE_ENABLED", "true").lower() == "true"
+PRINCIPAL_CACHE_TTL_SECONDS = int(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", 300))
+PRINCIPAL_LOCAL_TTL_SECONDS = float(os.getenv("PRINCIPAL_LOCAL_TTL_SECONDS", 2))
+PRINCIPAL_CACHE_MAX_ENTRIES = int(os.getenv("PRINCIPAL_CACHE_MAX_ENTRIES", 10000))
+
+# 快照里的列；datetime 列以 ISO 字符串保存。
+# follower_count 随别人关注/取关变化，不放进快照（需要时访问属性再加载）
+SNAPSHOT_COLUMNS = (
+    "id", "email", "nickname", "major", "year", "grade", "language_preference",
+    "avatar_url", "cover_image_url", "bio", "role",
+    "version", "updated_at", "created_at",
+)
+DATETIME_COLUMNS = ("updated_at", "created_at")
+
+
+def snapshot_user(user: models.User) -> dict:
+    snapshot = {}
+    for column in SNAPSHOT_COLUMNS:
+        value = getattr(user, column)
+        snapshot[column] = value.isoformat() if isinstance(value, datetime) else value
+    return snapshot
+
+
+def restore_user(snapshot: dict) -> models.User:
+    """快照还原成“游离（detached）”状态的 User，未包含的列视为过期，访问时再加载"""
+    values = dict(snapshot)
+    for column in DATETIME_COLUMNS:
+        if values.get(column):
+            values[column] = datetime.fromisoformat(values[column])
+    user = models.User(**values)
+    make_transient_to_detached(user)
+    return user
+
+
+class PrincipalCache:
+    def __init__(self, max_entries: int, ttl: int, local_ttl: float):
+        self.ttl = ttl
+        self.local_ttl = local_ttl if redis_available and r else ttl
+        self.users = LRUCache(max_entries, self.local_ttl)
+        self.tokens = LRUCache(max_entries, ttl)
+        self._lock = threading.Lock()
+        self.stats = {"token_hits": 0, "user_hits": 0, "redis_hits": 0, "misses": 0, "invalidations": 0, "redis_errors": 0}
+
+    def _count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def subject(self, token: str, secret_key: str, algorithm: str) -> Optional[str]:
+        """校验 token 并返回 sub；无效或过期返回 None"""
+        if PRINCIPAL_CACHE_ENABLED:
+            cached: Optional[Tuple[str, Optional[float]]] = self.tokens.get(token)
+            if cached is not None:
+                sub, exp = cached
+                if exp is None or exp > time.time():
+                    self._count("token_hits")
+                    return sub
+                self.tokens.delete(token)
+                return None
+
+        try:
+            payload = jwt.decode(token, secret_key, algorithms=[algorithm])
+        except JWTError:
+            return None
+        sub = payload.get("sub")
+        if sub is None:
+            return None
+        if PRINCIPAL_CACHE_ENABLED:
+            exp = payload.get("exp")
+            ttl = self.ttl if exp is None else min(self.ttl, max(exp - time.time(), 0))
+            self.tokens.set(token, (sub, exp), ttl=ttl)
+        return sub
+
+    def _get_snapshot(self, sub: str) -> Optional[dict]:
+        snapshot = self.users.get(sub)
+        if snapshot is not None:
+            self._count("user_hits")
+            return snapshot
+        if redis_available and r:
+            try:
+                raw = r.get(f"principal:{sub}")
+                if raw is not None:
+                    snapshot = json.loads(raw)
+                    self.users.set(sub, snapshot)
+                    self._count("redis_hits")
+                    return snapshot
+            except Exception:
+                self._count("redis_errors")
+        return None
+
+    def _set_snapshot(self, sub: str, snapshot: dict):
+        self.users.set(sub, snapshot)
+        if redis_available and r:
+            try:
+                r.setex(f"principal:{sub}", self.ttl, json.dumps(snapshot))
+            except Exception:
+                self._count("redis_errors")
+
+    def load_user(self, db: Session, sub: str) -> Optional[models.User]:
+        """按 sub（email）取用户：命中缓存时不查库，返回已并入 db 会话的 User"""
+        if not PRINCIPAL_CACHE_ENABLED:
+            return db.query(models.User).filter(models.User.email == sub).first()
+
+        snapshot = self._get_snapshot(sub)
+        if snapshot is not None:
+            # load=False：直接当作与数据库一致的持久化对象放进会话，不发 SELECT
+            return db.merge(restore_user(snapshot), load=False)
+
+        self._count("misses")
+        user = db.query(models.User).filter(models.User.email == sub).first()
+        if user is not None:
+            self._set_snapshot(sub, snapshot_user(user))
+        return user
+
+    def invalidate(self, *subs: str):
+        """用户行变化（并已 commit）后调用，参数是 email"""
+        for sub in subs:
+            if not sub:
+                continue
+            self.users.delete(sub)
+            if redis_available and r:
+                try:
+                    r.delete(f"principal:{sub}")
+                except Exception:
+                    self._count("redis_errors")
+            self._count("invalidations")
+
+    def clear(self):
+        self.users.clear()
+        self.tokens.clear()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        stats["cached_users"] = len(self.users)
+        stats["cached_tokens"] = len(self.tokens)
+        stats["redis_enabled"] = redis_available
+        return stats
+
+
+principal_cache = PrincipalCache(PRINCIPAL_CACHE_MAX_ENTRIES, PRINCIPAL_CACHE_TTL_SECONDS, PRINCIPAL_LOCAL_TTL_SECONDS)
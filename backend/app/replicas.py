@@ -0,0 +1,228 @@
+"""
+只读副本路由
+
+配置 DATABASE_REPLICA_URLS（逗号分隔）后，只读接口（帖子/商品列表、用户主页统计、关注/粉丝列表、通知列表）
+通过 get_read_db / get_async_read_db 取会话，按轮询分到延迟正常的副本上；写操作仍然只走 get_db / get_async_db（主库）。
+
+- 读己之写：用户的非 GET 请求结束后记一个写标记（Redis 启用时放 Redis，多个 worker 共享，否则只在进程内），
+  READ_YOUR_WRITES_SECONDS 秒内该用户的读请求都走主库，刚写的内容不会因为副本延迟“消失”
+- 延迟监控：后台线程每 REPLICA_LAG_CHECK_INTERVAL_SECONDS 秒查询各副本的复制延迟，
+  超过 REPLICA_MAX_LAG_SECONDS、查询失败或尚未检查过的副本不参与路由；没有可用副本时回退到主库
+
+注意匿名列表的响应缓存（app/cache.py）：写入使缓存失效后，若副本还没追上，缓存可能被写入前的数据重新填充，
+其他用户最多在 CACHE_TTL_SECONDS 内看到旧列表。
+未配置副本时两个依赖直接返回主库会话，行为与之前相同。
+"""
+import itertools
+import os
+import threading
+import time
+from typing import List, Optional
+from fastapi import Depends, Request
+from sqlalchemy import create_engine, make_url, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from . import database
+from .auth import SECRET_KEY, ALGORITHM
+from .cache import LRUCache, r, redis_available
+from .principal_cache import principal_cache
+from .scheduler import IntervalScheduler
+
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", 5))
+REPLICA_LAG_CHECK_INTERVAL_SECONDS = float(os.getenv("REPLICA_LAG_CHECK_INTERVAL_SECONDS", 5))
+READ_YOUR_WRITES_SECONDS = int(os.getenv("READ_YOUR_WRITES_SECONDS", 10))
+
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# 主库（或不是备库）时为 0；WAL 已全部回放时为 0，否则为距最后一次回放的秒数
+PG_REPLICA_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+class Replica:
+    def __init__(self, url: str):
+        self.url = url
+        self.engine = create_engine(url, **database.pool_options(url))
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        async_url = database.to_async_url(url)
+        self.async_engine = create_async_engine(async_url, **database.pool_options(async_url, async_driver=True))
+        self.AsyncSessionLocal = async_sessionmaker(
+            self.async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+        )
+        # None：尚未检查或检查失败
+        self.lag: Optional[float] = None
+        self.checked_at: Optional[float] = None
+        self.error: Optional[str] = None
+
+    @property
+    def available(self) -> bool:
+        return self.lag is not None and self.lag <= REPLICA_MAX_LAG_SECONDS
+
+    def check_lag(self):
+        try:
+            with self.engine.connect() as conn:
+                if self.engine.dialect.name == "postgresql":
+                    self.lag = float(conn.execute(PG_REPLICA_LAG_SQL).scalar() or 0)
+                else:
+                    conn.execute(text("SELECT 1"))
+                    self.lag = 0.0
+            self.error = None
+        except Exception as e:
+            self.lag = None
+            self.error = str(e)
+        self.checked_at = time.time()
+
+    def dispose(self):
+        self.engine.dispose()
+        self.async_engine.sync_engine.dispose()
+
+
+class ReplicaRouter:
+    def __init__(self):
+        self.replicas: List[Replica] = []
+        self.monitor = IntervalScheduler()
+        self._round_robin = itertools.count()
+        # Redis 不可用时的写标记（也作为 Redis 前面的一层，本进程内的写立即可见）
+        self._recent_writers = LRUCache(100000, READ_YOUR_WRITES_SECONDS)
+        self._lock = threading.Lock()
+        self.stats = {"replica_reads": 0, "primary_reads": 0, "pinned_reads": 0, "lag_fallbacks": 0}
+
+    def configure(self, urls: List[str]):
+        self.reset()
+        self.replicas = [Replica(url) for url in urls]
+
+    def reset(self):
+        self.monitor.stop()
+        self.monitor = IntervalScheduler()
+        for replica in self.replicas:
+            replica.dispose()
+        self.replicas = []
+        self._recent_writers.clear()
+
+    def start_monitor(self):
+        if not self.replicas:
+            return
+        self.monitor.add_job("replica-lag", REPLICA_LAG_CHECK_INTERVAL_SECONDS, self.check_lag)
+        self.monitor.start()
+
+    def check_lag(self):
+        for replica in self.replicas:
+            replica.check_lag()
+
+    def _count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    # ---- 读己之写 ----
+
+    def mark_write(self, subject: str):
+        self._recent_writers.set(subject, True)
+        if redis_available and r:
+            try:
+                r.setex(f"recent_write:{subject}", READ_YOUR_WRITES_SECONDS, 1)
+            except Exception:
+                pass
+
+    def recently_wrote(self, subject: str) -> bool:
+        if self._recent_writers.get(subject):
+            return True
+        if redis_available and r:
+            try:
+                return bool(r.exists(f"recent_write:{subject}"))
+            except Exception:
+                # 拿不准时走主库
+                return True
+        return False
+
+    # ---- 路由 ----
+
+    def pick(self, request: Request) -> Optional[Replica]:
+        """返回本次读请求应使用的副本，None 表示走主库"""
+        if not self.replicas:
+            return None
+        subject = request_subject(request)
+        if subject and self.recently_wrote(subject):
+            request.state.read_your_writes = True
+            self._count("pinned_reads")
+            self._count("primary_reads")
+            return None
+        candidates = [replica for replica in self.replicas if replica.available]
+        if not candidates:
+            self._count("lag_fallbacks")
+            self._count("primary_reads")
+            return None
+        self._count("replica_reads")
+        return candidates[next(self._round_robin) % len(candidates)]
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        stats["replicas"] = [
+            {
+                "url": make_url(replica.url).render_as_string(hide_password=True),
+                "lag_seconds": replica.lag,
+                "available": replica.available,
+                "checked_at": replica.checked_at,
+                "error": replica.error,
+            }
+            for replica in self.replicas
+        ]
+        stats["max_lag_seconds"] = REPLICA_MAX_LAG_SECONDS
+        return stats
+
+
+replica_router = ReplicaRouter()
+if DATABASE_REPLICA_URLS:
+    replica_router.configure(DATABASE_REPLICA_URLS)
+
+
+def request_subject(request: Request) -> Optional[str]:
+    """请求携带的 JWT 的 sub（email），没有或无效时为 None；token 校验结果有缓存"""
+    authorization = request.headers.get("Authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    return principal_cache.subject(token, SECRET_KEY, ALGORITHM)
+
+
+def mark_request_write(request: Request):
+    """非 GET 请求结束后调用（main.py 的中间件）"""
+    if request.method in SAFE_METHODS or not replica_router.replicas:
+        return
+    subject = request_subject(request)
+    if subject:
+        replica_router.mark_write(subject)
+
+
+def read_your_writes(request: Request) -> bool:
+    """本次请求是否因为用户刚写过而固定读主库；这种请求不应读取共享的响应缓存（可能由副本数据填充）"""
+    return getattr(request.state, "read_your_writes", False)
+
+
+def get_read_db(request: Request, primary: Session = Depends(database.get_db)):
+    """只读接口用的同步会话；主库会话在真正执行 SQL 前不会占用连接"""
+    replica = replica_router.pick(request)
+    if replica is None:
+        yield primary
+        return
+    db = replica.SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_read_db(request: Request, primary: AsyncSession = Depends(database.get_async_db)):
+    """只读接口用的异步会话"""
+    replica = replica_router.pick(request)
+    if replica is None:
+        yield primary
+        return
+    async with replica.AsyncSessionLocal() as db:
+        yield db
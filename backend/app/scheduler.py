@@ -0,0 +1,95 @@
+"""
+进程内周期任务调度器
+
+未启用 Redis 时没有 Celery beat，由这里在后台线程里按间隔执行 celery_app.PERIODIC_TASKS。
+任务都是幂等的（重算/校正/截断），多个 worker 进程各自执行也不会出错，只是多做一些工作。
+设置 SCHEDULER_ENABLED=false 可关闭（例如测试环境）。
+"""
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() == "true"
+
+
+class IntervalScheduler:
+    def __init__(self):
+        self._jobs: List[dict] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add_job(self, name: str, interval: float, func: Callable, run_immediately: bool = True):
+        self._jobs.append({
+            "name": name,
+            "interval": interval,
+            "func": func,
+            "next_run": time.monotonic() + (0 if run_immediately else interval),
+            "runs": 0,
+            "failures": 0,
+            "last_duration": None,
+        })
+
+    def _run_due(self):
+        now = time.monotonic()
+        for job in self._jobs:
+            if job["next_run"] > now:
+                continue
+            started = time.monotonic()
+            try:
+                job["func"]()
+                job["runs"] += 1
+            except Exception as e:
+                job["failures"] += 1
+                print(f"Scheduled job {job['name']} failed: {e}")
+            job["last_duration"] = round(time.monotonic() - started, 3)
+            job["next_run"] = time.monotonic() + job["interval"]
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self._run_due()
+            next_run = min((job["next_run"] for job in self._jobs), default=time.monotonic() + 60)
+            self._stop.wait(max(next_run - time.monotonic(), 0.05))
+
+    def start(self):
+        if self._thread is not None or not self._jobs:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="interval-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def get_stats(self) -> Dict[str, dict]:
+        return {
+            job["name"]: {
+                "interval": job["interval"],
+                "runs": job["runs"],
+                "failures": job["failures"],
+                "last_duration": job["last_duration"],
+            }
+            for job in self._jobs
+        }
+
+
+scheduler = IntervalScheduler()
+
+
+def start_periodic_tasks():
+    """Redis 未启用时，在进程内调度 PERIODIC_TASKS"""
+    from .celery_app import celery_app, PERIODIC_TASKS, REDIS_ENABLED
+
+    if REDIS_ENABLED or not SCHEDULER_ENABLED:
+        return
+    for name, task_name, interval in PERIODIC_TASKS:
+        task = celery_app.tasks.get(task_name)
+        if task is None:
+            print(f"Scheduled job {name}: task {task_name} is not registered")
+            continue
+        scheduler.add_job(name, interval, task)
+    scheduler.start()
+    print(f"In-process scheduler started with {len(scheduler.get_stats())} jobs")
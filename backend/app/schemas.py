@@ -66,19 +66,31 @@ class CommentOut(BaseModel):
     id: int
     content: str
     author: UserOut
+    parent_id: Optional[int] = None
+    depth: int = 0
     created_at: datetime
 
     class Config:
         from_attributes = True
 
+class CommentThreadOut(CommentOut):
+    # 前几条回复（按树的先序排列，depth 表示缩进层级）
+    replies: List[CommentOut] = []
+    reply_count: int = 0  # 整个线程的回复总数
+    replies_cursor: Optional[str] = None  # 传给 GET /api/comments/{id}/replies 继续加载
+
 class PostOut(PostBase):
     id: int
     author: Optional[UserOut]
     author_id: Optional[int] = None  # Always include author_id for delete permission check
     translated_cache: Optional[Dict[str, str]] = None
     is_translated: bool
+    # 只在请求带 lang 时给出：original / ready / pending / failed（见 services/translation_service.py）
+    translation_status: Optional[str] = None
     is_anonymous: bool = False
     likes: int
+    comment_count: int = 0  # Total comments; `comments` only holds the latest few
+    favorite_count: int = 0
     liked_by_me: bool
     favorited_by_me: bool = False
     comments: List[CommentOut] = []
@@ -88,12 +100,28 @@ class PostOut(PostBase):
     class Config:
         from_attributes = True
 
+class PostSearchResult(BaseModel):
+    post: PostOut
+    rank: float
+    title_snippet: str  # HTML-escaped, matches wrapped in <mark>
+    snippet: str
+
 # Comment Schemas
 class CommentCreate(BaseModel):
     post_id: int
     content: str
     parent_id: Optional[int] = None
 
+# Tag Schemas
+class TagOut(BaseModel):
+    id: int
+    name: str
+    post_count: int
+    item_count: int
+
+    class Config:
+        from_attributes = True
+
 # Badge Schemas
 class BadgeOut(BaseModel):
     id: int
@@ -152,7 +180,9 @@ class ItemOut(ItemBase):
 class NotificationOut(BaseModel):
     id: int
     type: str  # 'like', 'favorite', 'follow', 'comment'
-    actor: Optional[UserOut] = None
+    actor: Optional[UserOut] = None  # 最近的 actor
+    actor_count: int = 1  # 合并进这条通知的人数（"A 和其他 12 人"）
+    actors: List[UserOut] = []  # 最近的几个 actor，最新的在前
     target_type: Optional[str] = None
     target_id: Optional[int] = None
     read: bool
@@ -0,0 +1,186 @@
+"""
+徽章事件的后台队列（按用户合并、延迟处理）
+
+请求里只调用 badge_queue.enqueue(...)，不访问数据库，也不等待徽章评估：
+- 同一用户的事件先攒起来，第一个事件到达后等 BADGE_DEBOUNCE_SECONDS 秒再一起交给
+  badge_service.apply_events（一次加锁、一次提交）；某个作者的帖子连续收到 50 个赞只评估一次
+- Redis 可用且 Celery 不是 eager 模式时：事件 RPUSH 到 badge:events:{user}，
+  SET NX 抢到 badge:scheduled:{user} 的请求用 apply_async(countdown=...) 投递一次 evaluate_user_badges_task
+- 否则在本进程里处理：一个调度线程按到期时间取出用户，交给 BADGE_WORKERS 个线程执行
+
+/health/badges 给出队列深度（待处理的用户数、事件数）、评估耗时和事件排队时间。
+"""
+import heapq
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from ..cache import r, redis_available
+from ..celery_app import celery_app
+from ..database import SessionLocal
+from .badge_service import BadgeEvent, apply_events
+
+BADGE_DEBOUNCE_SECONDS = float(os.getenv("BADGE_DEBOUNCE_SECONDS", 2))
+BADGE_WORKERS = int(os.getenv("BADGE_WORKERS", 2))
+# badge:scheduled:{user} 的过期时间 = 延迟 + 这个秒数，任务丢失时之后的事件仍能重新投递
+BADGE_SCHEDULE_GRACE_SECONDS = int(os.getenv("BADGE_SCHEDULE_GRACE_SECONDS", 60))
+
+
+def _dump(event: BadgeEvent) -> str:
+    return json.dumps([event.name, event.at.isoformat() if event.at else None, event.language, event.delta])
+
+
+def _load(raw) -> BadgeEvent:
+    name, at, language, delta = json.loads(raw)
+    return BadgeEvent(name, datetime.fromisoformat(at) if at else None, language, delta)
+
+
+class BadgeQueue:
+    def __init__(self, debounce: float, workers: int):
+        self.debounce = debounce
+        self.workers = workers
+        self.session_factory = SessionLocal
+        self._pending: Dict[int, List[BadgeEvent]] = {}
+        self._first_seen: Dict[int, float] = {}
+        self._due: List[Tuple[float, int]] = []
+        self._cond = threading.Condition()
+        self._pid = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.stats = {
+            "enqueued": 0, "coalesced": 0, "dispatched": 0, "evaluations": 0, "awarded": 0, "failures": 0,
+            "eval_seconds_total": 0.0, "eval_seconds_max": 0.0, "wait_seconds_total": 0.0, "wait_seconds_max": 0.0,
+        }
+
+    def _use_celery(self) -> bool:
+        return bool(redis_available and r) and not celery_app.conf.task_always_eager
+
+    def enqueue(self, event: str, user_id: Optional[int], at: Optional[datetime] = None,
+                language: Optional[str] = None, delta: int = 1):
+        if not user_id:
+            return
+        item = BadgeEvent(event, at, language, delta)
+        if self._use_celery():
+            try:
+                self._enqueue_remote(user_id, item)
+                return
+            except Exception as e:
+                print(f"Badge event dispatch failed, handling in process: {e}")
+
+        with self._cond:
+            self._ensure_worker()
+            self.stats["enqueued"] += 1
+            if user_id in self._pending:
+                self._pending[user_id].append(item)
+                self.stats["coalesced"] += 1
+                return
+            self._pending[user_id] = [item]
+            self._first_seen[user_id] = time.monotonic()
+            heapq.heappush(self._due, (time.monotonic() + self.debounce, user_id))
+            self._cond.notify()
+
+    def _enqueue_remote(self, user_id: int, item: BadgeEvent):
+        r.rpush(f"badge:events:{user_id}", _dump(item))
+        scheduled = r.set(f"badge:scheduled:{user_id}", time.time(), nx=True,
+                          ex=int(self.debounce) + BADGE_SCHEDULE_GRACE_SECONDS)
+        if scheduled:
+            evaluate_user_badges_task.apply_async((user_id, time.time()), countdown=self.debounce)
+        with self._cond:
+            self.stats["enqueued"] += 1
+            self.stats["dispatched" if scheduled else "coalesced"] += 1
+
+    def drain_remote(self, user_id: int) -> List[BadgeEvent]:
+        """Celery 任务取出该用户攒下的全部事件；先删 scheduled，之后到达的事件会投递新任务"""
+        r.delete(f"badge:scheduled:{user_id}")
+        pipe = r.pipeline(transaction=True)
+        pipe.lrange(f"badge:events:{user_id}", 0, -1)
+        pipe.delete(f"badge:events:{user_id}")
+        raw, _ = pipe.execute()
+        return [_load(item) for item in raw]
+
+    def _ensure_worker(self):
+        # fork 出来的子进程需要自己的线程（调用方持有 _cond）
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="badges")
+        threading.Thread(target=self._loop, name="badge-queue", daemon=True).start()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._due or self._due[0][0] > time.monotonic():
+                    self._cond.wait(self._due[0][0] - time.monotonic() if self._due else None)
+                _, user_id = heapq.heappop(self._due)
+                # flush() 已经处理过的用户会留下过期的条目
+                events = self._pending.pop(user_id, None)
+                first_seen = self._first_seen.pop(user_id, None)
+            if events:
+                self._executor.submit(self.evaluate, user_id, events, first_seen)
+
+    def evaluate(self, user_id: int, events: List[BadgeEvent], first_seen: Optional[float] = None,
+                 wait_seconds: Optional[float] = None) -> List[str]:
+        started = time.monotonic()
+        if wait_seconds is None:
+            wait_seconds = started - first_seen if first_seen is not None else 0.0
+        awarded: List[str] = []
+        failed = False
+        try:
+            db = self.session_factory()
+            try:
+                awarded = apply_events(db, user_id, events)
+            finally:
+                db.close()
+        except Exception as e:
+            failed = True
+            print(f"Badge evaluation failed for user {user_id}: {e}")
+        elapsed = time.monotonic() - started
+        with self._cond:
+            self.stats["evaluations"] += 1
+            self.stats["failures"] += failed
+            self.stats["awarded"] += len(awarded)
+            self.stats["eval_seconds_total"] += elapsed
+            self.stats["eval_seconds_max"] = max(self.stats["eval_seconds_max"], elapsed)
+            self.stats["wait_seconds_total"] += wait_seconds
+            self.stats["wait_seconds_max"] = max(self.stats["wait_seconds_max"], wait_seconds)
+        return awarded
+
+    def flush(self):
+        """立即处理本进程里所有待处理的事件（关闭时和测试里用）"""
+        with self._cond:
+            pending, first_seen = self._pending, self._first_seen
+            self._pending, self._first_seen = {}, {}
+        for user_id, events in pending.items():
+            self.evaluate(user_id, events, first_seen.get(user_id))
+
+    def clear(self):
+        with self._cond:
+            self._pending.clear()
+            self._first_seen.clear()
+            self._due.clear()
+
+    def get_stats(self) -> dict:
+        with self._cond:
+            stats = dict(self.stats)
+            stats["pending_users"] = len(self._pending)
+            stats["pending_events"] = sum(len(events) for events in self._pending.values())
+        evaluations = stats["evaluations"]
+        stats["eval_seconds_avg"] = round(stats["eval_seconds_total"] / evaluations, 4) if evaluations else 0.0
+        stats["wait_seconds_avg"] = round(stats["wait_seconds_total"] / evaluations, 4) if evaluations else 0.0
+        stats["mode"] = "celery" if self._use_celery() else "in_process"
+        return stats
+
+
+badge_queue = BadgeQueue(BADGE_DEBOUNCE_SECONDS, BADGE_WORKERS)
+
+
+@celery_app.task
+def evaluate_user_badges_task(user_id: int, enqueued_at: Optional[float] = None):
+    events = badge_queue.drain_remote(user_id)
+    if not events:
+        return "No pending badge events"
+    wait = time.time() - enqueued_at if enqueued_at else None
+    awarded = badge_queue.evaluate(user_id, events, wait_seconds=wait)
+    return f"Applied {len(events)} badge events for user {user_id}, awarded {awarded}"
@@ -1,145 +1,525 @@
+"""
+徽章引擎（事件驱动、增量计算）
+
+业务代码在写入成功后报告领域事件（请求里用 badge_queue.enqueue 交给后台按用户合并处理）：
+- post_created：发帖（at=发帖时间, language=source_language）
+- like_received：帖子被点赞（delta=-1 表示取消点赞）
+- comment_created：发表评论
+- item_sold：商品变为已售（delta=-1 表示从已售改回其他状态）
+
+每个用户在 user_badge_progress 里有一行计数（发帖数、深夜发帖数、用过的语言、连续发帖天数、收到的赞……）
+和已获得的徽章名。一批事件只锁定这一行、更新对应计数、检查受这些事件影响的规则，与用户的历史数据量无关。
+用户还没有计数行时（引擎上线前的老用户）先从历史数据重建一次。
+删除帖子/评论不回退计数；需要与历史数据完全一致、或新增/修改了规则需要补发时运行 backfill
+（按 user id 分批、多进程并行、批量写入，可中断后继续）：
+
+    cd backend
+    python -m app.services.badge_service backfill --workers 4 --batch-size 500
+
+check_badges_for_user 按历史数据重建该用户的计数并检查全部规则（供后台任务使用）。
+按历史数据评估时每条规则是一条集合运算的 SQL（连续发帖用窗口函数，语言数用 COUNT(DISTINCT)，
+收到的赞用聚合 JOIN），一批用户一次查询，不把帖子加载到 Python 里；见 BadgeRule。
+"""
+import json
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+from sqlalchemy import Integer, func, select
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
-from datetime import datetime, timedelta
-from ..models import Post, User, Badge, UserBadge, Translation, Item, Comment, Like
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.functions import FunctionElement
+from ..models import Post, User, Badge, UserBadge, UserBadgeProgress, Item, Comment, Like
+from ..cache import LRUCache
+from ..utils.bulk import insert_ignore, upsert
 
-def check_badges_for_user(user_id: int, db: Session):
+BADGE_EVENTS = ("post_created", "like_received", "comment_created", "item_sold")
+BADGE_ID_CACHE_SECONDS = int(os.getenv("BADGE_ID_CACHE_SECONDS", 300))
+
+# 0:00-6:00 发帖算深夜
+NIGHT_HOURS = (0, 5)
+
+
+class BadgeEvent(NamedTuple):
+    name: str
+    at: Optional[datetime] = None
+    language: Optional[str] = None
+    delta: int = 1
+
+
+class day_number(FunctionElement):
+    """日期 → 连续的整数天数（用于 gaps-and-islands 计算连续发帖天数）"""
+    type = Integer()
+    inherit_cache = True
+
+
+@compiles(day_number)
+def _day_number_sqlite(element, compiler, **kw):
+    return "CAST(julianday(%s) AS INTEGER)" % compiler.process(element.clauses, **kw)
+
+
+@compiles(day_number, "postgresql")
+def _day_number_postgresql(element, compiler, **kw):
+    return "(CAST(%s AS DATE) - DATE '1970-01-01')" % compiler.process(element.clauses, **kw)
+
+
+# 每个度量：给定一批用户，返回 (user_id, value) 的分组查询，全部在数据库里计算
+Measure = Callable[[List[int]], Select]
+
+
+def _post_count(user_ids: List[int]) -> Select:
+    return select(Post.author_id.label("user_id"), func.count(Post.id).label("value")).where(
+        Post.author_id.in_(user_ids)
+    ).group_by(Post.author_id)
+
+
+def _night_post_count(user_ids: List[int]) -> Select:
+    return _post_count(user_ids).where(func.extract('hour', Post.created_at).between(*NIGHT_HOURS))
+
+
+def _language_count(user_ids: List[int]) -> Select:
+    return select(Post.author_id.label("user_id"), func.count(Post.source_language.distinct()).label("value")).where(
+        Post.author_id.in_(user_ids)
+    ).group_by(Post.author_id)
+
+
+def _streak_runs(user_ids: List[int]):
+    """每段连续发帖的 (user_id, 天数, 最后一天)：日期序号减去行号，同一段连续日期得到相同的值"""
+    days = select(Post.author_id.label("user_id"), func.date(Post.created_at).label("day")).where(
+        Post.author_id.in_(user_ids)
+    ).distinct().subquery()
+    islands = select(
+        days.c.user_id, days.c.day,
+        (day_number(days.c.day) - func.row_number().over(partition_by=days.c.user_id, order_by=days.c.day)).label("island"),
+    ).subquery()
+    return select(
+        islands.c.user_id, func.count().label("length"), func.max(islands.c.day).label("last_day"),
+    ).group_by(islands.c.user_id, islands.c.island).subquery()
+
+
+def _longest_streak(user_ids: List[int]) -> Select:
+    runs = _streak_runs(user_ids)
+    return select(runs.c.user_id, func.max(runs.c.length).label("value")).group_by(runs.c.user_id)
+
+
+def _likes_received(user_ids: List[int]) -> Select:
+    return select(Post.author_id.label("user_id"), func.count(Like.id).label("value")).join(
+        Like, Like.post_id == Post.id
+    ).where(Post.author_id.in_(user_ids)).group_by(Post.author_id)
+
+
+def _comment_count(user_ids: List[int]) -> Select:
+    return select(Comment.author_id.label("user_id"), func.count(Comment.id).label("value")).where(
+        Comment.author_id.in_(user_ids)
+    ).group_by(Comment.author_id)
+
+
+def _items_sold(user_ids: List[int]) -> Select:
+    return select(Item.user_id.label("user_id"), func.count(Item.id).label("value")).where(
+        Item.user_id.in_(user_ids), Item.status == 'sold'
+    ).group_by(Item.user_id)
+
+
+class BadgeRule:
+    """
+    徽章规则接口：
+    - events：受哪些事件影响（增量评估时只检查这些规则）
+    - reached(progress)：根据 user_badge_progress 的计数判断，O(1)
+    - qualifying_users(db, user_ids)：按历史数据在数据库里判断一批用户，用于重建和批量补发
+    新规则继承这个类并加入 RULES 即可。
+    """
+    name: str
+    events: Tuple[str, ...] = ()
+
+    def reached(self, progress: UserBadgeProgress) -> bool:
+        raise NotImplementedError
+
+    def qualifying_users(self, db: Session, user_ids: List[int]) -> Set[int]:
+        raise NotImplementedError
+
+
+class ThresholdRule(BadgeRule):
+    """某个度量达到门槛即获得；progress_value 从计数行取同一个度量"""
+
+    def __init__(self, name: str, events: Tuple[str, ...], measure: Measure, threshold: int,
+                 progress_value: Callable[[UserBadgeProgress], int]):
+        self.name = name
+        self.events = events
+        self.measure = measure
+        self.threshold = threshold
+        self.progress_value = progress_value
+
+    def reached(self, progress: UserBadgeProgress) -> bool:
+        return (self.progress_value(progress) or 0) >= self.threshold
+
+    def qualifying_users(self, db: Session, user_ids: List[int]) -> Set[int]:
+        values = self.measure(user_ids).subquery()
+        return set(db.scalars(select(values.c.user_id).where(values.c.value >= self.threshold)))
+
+
+RULES: List[BadgeRule] = [
+    ThresholdRule("first_post", ("post_created",), _post_count, 1, lambda p: p.post_count),
+    ThresholdRule("night_owl", ("post_created",), _night_post_count, 1, lambda p: p.night_post_count),
+    ThresholdRule("streak_poster", ("post_created",), _longest_streak, 5, lambda p: p.longest_streak),
+    ThresholdRule("polyglot", ("post_created",), _language_count, 2, lambda p: len(_split(p.languages))),
+    ThresholdRule("heart_collector", ("like_received",), _likes_received, 10, lambda p: p.likes_received),
+    ThresholdRule("comment_king", ("comment_created",), _comment_count, 20, lambda p: p.comment_count),
+    ThresholdRule("top_seller", ("item_sold",), _items_sold, 5, lambda p: p.items_sold),
+    # TODO: smart_buyer（买入 3 件）需要购买记录表，helpful_friend 需要评论点赞
+]
+RULES_BY_EVENT: Dict[str, List[BadgeRule]] = {
+    event: [rule for rule in RULES if event in rule.events] for event in BADGE_EVENTS
+}
+
+# user_badge_progress 的计数列 → 度量
+PROGRESS_MEASURES: Dict[str, Measure] = {
+    "post_count": _post_count,
+    "night_post_count": _night_post_count,
+    "likes_received": _likes_received,
+    "comment_count": _comment_count,
+    "items_sold": _items_sold,
+}
+
+_badge_ids = LRUCache(1, BADGE_ID_CACHE_SECONDS)
+
+
+def _split(value: Optional[str]) -> set:
+    return set(filter(None, (value or "").split(",")))
+
+
+def badge_ids(db: Session) -> Dict[str, int]:
+    """徽章名 → id；徽章定义只在部署时变化，进程内缓存"""
+    ids = _badge_ids.get("all")
+    if ids is None:
+        ids = dict(db.query(Badge.name, Badge.id).all())
+        _badge_ids.set("all", ids)
+    return ids
+
+
+def clear_badge_cache():
+    _badge_ids.clear()
+
+
+def _as_date(value) -> date:
+    # SQLite 的 date() 返回字符串
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+def compute_progress(db: Session, user_ids: List[int]) -> Dict[int, dict]:
+    """用历史数据计算一批用户的计数（每个度量一次分组查询），返回 {user_id: user_badge_progress 行}"""
+    rows = {
+        user_id: {
+            "user_id": user_id, "post_count": 0, "night_post_count": 0, "languages": "",
+            "last_post_date": None, "current_streak": 0, "longest_streak": 0,
+            "likes_received": 0, "comment_count": 0, "items_sold": 0, "awarded": "",
+        }
+        for user_id in user_ids
+    }
+    if not rows:
+        return rows
+
+    for field, measure in PROGRESS_MEASURES.items():
+        for user_id, value in db.execute(measure(user_ids)):
+            rows[user_id][field] = value or 0
+
+    languages: Dict[int, set] = {}
+    for user_id, language in db.execute(select(Post.author_id, Post.source_language).where(
+        Post.author_id.in_(user_ids), Post.source_language.isnot(None)
+    ).distinct()):
+        languages.setdefault(user_id, set()).add(language)
+    for user_id, seen in languages.items():
+        rows[user_id]["languages"] = ",".join(sorted(seen))
+
+    # 最近一段连续发帖（截至最后发帖日）和最长的一段
+    runs = _streak_runs(user_ids)
+    ranked = select(
+        runs.c.user_id, runs.c.length, runs.c.last_day,
+        func.max(runs.c.length).over(partition_by=runs.c.user_id).label("longest"),
+        func.row_number().over(partition_by=runs.c.user_id, order_by=runs.c.last_day.desc()).label("recency"),
+    ).subquery()
+    for user_id, current, last_day, longest in db.execute(
+        select(ranked.c.user_id, ranked.c.length, ranked.c.last_day, ranked.c.longest).where(ranked.c.recency == 1)
+    ):
+        rows[user_id].update(last_post_date=_as_date(last_day), current_streak=current, longest_streak=longest)
+
+    awarded: Dict[int, set] = {}
+    for user_id, name in db.execute(select(UserBadge.user_id, Badge.name).join(Badge, Badge.id == UserBadge.badge_id).where(
+        UserBadge.user_id.in_(user_ids)
+    )):
+        awarded.setdefault(user_id, set()).add(name)
+    for user_id, names in awarded.items():
+        rows[user_id]["awarded"] = ",".join(sorted(names))
+    return rows
+
+
+def qualified_badges(db: Session, user_ids: List[int]) -> Dict[int, Set[str]]:
+    """按历史数据评估一批用户的全部规则（每条规则一次查询），返回 {user_id: 满足条件的徽章名}"""
+    qualified: Dict[int, Set[str]] = {user_id: set() for user_id in user_ids}
+    if user_ids:
+        for rule in RULES:
+            for user_id in rule.qualifying_users(db, user_ids):
+                qualified[user_id].add(rule.name)
+    return qualified
+
+
+def _award(db: Session, progress: UserBadgeProgress, names: Iterable[str]) -> List[str]:
+    """写入新获得的徽章并记在 progress.awarded 里，返回新获得的徽章名。调用方负责 commit"""
+    have = _split(progress.awarded)
+    ids = badge_ids(db)
+    # 徽章表里没有的（尚未初始化）先不记为已获得，之后的事件会再检查
+    new = [name for name in names if name not in have and name in ids]
+    if new:
+        insert_ignore(db, UserBadge, [{"user_id": progress.user_id, "badge_id": ids[name]} for name in new],
+                      ("user_id", "badge_id"))
+        progress.awarded = ",".join(sorted(have.union(new)))
+    return new
+
+
+def _advance_streak(progress: UserBadgeProgress, day: date):
+    last = progress.last_post_date
+    if last is not None and day <= last:
+        # 同一天再次发帖；更早的日期（时钟回拨）交给 backfill
+        return
+    progress.current_streak = (progress.current_streak or 0) + 1 if last and day - last == timedelta(days=1) else 1
+    progress.longest_streak = max(progress.longest_streak or 0, progress.current_streak)
+    progress.last_post_date = day
+
+
+def _apply(progress: UserBadgeProgress, event: BadgeEvent):
+    name, at, language, delta = event
+    if name == "post_created":
+        at = at or datetime.now()
+        progress.post_count = (progress.post_count or 0) + 1
+        if NIGHT_HOURS[0] <= at.hour <= NIGHT_HOURS[1]:
+            progress.night_post_count = (progress.night_post_count or 0) + 1
+        if language:
+            progress.languages = ",".join(sorted(_split(progress.languages) | {language}))
+        _advance_streak(progress, at.date())
+    elif name == "like_received":
+        progress.likes_received = max((progress.likes_received or 0) + delta, 0)
+    elif name == "comment_created":
+        progress.comment_count = (progress.comment_count or 0) + delta
+    elif name == "item_sold":
+        progress.items_sold = max((progress.items_sold or 0) + delta, 0)
+    else:
+        raise ValueError(f"Unknown badge event: {name}")
+
+
+def _locked_progress(db: Session, user_id: int) -> Tuple[UserBadgeProgress, bool]:
+    """锁定用户的计数行；没有时从历史数据建立，第二个返回值表示是否刚重建（已包含当前事件）"""
+    query = db.query(UserBadgeProgress).filter(UserBadgeProgress.user_id == user_id).with_for_update()
+    progress = query.first()
+    if progress is not None:
+        return progress, False
+    insert_ignore(db, UserBadgeProgress, list(compute_progress(db, [user_id]).values()), ("user_id",))
+    return query.populate_existing().first(), True
+
+
+def apply_events(db: Session, user_id: int, events: List[BadgeEvent]) -> List[str]:
+    """
+    在事件对应的数据已经提交之后调用；一次锁定计数行，依次应用这批事件，检查受影响的规则并提交，
+    返回新获得的徽章名。失败时只打印日志并回滚，不影响调用方的业务结果。
+    """
     try:
-        user = db.query(User).filter(User.id == user_id).first()
-        if not user:
-            return
+        progress, rebuilt = _locked_progress(db, user_id)
+        if rebuilt:
+            awarded = _award(db, progress, [rule.name for rule in RULES if rule.reached(progress)])
+        else:
+            awarded = []
+            for event in events:
+                _apply(progress, event)
+                # 每个事件之后都检查，达到过的门槛不会因为同一批里之后的取消点赞等被错过
+                awarded += _award(db, progress, [rule.name for rule in RULES_BY_EVENT[event.name] if rule.reached(progress)])
+        db.commit()
+        return awarded
+    except Exception as e:
+        print(f"Badge events {[event.name for event in events]} failed for user {user_id}: {e}")
+        db.rollback()
+        return []
+
 
-        # 1. First Post Badge
-        first_post_badge = db.query(Badge).filter(Badge.name == 'first_post').first()
-        if first_post_badge:
-            has_badge = db.query(UserBadge).filter(
-                UserBadge.user_id == user_id, 
-                UserBadge.badge_id == first_post_badge.id
-            ).first()
-            
-            if not has_badge:
-                post_count = db.query(Post).filter(Post.author_id == user_id).count()
-                if post_count >= 1:
-                    db.add(UserBadge(user_id=user_id, badge_id=first_post_badge.id))
-        
-        # 2. Night Owl Badge - Posted between 0:00-6:00
-        night_owl_badge = db.query(Badge).filter(Badge.name == 'night_owl').first()
-        if night_owl_badge:
-            has_badge = db.query(UserBadge).filter(
-                UserBadge.user_id == user_id,
-                UserBadge.badge_id == night_owl_badge.id
-            ).first()
-            if not has_badge:
-                # Check if user has posted between 0:00-6:00
-                night_posts = db.query(Post).filter(
-                    Post.author_id == user_id,
-                    func.extract('hour', Post.created_at).between(0, 5)
-                ).first()
-                if night_posts:
-                    db.add(UserBadge(user_id=user_id, badge_id=night_owl_badge.id))
-        
-        # 3. Streak Poster - Posted 5 days in a row
-        streak_badge = db.query(Badge).filter(Badge.name == 'streak_poster').first()
-        if streak_badge:
-            has_badge = db.query(UserBadge).filter(
-                UserBadge.user_id == user_id,
-                UserBadge.badge_id == streak_badge.id
-            ).first()
-            if not has_badge:
-                # Check for 5 consecutive days of posting
-                posts = db.query(Post).filter(
-                    Post.author_id == user_id
-                ).order_by(Post.created_at.desc()).all()
-                
-                if len(posts) >= 5:
-                    # Get unique dates
-                    post_dates = set()
-                    for p in posts:
-                        post_date = p.created_at.date()
-                        post_dates.add(post_date)
-                    
-                    # Check for consecutive days
-                    sorted_dates = sorted(post_dates, reverse=True)
-                    if len(sorted_dates) >= 5:
-                        consecutive = 1
-                        for i in range(len(sorted_dates) - 1):
-                            if sorted_dates[i] - sorted_dates[i+1] == timedelta(days=1):
-                                consecutive += 1
-                            else:
-                                consecutive = 1
-                            if consecutive >= 5:
-                                db.add(UserBadge(user_id=user_id, badge_id=streak_badge.id))
-                                break
-        
-        # 4. Translation Master (polyglot) - Posted in multiple languages
-        # Note: Since translation feature is disabled, check for posts with different source_language instead
-        trans_badge = db.query(Badge).filter(Badge.name == 'polyglot').first()
-        if trans_badge:
-            has_badge = db.query(UserBadge).filter(
-                UserBadge.user_id == user_id, 
-                UserBadge.badge_id == trans_badge.id
-            ).first()
-            if not has_badge:
-                # Check for posts with different source languages
-                posts = db.query(Post).filter(Post.author_id == user_id).all()
-                languages = set(p.source_language for p in posts if p.source_language)
-                if len(languages) >= 2:  # Posted in at least 2 different languages
-                    db.add(UserBadge(user_id=user_id, badge_id=trans_badge.id))
-
-        # 5. Popular (Likes) - heart_collector
-        pop_badge = db.query(Badge).filter(Badge.name == 'heart_collector').first()
-        if pop_badge:
-            has_badge = db.query(UserBadge).filter(
-                UserBadge.user_id == user_id, 
-                UserBadge.badge_id == pop_badge.id
-            ).first()
-            if not has_badge:
-                # Sum likes
-                user_posts = db.query(Post).filter(Post.author_id == user_id).all()
-                total_likes = sum(len(p.likes) for p in user_posts)
-                if total_likes >= 10:
-                    db.add(UserBadge(user_id=user_id, badge_id=pop_badge.id))
-        
-        # 6. Comment King - Posted 20 comments
-        comment_king_badge = db.query(Badge).filter(Badge.name == 'comment_king').first()
-        if comment_king_badge:
-            has_badge = db.query(UserBadge).filter(
-                UserBadge.user_id == user_id,
-                UserBadge.badge_id == comment_king_badge.id
-            ).first()
-            if not has_badge:
-                comment_count = db.query(Comment).filter(Comment.author_id == user_id).count()
-                if comment_count >= 20:
-                    db.add(UserBadge(user_id=user_id, badge_id=comment_king_badge.id))
-        
-        # 7. Top Seller - Sold 5 items
-        top_seller_badge = db.query(Badge).filter(Badge.name == 'top_seller').first()
-        if top_seller_badge:
-            has_badge = db.query(UserBadge).filter(
-                UserBadge.user_id == user_id,
-                UserBadge.badge_id == top_seller_badge.id
-            ).first()
-            if not has_badge:
-                sold_count = db.query(Item).filter(
-                    Item.user_id == user_id,
-                    Item.status == 'sold'
-                ).count()
-                if sold_count >= 5:
-                    db.add(UserBadge(user_id=user_id, badge_id=top_seller_badge.id))
-        
-        # 8. Smart Buyer - Bought 3 items (需要根据实际业务逻辑调整)
-        smart_buyer_badge = db.query(Badge).filter(Badge.name == 'smart_buyer').first()
-        if smart_buyer_badge:
-            has_badge = db.query(UserBadge).filter(
-                UserBadge.user_id == user_id,
-                UserBadge.badge_id == smart_buyer_badge.id
-            ).first()
-            if not has_badge:
-                # 这里需要根据实际的购买记录来检查，暂时使用消息数作为替代
-                # 或者需要额外的购买记录表
-                pass  # TODO: 实现购买逻辑后添加
+def record_event(
+    db: Session,
+    event: str,
+    user_id: int,
+    at: Optional[datetime] = None,
+    language: Optional[str] = None,
+    delta: int = 1,
+) -> List[str]:
+    """立即处理单个事件（请求里一般用 badge_queue.enqueue 放到后台合并处理）"""
+    return apply_events(db, user_id, [BadgeEvent(event, at, language, delta)])
 
+
+def rebuild_progress(db: Session, user_ids: List[int]) -> int:
+    """
+    用历史数据重建一批用户的计数并按历史数据评估全部规则，返回新发放的徽章数。调用方负责 commit。
+    徽章和计数行都是一条批量 INSERT ... ON CONFLICT，与批次大小无关。
+    """
+    rows = compute_progress(db, user_ids)
+    qualified = qualified_badges(db, user_ids)
+    ids = badge_ids(db)
+    awards = []
+    for user_id, row in rows.items():
+        have = _split(row["awarded"])
+        new = sorted(name for name in qualified[user_id] if name not in have and name in ids)
+        awards.extend({"user_id": user_id, "badge_id": ids[name]} for name in new)
+        row["awarded"] = ",".join(sorted(have.union(new)))
+    insert_ignore(db, UserBadge, awards, ("user_id", "badge_id"))
+    upsert(db, UserBadgeProgress, list(rows.values()), ("user_id",))
+    return len(awards)
+
+
+def check_badges_for_user(user_id: int, db: Session):
+    """按历史数据完整重新评估一个用户的全部徽章"""
+    try:
+        if db.query(User.id).filter(User.id == user_id).first() is None:
+            return
+        rebuild_progress(db, [user_id])
         db.commit()
     except Exception as e:
         print(f"Badge check failed: {e}")
         db.rollback()
+
+
+def _backfill_batch(user_ids: List[int]) -> Tuple[int, int]:
+    """进程池里执行：每个 worker 进程用自己的 Session"""
+    from ..database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        awarded = rebuild_progress(db, user_ids)
+        db.commit()
+        return len(user_ids), awarded
+    finally:
+        db.close()
+
+
+def _init_worker():
+    # fork 出来的进程不能复用父进程连接池里的连接
+    from ..database import engine
+
+    engine.dispose(close=False)
+
+
+def _read_checkpoint(path: Optional[str]) -> dict:
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {"last_id": 0, "users": 0, "awarded": 0}
+
+
+def _write_checkpoint(path: Optional[str], state: dict):
+    if path:
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
+
+
+def backfill(
+    db: Session,
+    batch_size: int = 500,
+    workers: int = 0,
+    checkpoint: Optional[str] = None,
+) -> Tuple[int, int]:
+    """
+    按 users.id 的 keyset 分批重建所有用户的计数并补发徽章，返回 (本次处理的用户数, 新发放的徽章数)。
+    workers > 0 时各批在进程池里并行执行（db 只用来读取用户 id）；否则在当前 Session 里依次执行。
+    checkpoint 文件记录已经全部完成的最大 user id，中断后用同一个文件再次运行会从那里继续；完成后删除。
+    重建会覆盖 user_badge_progress，期间产生的徽章事件可能被重复计数或丢失，建议在低峰期运行。
+    """
+    state = _read_checkpoint(checkpoint)
+    if state["last_id"]:
+        print(f"Resuming badge backfill after user id {state['last_id']}")
+    total = db.query(func.count(User.id)).filter(User.id > state["last_id"]).scalar()
+    started = time.monotonic()
+    users = awarded = 0
+
+    def report(batch_users: int, batch_awarded: int, last_id: int):
+        nonlocal users, awarded
+        users += batch_users
+        awarded += batch_awarded
+        state.update(last_id=last_id, users=state["users"] + batch_users, awarded=state["awarded"] + batch_awarded)
+        _write_checkpoint(checkpoint, state)
+        rate = users / max(time.monotonic() - started, 1e-6)
+        eta = (total - users) / rate if rate else 0
+        print(f"Badge backfill: {users}/{total} users ({rate:.0f}/s, ETA {eta:.0f}s), "
+              f"{awarded} badges awarded, checkpoint at user id {last_id}")
+
+    def batches():
+        last_id = state["last_id"]
+        while True:
+            ids = [row[0] for row in db.query(User.id).filter(User.id > last_id).order_by(User.id).limit(batch_size)]
+            if not ids:
+                return
+            yield ids
+            last_id = ids[-1]
+
+    if workers <= 0:
+        for ids in batches():
+            batch_awarded = rebuild_progress(db, ids)
+            db.commit()
+            report(len(ids), batch_awarded, ids[-1])
+    else:
+        # 同时最多 workers * 2 批在执行；checkpoint 只推进到连续完成的最后一批
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            inflight: "OrderedDict[int, Future]" = OrderedDict()
+            done: Dict[int, Tuple[int, int]] = {}
+
+            def collect(block: bool):
+                for last_id, future in list(inflight.items()):
+                    if last_id in done:
+                        continue
+                    if block or future.done():
+                        done[last_id] = future.result()
+                        block = False
+                # 按提交顺序推进 checkpoint
+                while inflight and next(iter(inflight)) in done:
+                    last_id, _ = inflight.popitem(last=False)
+                    report(*done.pop(last_id), last_id)
+
+            for ids in batches():
+                inflight[ids[-1]] = pool.submit(_backfill_batch, ids)
+                if len(inflight) >= workers * 2:
+                    collect(block=True)
+                else:
+                    collect(block=False)
+            while inflight:
+                collect(block=True)
+
+    if checkpoint and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    return users, awarded
+
+
+def main(argv: Optional[List[str]] = None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m app.services.badge_service")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("backfill", help="rebuild badge progress and award badges for all users")
+    run.add_argument("--batch-size", type=int, default=500)
+    run.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                     help="worker processes, 0 to run in this process")
+    run.add_argument("--checkpoint", default="badge_backfill.checkpoint",
+                     help="progress file; rerun with the same file to resume")
+    run.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    args = parser.parse_args(argv)
+
+    from ..database import SessionLocal
+
+    if args.restart and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    db = SessionLocal()
+    try:
+        users, awarded = backfill(db, args.batch_size, args.workers, args.checkpoint)
+        print(f"Badge backfill finished: {users} users, {awarded} badges awarded")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
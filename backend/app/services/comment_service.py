@@ -0,0 +1,220 @@
+"""
+评论树
+
+每条评论保存物化路径 path（祖先链上每个 id 补零到 10 位后以 "/" 连接，末尾带 "/"）、
+层级 depth 和所在线程的顶层评论 root_id：
+- 子树 = path LIKE '<祖先 path>%'，按 path 排序即为先序（父在前、兄弟按时间先后）
+- 一页顶层线程的前 N 条回复用一次窗口查询取出（ROW_NUMBER() OVER (PARTITION BY root_id ORDER BY path)）
+- 删除/摘除子树都是一条 UPDATE/DELETE，不再逐层遍历子评论
+"""
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from fastapi import HTTPException, Response
+from sqlalchemy import Integer, cast, func, or_, select
+from sqlalchemy.orm import Session, joinedload
+from ..models import Comment
+from ..utils.pagination import keyset_paginate, encode_value_cursor, decode_value_cursor, NEXT_CURSOR_HEADER
+
+PATH_SEGMENT_WIDTH = 10
+REPLY_PREVIEW_SIZE = 3
+
+
+def _segment(comment_id: int) -> str:
+    return f"{comment_id:0{PATH_SEGMENT_WIDTH}d}/"
+
+
+def encode_path_cursor(path: str) -> str:
+    return encode_value_cursor(path)
+
+
+def decode_path_cursor(cursor: str) -> str:
+    path = decode_value_cursor(cursor)
+    if not path or path.strip("0123456789/"):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return path
+
+
+def assign_path(comment: Comment, parent: Optional[Comment] = None):
+    """评论 flush 拿到 id 之后调用，按父评论填好 path/depth/root_id"""
+    if parent is None:
+        comment.path = _segment(comment.id)
+        comment.depth = 0
+        comment.root_id = comment.id
+    else:
+        comment.path = parent.path + _segment(comment.id)
+        comment.depth = parent.depth + 1
+        comment.root_id = parent.root_id
+
+
+def _with_author(query):
+    return query.options(joinedload(Comment.author))
+
+
+def _reply_previews(
+    db: Session, root_ids: List[int], size: int
+) -> Tuple[Dict[int, List[Comment]], Dict[int, int]]:
+    """一次查询取出每个线程先序排列的前 size 条回复，以及每个线程的回复总数"""
+    rn = func.row_number().over(partition_by=Comment.root_id, order_by=Comment.path).label("rn")
+    total = func.count().over(partition_by=Comment.root_id).label("total")
+    ranked = select(Comment.id, rn, total).where(
+        Comment.root_id.in_(root_ids), Comment.depth > 0
+    ).subquery()
+
+    rows = _with_author(db.query(Comment, ranked.c.total)).join(
+        ranked, ranked.c.id == Comment.id
+    ).filter(ranked.c.rn <= size).order_by(Comment.root_id, Comment.path).all()
+
+    replies = defaultdict(list)
+    totals = {}
+    for comment, thread_total in rows:
+        replies[comment.root_id].append(comment)
+        totals[comment.root_id] = thread_total
+    return replies, totals
+
+
+def _reply_counts(db: Session, root_ids: List[int]) -> Dict[int, int]:
+    return dict(db.query(Comment.root_id, func.count(Comment.id)).filter(
+        Comment.root_id.in_(root_ids), Comment.depth > 0
+    ).group_by(Comment.root_id).all())
+
+
+def list_threads(
+    db: Session,
+    post_id: int,
+    limit: int,
+    cursor: Optional[str] = None,
+    replies: int = REPLY_PREVIEW_SIZE,
+    response: Optional[Response] = None,
+) -> List[dict]:
+    """
+    帖子的顶层线程（新→旧，游标分页），每个线程附带前 replies 条回复。
+    回复没有取完时给出 replies_cursor，用 list_replies 继续加载。
+    """
+    roots = keyset_paginate(
+        _with_author(db.query(Comment)).filter(Comment.post_id == post_id, Comment.depth == 0),
+        Comment.created_at, Comment.id, limit, cursor=cursor, response=response,
+    )
+    if not roots:
+        return []
+
+    root_ids = [c.id for c in roots]
+    if replies:
+        previews, totals = _reply_previews(db, root_ids, replies)
+    else:
+        previews, totals = {}, _reply_counts(db, root_ids)
+
+    threads = []
+    for root in roots:
+        shown = previews.get(root.id, [])
+        reply_count = totals.get(root.id, 0)
+        if len(shown) < reply_count:
+            last_path = shown[-1].path if shown else root.path
+            replies_cursor = encode_path_cursor(last_path)
+        else:
+            replies_cursor = None
+        threads.append({
+            "id": root.id,
+            "content": root.content,
+            "author": root.author,
+            "parent_id": root.parent_id,
+            "depth": root.depth,
+            "created_at": root.created_at,
+            "replies": shown,
+            "reply_count": reply_count,
+            "replies_cursor": replies_cursor,
+        })
+    return threads
+
+
+def list_replies(
+    db: Session,
+    comment: Comment,
+    limit: int,
+    cursor: Optional[str] = None,
+    response: Optional[Response] = None,
+) -> List[Comment]:
+    """comment 的整个子树（不含自身），按先序分页；游标是上一页最后一条的 path"""
+    query = _with_author(db.query(Comment)).filter(
+        Comment.root_id == comment.root_id,
+        Comment.path.like(comment.path + "%"),
+        Comment.id != comment.id,
+    )
+    if cursor:
+        query = query.filter(Comment.path > decode_path_cursor(cursor))
+
+    rows = query.order_by(Comment.path).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if response is not None and has_more and rows:
+        response.headers[NEXT_CURSOR_HEADER] = encode_path_cursor(rows[-1].path)
+    return rows
+
+
+def _subtree(db: Session, comment: Comment):
+    return db.query(Comment).filter(
+        Comment.root_id == comment.root_id,
+        Comment.path.like(comment.path + "%"),
+    )
+
+
+def delete_subtree(db: Session, comment: Comment) -> int:
+    """一条 DELETE 删除评论及其全部回复，返回删除的条数，调用方负责 commit 和计数"""
+    return _subtree(db, comment).delete(synchronize_session=False)
+
+
+def detach_subtree(db: Session, comment: Comment):
+    """
+    删除单条评论前调用：它的回复整体上移，直接回复变成顶层评论。
+    一条 UPDATE 去掉子树里所有 path 的公共前缀，并据此重算 depth 和 root_id。
+    """
+    prefix_len = len(comment.path)
+    new_path = func.substr(Comment.path, prefix_len + 1)
+    _subtree(db, comment).filter(Comment.id != comment.id).update({
+        Comment.path: new_path,
+        Comment.depth: Comment.depth - (comment.depth + 1),
+        Comment.root_id: cast(func.substr(Comment.path, prefix_len + 1, PATH_SEGMENT_WIDTH), Integer),
+    }, synchronize_session=False)
+    db.query(Comment).filter(Comment.parent_id == comment.id).update(
+        {Comment.parent_id: None}, synchronize_session=False
+    )
+
+
+def backfill_comment_paths(db: Session, batch_size: int = 1000) -> int:
+    """
+    为没有 path 的历史评论逐层补齐（先顶层，再补父评论已有 path 的回复），幂等，返回处理的条数。
+    """
+    total = 0
+    while True:
+        parent = Comment.__table__.alias("parent")
+        rows = db.query(Comment.id, parent.c.path, parent.c.depth, parent.c.root_id).outerjoin(
+            parent, parent.c.id == Comment.parent_id
+        ).filter(
+            Comment.path.is_(None),
+            or_(Comment.parent_id.is_(None), parent.c.path.isnot(None)),
+        ).order_by(Comment.id).limit(batch_size).all()
+        if not rows:
+            return total
+
+        for comment_id, parent_path, parent_depth, parent_root in rows:
+            if parent_path is None:
+                values = {"path": _segment(comment_id), "depth": 0, "root_id": comment_id}
+            else:
+                values = {
+                    "path": parent_path + _segment(comment_id),
+                    "depth": parent_depth + 1,
+                    "root_id": parent_root,
+                }
+            db.query(Comment).filter(Comment.id == comment_id).update(values, synchronize_session=False)
+        db.commit()
+        total += len(rows)
+
+
+if __name__ == "__main__":
+    # python -m app.services.comment_service
+    from ..database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        print(f"Backfilled paths for {backfill_comment_paths(db)} comments")
+    finally:
+        db.close()
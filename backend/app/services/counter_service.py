@@ -0,0 +1,64 @@
+from typing import Iterable, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import func, select, or_
+from ..models import Post, Like, Comment, Favorite
+from ..database import SessionLocal
+from ..celery_app import celery_app
+
+# 计数字段 -> 对应的明细表
+COUNTER_SOURCES = {
+    "like_count": Like,
+    "comment_count": Comment,
+    "favorite_count": Favorite,
+}
+
+
+def bump_counter(db: Session, post_id: int, field: str, delta: int):
+    """
+    原子地增减帖子的计数字段（UPDATE posts SET x = x + delta），不读取旧值，
+    避免并发点赞时的丢失更新。调用方负责 commit，使计数与明细行在同一事务内写入。
+    """
+    column = getattr(Post, field)
+    db.query(Post).filter(Post.id == post_id).update(
+        {column: column + delta},
+        synchronize_session=False,
+    )
+
+
+def get_counter(db: Session, post_id: int, field: str) -> int:
+    value = db.query(getattr(Post, field)).filter(Post.id == post_id).scalar()
+    return value or 0
+
+
+def reconcile_post_counters(db: Session, post_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    用明细表重新计算计数字段，修复漂移。只更新与实际值不一致的行，返回修复的行数。
+    post_ids 为空时处理全部帖子。
+    """
+    actual = {
+        field: select(func.count(model.id)).where(model.post_id == Post.id).correlate(Post).scalar_subquery()
+        for field, model in COUNTER_SOURCES.items()
+    }
+
+    query = db.query(Post).filter(or_(*[getattr(Post, field) != expr for field, expr in actual.items()]))
+    if post_ids is not None:
+        query = query.filter(Post.id.in_(list(post_ids)))
+
+    fixed = query.update(actual, synchronize_session=False)
+    db.commit()
+    return fixed
+
+
+@celery_app.task
+def reconcile_post_counters_task():
+    db = SessionLocal()
+    try:
+        fixed = reconcile_post_counters(db)
+        return f"Reconciled {fixed} posts"
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    # python -m app.services.counter_service
+    print(reconcile_post_counters_task())
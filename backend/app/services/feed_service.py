@@ -0,0 +1,115 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set
+from sqlalchemy.orm import Session, Query, joinedload
+from sqlalchemy import func
+from ..models import Post, Comment, Like, Favorite
+from .. import schemas
+
+# 帖子响应里只内嵌最新的几条评论，完整列表走 GET /api/posts/{id}/comments
+COMMENT_PREVIEW_SIZE = 3
+
+
+def with_feed_options(query: Query) -> Query:
+    """给帖子查询加上预加载选项：作者随帖子一起 JOIN"""
+    return query.options(joinedload(Post.author))
+
+
+def _ids_in(db: Session, model, user_id: int, post_ids: List[int]) -> Set[int]:
+    rows = db.query(model.post_id).filter(
+        model.user_id == user_id,
+        model.post_id.in_(post_ids)
+    ).all()
+    return {r[0] for r in rows}
+
+
+def _comment_previews(db: Session, post_ids: List[int], size: int) -> Dict[int, List[Comment]]:
+    """
+    一次查询取出每个帖子最新的 size 条评论（ROW_NUMBER() OVER (PARTITION BY post_id)），
+    评论作者随之 JOIN 加载。每个帖子内按时间正序返回，与原来的展示顺序一致。
+    """
+    rn = func.row_number().over(
+        partition_by=Comment.post_id,
+        order_by=(Comment.created_at.desc(), Comment.id.desc())
+    ).label("rn")
+    ranked = db.query(Comment.id.label("id"), rn).filter(Comment.post_id.in_(post_ids)).subquery()
+
+    comments = db.query(Comment).options(joinedload(Comment.author)).join(
+        ranked, ranked.c.id == Comment.id
+    ).filter(ranked.c.rn <= size).order_by(Comment.created_at, Comment.id).all()
+
+    previews = defaultdict(list)
+    for c in comments:
+        previews[c.post_id].append(c)
+    return previews
+
+
+def serialize_post(p: Post, liked: bool, favorited: bool, comments: Optional[List[Comment]] = None) -> dict:
+    # Hide author information if post is anonymous
+    author_info = None if p.is_anonymous else p.author
+
+    return {
+        "id": p.id,
+        "title": p.title,
+        "content": p.content,  # Return original, let frontend switch
+        "source_language": p.source_language,
+        "category": p.category,
+        "tags": p.tags.split(",") if p.tags else [],
+        "restriction_type": p.restriction_type,
+        "image_urls": p.image_urls,
+        "attachments": p.attachments,
+        "author": author_info,
+        "author_id": p.author_id,  # Always include author_id for delete permission check
+        "translated_cache": p.translated_cache,
+        "is_translated": p.is_translated,
+        "is_anonymous": p.is_anonymous,
+        "likes": p.like_count or 0,
+        "comment_count": p.comment_count or 0,
+        "favorite_count": p.favorite_count or 0,
+        "liked_by_me": liked,
+        "favorited_by_me": favorited,
+        "comments": comments or [],
+        "created_at": p.created_at
+    }
+
+
+def assemble_feed(db: Session, posts: Iterable[Post], viewer_id: Optional[int] = None) -> List[dict]:
+    """
+    把一页帖子组装成 PostOut 字典列表。
+    查询数固定：评论预览一次窗口查询，当前用户的点赞/收藏各一次 IN 查询，与帖子数量无关。
+    计数直接读取帖子上的反规范化字段，作者由 with_feed_options 预加载。
+    """
+    posts = list(posts)
+    if not posts:
+        return []
+
+    post_ids = [p.id for p in posts]
+    previews = _comment_previews(db, post_ids, COMMENT_PREVIEW_SIZE)
+
+    liked_ids: Set[int] = set()
+    favorited_ids: Set[int] = set()
+    if viewer_id:
+        liked_ids = _ids_in(db, Like, viewer_id, post_ids)
+        favorited_ids = _ids_in(db, Favorite, viewer_id, post_ids)
+
+    return [
+        serialize_post(
+            p,
+            liked=p.id in liked_ids,
+            favorited=p.id in favorited_ids,
+            comments=previews.get(p.id),
+        )
+        for p in posts
+    ]
+
+
+def assemble_post(db: Session, post: Post, viewer_id: Optional[int] = None) -> dict:
+    """单个帖子的组装，复用 assemble_feed 的批量逻辑"""
+    return assemble_feed(db, [post], viewer_id)[0]
+
+
+def dump_posts(results: List[dict]) -> List[dict]:
+    """把 assemble_feed 的结果转成纯 JSON 数据（用于缓存）"""
+    return [
+        schemas.PostOut.model_validate(r, from_attributes=True).model_dump(mode="json")
+        for r in results
+    ]
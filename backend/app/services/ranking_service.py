@@ -0,0 +1,168 @@
+"""
+热门排行
+
+定时任务（Celery beat，或未启用 Redis 时的进程内调度器，见 app/scheduler.py）读取
+最近 HOT_WINDOW_DAYS 天帖子上的反规范化计数，用 NumPy 按批向量化计算时间衰减分数：
+
+    score = (likes * W_LIKE + comments * W_COMMENT + favorites * W_FAVORITE + 1) / (age_hours + 2) ^ GRAVITY
+
+然后整体排序写入 post_scores（全站排名 rank + 分类内排名 category_rank）。
+GET /api/posts/?sort=hot 只按预计算的排名读取，不在请求里聚合点赞/评论。
+"""
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+import numpy as np
+from fastapi import Response
+from sqlalchemy import insert
+from sqlalchemy.orm import Session, Query
+from ..models import Post, PostScore
+from ..cache import response_cache
+from ..celery_app import celery_app
+from ..database import SessionLocal
+from ..utils.pagination import encode_value_cursor, decode_value_cursor, NEXT_CURSOR_HEADER
+from .feed_service import with_feed_options
+
+HOT_WINDOW_DAYS = int(os.getenv("HOT_WINDOW_DAYS", 7))
+HOT_GRAVITY = float(os.getenv("HOT_GRAVITY", 1.8))
+W_LIKE = 1.0
+W_COMMENT = 2.0
+W_FAVORITE = 3.0
+DEFAULT_CATEGORY = "other"
+
+
+def _epoch(value: datetime) -> float:
+    # SQLite 读出的是不带时区的 UTC 时间
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def hot_scores(likes, comments, favorites, created_epoch, now_epoch: float) -> np.ndarray:
+    """按数组整体计算分数（各参数为等长的一维数组）"""
+    engagement = (
+        np.asarray(likes, dtype=np.float64) * W_LIKE
+        + np.asarray(comments, dtype=np.float64) * W_COMMENT
+        + np.asarray(favorites, dtype=np.float64) * W_FAVORITE
+        + 1.0
+    )
+    age_hours = np.maximum(now_epoch - np.asarray(created_epoch, dtype=np.float64), 0.0) / 3600.0
+    return engagement / np.power(age_hours + 2.0, HOT_GRAVITY)
+
+
+def rank_positions(scores: np.ndarray, post_ids: np.ndarray, categories: np.ndarray):
+    """返回 (rank, category_rank)：分数降序，同分时新帖（id 大）在前"""
+    n = len(scores)
+    rank = np.empty(n, dtype=np.int64)
+    category_rank = np.empty(n, dtype=np.int64)
+    if n == 0:
+        return rank, category_rank
+    rank[np.lexsort((-post_ids, -scores))] = np.arange(1, n + 1)
+
+    # 按 (分类, 分数降序, id 降序) 排好后，每组的位置减去组首位置即为分类内排名
+    order = np.lexsort((-post_ids, -scores, categories))
+    sorted_categories = categories[order]
+    starts = np.r_[True, sorted_categories[1:] != sorted_categories[:-1]]
+    group_start = np.maximum.accumulate(np.where(starts, np.arange(n), 0))
+    category_rank[order] = np.arange(n) - group_start + 1
+    return rank, category_rank
+
+
+def compute_hot_scores(db: Session, now: Optional[datetime] = None, batch_size: int = 5000) -> int:
+    """
+    重新计算窗口内所有帖子的分数和排名，整体替换 post_scores（同一事务内，读者看到的要么是旧表要么是新表）。
+    返回参与排名的帖子数。
+    """
+    now = now or datetime.now(timezone.utc)
+    since = now - timedelta(days=HOT_WINDOW_DAYS)
+    now_epoch = _epoch(now)
+
+    ids, categories, scores = [], [], []
+    last_id = 0
+    while True:
+        batch = db.query(
+            Post.id, Post.category, Post.like_count, Post.comment_count, Post.favorite_count, Post.created_at
+        ).filter(
+            Post.id > last_id, Post.created_at >= since
+        ).order_by(Post.id).limit(batch_size).all()
+        if not batch:
+            break
+        columns = list(zip(*batch))
+        ids.append(np.asarray(columns[0], dtype=np.int64))
+        categories.append(np.asarray([c or DEFAULT_CATEGORY for c in columns[1]], dtype=object))
+        scores.append(hot_scores(
+            columns[2], columns[3], columns[4],
+            np.fromiter((_epoch(c) for c in columns[5]), dtype=np.float64, count=len(batch)),
+            now_epoch,
+        ))
+        last_id = batch[-1][0]
+
+    db.query(PostScore).delete(synchronize_session=False)
+    total = 0
+    if ids:
+        post_ids = np.concatenate(ids)
+        category_arr = np.concatenate(categories).astype(str)
+        score_arr = np.concatenate(scores)
+        rank, category_rank = rank_positions(score_arr, post_ids, category_arr)
+
+        rows = [
+            {"post_id": pid, "category": cat, "score": score, "rank": r, "category_rank": cr, "computed_at": now}
+            for pid, cat, score, r, cr in zip(
+                post_ids.tolist(), category_arr.tolist(), score_arr.tolist(), rank.tolist(), category_rank.tolist()
+            )
+        ]
+        for start in range(0, len(rows), batch_size):
+            db.execute(insert(PostScore), rows[start:start + batch_size])
+        total = len(rows)
+    db.commit()
+    response_cache.invalidate("posts")
+    return total
+
+
+def hot_paginate(
+    query: Query,
+    limit: int,
+    cursor: Optional[str] = None,
+    category: Optional[str] = None,
+    response: Optional[Response] = None,
+) -> List[Post]:
+    """按预计算排名分页（有分类时用分类内排名），游标是上一页最后一条的排名"""
+    rank_col = PostScore.category_rank if category else PostScore.rank
+    query = query.join(PostScore, PostScore.post_id == Post.id).add_columns(rank_col)
+    if cursor:
+        query = query.filter(rank_col > decode_value_cursor(cursor, int))
+
+    rows = query.order_by(rank_col).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if response is not None and has_more and rows:
+        response.headers[NEXT_CURSOR_HEADER] = encode_value_cursor(rows[-1][1])
+    return [row[0] for row in rows]
+
+
+def category_leaderboards(db: Session, per_category: int) -> Dict[str, List[Post]]:
+    """每个分类的前 per_category 名，一次查询走 (category, category_rank) 索引"""
+    rows = with_feed_options(db.query(Post, PostScore.category)).join(
+        PostScore, PostScore.post_id == Post.id
+    ).filter(
+        PostScore.category_rank <= per_category
+    ).order_by(PostScore.category, PostScore.category_rank).all()
+
+    boards: Dict[str, List[Post]] = {}
+    for post, category in rows:
+        boards.setdefault(category, []).append(post)
+    return boards
+
+
+@celery_app.task
+def compute_hot_scores_task():
+    db = SessionLocal()
+    try:
+        return f"Scored {compute_hot_scores(db)} posts"
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    # python -m app.services.ranking_service
+    print(compute_hot_scores_task())
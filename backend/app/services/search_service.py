@@ -0,0 +1,172 @@
+"""
+帖子全文检索
+
+PostgreSQL 自带的分词器不支持日语/中文，所以分词在应用层完成：
+- 汉字、假名、谚文等 CJK 字符按重叠的二元组（bigram）切分；建索引时额外写入单字（unigram），
+  这样单个汉字的查询（如「猫」）也能命中，多字查询仍按 bigram 匹配
+- 其他文字按单词切分并转为小写
+分词结果写入 posts.search_title / posts.search_body（空格分隔），
+PostgreSQL 上由生成列 posts.search_vector = setweight(title,'A') || setweight(body,'B') 维护，
+并建 GIN 索引。英文帖子（source_language = 'en'）用 'english' 配置（词干化、去停用词），
+其他语言用 'simple'；查询同样先分词，再用两种配置的 plainto_tsquery 取 OR 匹配、ts_rank_cd 排序。
+其他数据库（测试用的 SQLite）退回到按词元的字符串匹配。
+"""
+import html
+import re
+from typing import List, Optional, Tuple
+import bleach
+from sqlalchemy import func, literal_column, and_, or_, desc, false
+from sqlalchemy.orm import Session, Query
+from ..models import Post
+
+# CJK 统一汉字、扩展 A、兼容汉字、平假名、片假名（含半角）、谚文
+_CJK = "぀-ヿ㐀-䶿一-鿿豈-﫿ｦ-ﾟ가-힯"
+_TOKEN_RE = re.compile(f"[{_CJK}]+|[^\\W_{_CJK}]+")
+_CJK_RE = re.compile(f"[{_CJK}]")
+
+SNIPPET_RADIUS = 40
+SEARCH_CONFIG = "simple"
+# source_language 为 'en' 的帖子在生成列里使用的配置
+ENGLISH_SEARCH_CONFIG = "english"
+
+
+def tokenize(text: Optional[str], unigrams: bool = False) -> List[str]:
+    """
+    把文本切成检索词元：CJK 连续段切成 bigram（单字段保留单字），其余按单词小写。
+    unigrams=True 时（建索引用）CJK 段的每个字也作为词元输出。
+    """
+    if not text:
+        return []
+    tokens = []
+    for run in _TOKEN_RE.findall(text):
+        if _CJK_RE.match(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+                if unigrams:
+                    tokens.extend(run)
+        else:
+            tokens.append(run.lower())
+    return tokens
+
+
+def _document(text: Optional[str]) -> str:
+    # 首尾保留空格，便于非 PostgreSQL 环境下用 " token " 做精确词元匹配
+    tokens = tokenize(bleach.clean(text or "", tags=[], strip=True), unigrams=True)
+    return f" {' '.join(tokens)} " if tokens else ""
+
+
+def index_post(post: Post):
+    """写入/更新帖子时刷新检索文本（只改属性，不发查询）"""
+    post.search_title = _document(post.title)
+    post.search_body = _document(post.content)
+
+
+def _is_postgres(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def _ts_query(query_tokens: List[str]):
+    # 'simple' 匹配原样的词元，'english' 匹配英文帖子里词干化后的词元，两者取 OR
+    text = " ".join(query_tokens)
+    return func.plainto_tsquery(SEARCH_CONFIG, text).op("||")(
+        func.plainto_tsquery(ENGLISH_SEARCH_CONFIG, text)
+    )
+
+
+def apply_search(db: Session, query: Query, q: str) -> Query:
+    """给帖子查询加上全文匹配条件（不改变排序）"""
+    tokens = tokenize(q)
+    if not tokens:
+        return query.filter(false())
+
+    if _is_postgres(db):
+        return query.filter(literal_column("posts.search_vector").op("@@")(_ts_query(tokens)))
+
+    return query.filter(and_(*[
+        or_(Post.search_title.contains(f" {t} "), Post.search_body.contains(f" {t} "))
+        for t in set(tokens)
+    ]))
+
+
+def search_posts(
+    db: Session,
+    query: Query,
+    q: str,
+    skip: int = 0,
+    limit: int = 20,
+) -> List[Tuple[Post, float]]:
+    """按相关度排序返回 (post, rank)"""
+    tokens = tokenize(q)
+    query = apply_search(db, query, q)
+
+    if _is_postgres(db):
+        rank = func.ts_rank_cd(literal_column("posts.search_vector"), _ts_query(tokens))
+        rows = query.add_columns(rank.label("rank")).order_by(
+            desc("rank"), desc(Post.created_at), desc(Post.id)
+        ).offset(skip).limit(limit).all()
+        return [(post, float(r or 0)) for post, r in rows]
+
+    posts = query.order_by(desc(Post.created_at), desc(Post.id)).offset(skip).limit(limit).all()
+    return [(post, 0.0) for post in posts]
+
+
+def make_snippet(text: Optional[str], q: str, radius: int = SNIPPET_RADIUS) -> str:
+    """截取首个命中附近的片段并用 <mark> 高亮命中的词（输出已做 HTML 转义）"""
+    plain = bleach.clean(text or "", tags=[], strip=True)
+    plain = html.unescape(plain)
+    # 先匹配完整的查询词，再匹配 bigram，保证最长命中优先
+    terms = sorted(set(_TOKEN_RE.findall(q or "")) | set(tokenize(q)), key=len, reverse=True)
+    if not plain:
+        return ""
+    if not terms:
+        return html.escape(plain[:radius * 2])
+
+    pattern = re.compile("|".join(re.escape(t) for t in terms), re.IGNORECASE)
+    match = pattern.search(plain)
+    start = max(match.start() - radius, 0) if match else 0
+    end = min((match.end() if match else 0) + radius, len(plain))
+    window = plain[start:end]
+
+    parts = []
+    last = 0
+    for m in pattern.finditer(window):
+        parts.append(html.escape(window[last:m.start()]))
+        parts.append(f"<mark>{html.escape(m.group(0))}</mark>")
+        last = m.end()
+    parts.append(html.escape(window[last:]))
+
+    prefix = "…" if start > 0 else ""
+    suffix = "…" if end < len(plain) else ""
+    return prefix + "".join(parts) + suffix
+
+
+def reindex_posts(db: Session, batch_size: int = 500, only_missing: bool = True) -> int:
+    """为历史帖子回填检索文本，按 id 分批处理，返回处理的行数"""
+    total = 0
+    last_id = 0
+    while True:
+        query = db.query(Post).filter(Post.id > last_id)
+        if only_missing:
+            query = query.filter(Post.search_body.is_(None))
+        batch = query.order_by(Post.id).limit(batch_size).all()
+        if not batch:
+            break
+        for post in batch:
+            index_post(post)
+        db.commit()
+        total += len(batch)
+        last_id = batch[-1].id
+    return total
+
+
+if __name__ == "__main__":
+    # python -m app.services.search_service
+    from ..database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        print(f"Reindexed {reindex_posts(db, only_missing=False)} posts")
+    finally:
+        db.close()
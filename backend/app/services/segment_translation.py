@@ -0,0 +1,103 @@
+"""
+句子级翻译记忆
+
+整篇原文在翻译记忆里没有时，把原文按句切开（app/utils/segmenter.py），逐句查句子记忆：
+不同帖子里重复出现的句子（问候、固定说法、编辑时没改的句子）直接复用，
+所有帖子缺的句子去重后按语言对合并成一次 LibreTranslate 调用，译完再拼回全文。
+任何一句翻译失败时该篇帖子的结果为 None（不保存半翻译的全文），已译好的句子仍写入记忆。
+
+句子记忆与整篇翻译记忆共用 translation_memory 表（键都是原文的 sha256），进程内/Redis 缓存分开。
+SEGMENT_TRANSLATION=0 时退回整篇翻译。
+"""
+import os
+import threading
+from typing import Dict, List, Optional
+from sqlalchemy.orm import Session
+from .translation_client import LanguagePair, LibreTranslateClient
+from .translation_memory import TM_CACHE_TTL_SECONDS, TranslationMemoryStore
+from ..utils.segmenter import is_translatable, join_segments, split_sentences
+
+SEGMENT_TRANSLATION = os.getenv("SEGMENT_TRANSLATION", "1") == "1"
+TM_SEGMENT_LOCAL_MAX_ENTRIES = int(os.getenv("TM_SEGMENT_LOCAL_MAX_ENTRIES", 50000))
+
+segment_memory = TranslationMemoryStore(TM_SEGMENT_LOCAL_MAX_ENTRIES, TM_CACHE_TTL_SECONDS, redis_prefix="tms")
+
+
+class SegmentTranslator:
+    def __init__(self, memory: TranslationMemoryStore):
+        self.memory = memory
+        self._lock = threading.Lock()
+        self.stats = {"texts": 0, "segments": 0, "segment_hits": 0, "segments_sent": 0, "chars": 0, "chars_sent": 0}
+
+    def _count(self, **counts):
+        with self._lock:
+            for name, n in counts.items():
+                self.stats[name] += n
+
+    def translate_pairs(
+        self, db: Session, client: LibreTranslateClient, jobs: Dict[LanguagePair, List[str]]
+    ) -> Dict[LanguagePair, List[Optional[str]]]:
+        """与 LibreTranslateClient.translate_pairs 相同的输入输出；新译的句子写入句子记忆，调用方负责 commit"""
+        if not SEGMENT_TRANSLATION:
+            return client.translate_pairs(jobs)
+
+        split = {}
+        for (source, _), texts in jobs.items():
+            for text in texts:
+                if (source, text) not in split:
+                    split[(source, text)] = split_sentences(text, source)
+
+        keys = []
+        for (source, target), texts in jobs.items():
+            for text in texts:
+                keys.extend((s.text, source, target) for s in split[(source, text)] if is_translatable(s.text))
+        known = self.memory.lookup(db, keys)
+
+        # 缺的句子去重后每个语言对一次调用
+        missing: Dict[LanguagePair, Dict[str, None]] = {}
+        for sentence, source, target in keys:
+            if (sentence, source, target) not in known:
+                missing.setdefault((source, target), {})[sentence] = None
+        requests = {pair: list(sentences) for pair, sentences in missing.items()}
+        fresh = {}
+        if requests:
+            for pair, translated in client.translate_pairs(requests).items():
+                for sentence, translated_text in zip(requests[pair], translated):
+                    if translated_text:
+                        fresh[(sentence, *pair)] = translated_text
+            self.memory.store_many(db, fresh)
+        known.update(fresh)
+
+        results: Dict[LanguagePair, List[Optional[str]]] = {}
+        for (source, target), texts in jobs.items():
+            results[(source, target)] = []
+            for text in texts:
+                segments = split[(source, text)]
+                translations = {}
+                for segment in segments:
+                    if is_translatable(segment.text):
+                        translations[segment.text] = known.get((segment.text, source, target))
+                complete = all(translations.values())
+                results[(source, target)].append(join_segments(segments, translations, target) if complete else None)
+
+        sent = [sentence for sentences in requests.values() for sentence in sentences]
+        self._count(
+            texts=sum(len(texts) for texts in jobs.values()),
+            segments=len(keys),
+            segment_hits=sum(1 for key in keys if key in known and key not in fresh),
+            segments_sent=len(sent),
+            chars=sum(len(sentence) for sentence, _, _ in keys),
+            chars_sent=sum(len(sentence) for sentence in sent),
+        )
+        return results
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        stats["hit_rate"] = round(stats["segment_hits"] / stats["segments"], 4) if stats["segments"] else 0.0
+        stats["chars_saved_rate"] = round(1 - stats["chars_sent"] / stats["chars"], 4) if stats["chars"] else 0.0
+        stats["memory"] = self.memory.get_stats()
+        return stats
+
+
+segment_translator = SegmentTranslator(segment_memory)
@@ -0,0 +1,153 @@
+"""
+标签索引
+
+帖子/商品的标签除了保留原来的逗号分隔字符串（用于展示），还写入
+tags + post_tags / item_tags 关联表，标签过滤走 (tag_id, post_id) 索引。
+tags.post_count / item_count 在写入时增减，热门标签列表无需聚合查询。
+"""
+from typing import Iterable, List, Optional
+from sqlalchemy import func, select, or_
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from ..models import Tag, PostTag, ItemTag, Post, Item
+
+MAX_TAG_LENGTH = 64
+
+# target -> (关联表, 关联表里的外键列名, tags 表上的计数列名)
+_TARGETS = {
+    "post": (PostTag, "post_id", "post_count"),
+    "item": (ItemTag, "item_id", "item_count"),
+}
+
+
+def normalize_tags(names: Iterable[str]) -> List[str]:
+    """去掉首尾空白、空标签和重复标签（保持原顺序），逗号会破坏原字符串格式所以一并去掉"""
+    result = []
+    seen = set()
+    for name in names or []:
+        name = (name or "").replace(",", " ").strip()[:MAX_TAG_LENGTH]
+        if name and name not in seen:
+            seen.add(name)
+            result.append(name)
+    return result
+
+
+def normalize_tag(name: Optional[str]) -> Optional[str]:
+    """单个标签（如查询参数）按写入时同样的规则规范化，规范化后为空则返回 None"""
+    names = normalize_tags([name])
+    return names[0] if names else None
+
+
+def _get_or_create_tags(db: Session, names: List[str]) -> List[Tag]:
+    if not names:
+        return []
+    existing = {t.name: t for t in db.query(Tag).filter(Tag.name.in_(names)).all()}
+    for name in names:
+        if name not in existing:
+            try:
+                # 并发请求可能同时创建同名标签，用 SAVEPOINT 兜住唯一约束冲突
+                with db.begin_nested():
+                    tag = Tag(name=name)
+                    db.add(tag)
+            except IntegrityError:
+                tag = db.query(Tag).filter(Tag.name == name).one()
+            existing[name] = tag
+    return [existing[name] for name in names]
+
+
+def _bump(db: Session, tag_ids: List[int], count_field: str, delta: int):
+    if not tag_ids:
+        return
+    column = getattr(Tag, count_field)
+    db.query(Tag).filter(Tag.id.in_(tag_ids)).update(
+        {column: column + delta}, synchronize_session=False
+    )
+
+
+def _set_tags(db: Session, target: str, target_id: int, names: Iterable[str]):
+    link_model, fk, count_field = _TARGETS[target]
+    fk_column = getattr(link_model, fk)
+
+    wanted = {t.id: t for t in _get_or_create_tags(db, normalize_tags(names))}
+    current = {
+        row[0] for row in db.query(link_model.tag_id).filter(fk_column == target_id).all()
+    }
+
+    removed = [tag_id for tag_id in current if tag_id not in wanted]
+    added = [tag_id for tag_id in wanted if tag_id not in current]
+
+    if removed:
+        db.query(link_model).filter(
+            fk_column == target_id, link_model.tag_id.in_(removed)
+        ).delete(synchronize_session=False)
+        _bump(db, removed, count_field, -1)
+    for tag_id in added:
+        db.add(link_model(**{fk: target_id, "tag_id": tag_id}))
+    _bump(db, added, count_field, 1)
+
+
+def set_post_tags(db: Session, post_id: int, names: Iterable[str]):
+    """把帖子的标签同步到关联表（只写差异），调用方负责 commit"""
+    _set_tags(db, "post", post_id, names)
+
+
+def set_item_tags(db: Session, item_id: int, names: Iterable[str]):
+    _set_tags(db, "item", item_id, names)
+
+
+def post_ids_with_tag(db: Session, name: str):
+    """返回可用于 Post.id.in_() 的子查询"""
+    return db.query(PostTag.post_id).join(Tag, Tag.id == PostTag.tag_id).filter(Tag.name == name)
+
+
+def item_ids_with_tag(db: Session, name: str):
+    return db.query(ItemTag.item_id).join(Tag, Tag.id == ItemTag.tag_id).filter(Tag.name == name)
+
+
+def recount_tags(db: Session) -> int:
+    """
+    用关联表重新计算 tags.post_count / item_count，修复漂移（例如数据库级联删除绕过了计数）。
+    只更新与实际值不一致的行，返回修复的行数。
+    """
+    actual = {
+        count_field: select(func.count()).select_from(link_model).where(
+            link_model.tag_id == Tag.id
+        ).correlate(Tag).scalar_subquery()
+        for link_model, _, count_field in _TARGETS.values()
+    }
+    fixed = db.query(Tag).filter(
+        or_(*[getattr(Tag, field) != expr for field, expr in actual.items()])
+    ).update(actual, synchronize_session=False)
+    db.commit()
+    return fixed
+
+
+def backfill_tags(db: Session, batch_size: int = 500) -> int:
+    """从旧的逗号分隔字符串重建关联表（幂等），返回处理的帖子+商品数"""
+    total = 0
+    for model, setter in ((Post, set_post_tags), (Item, set_item_tags)):
+        last_id = 0
+        while True:
+            batch = db.query(model.id, model.tags).filter(
+                model.id > last_id
+            ).order_by(model.id).limit(batch_size).all()
+            if not batch:
+                break
+            for row_id, tags in batch:
+                setter(db, row_id, tags.split(",") if tags else [])
+            db.commit()
+            total += len(batch)
+            last_id = batch[-1][0]
+    return total
+
+
+if __name__ == "__main__":
+    # python -m app.services.tag_service
+    from ..database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        print(f"Backfilled tags for {backfill_tags(db)} rows")
+        print(f"Recounted {recount_tags(db)} tags")
+    finally:
+        db.close()
@@ -0,0 +1,320 @@
+"""
+关注时间线（混合扇出）
+
+- 普通作者（粉丝数 <= TIMELINE_FANOUT_THRESHOLD）发帖时写扩散：一条 INSERT ... SELECT
+  把帖子写进每个粉丝的时间线（timeline_entries，或启用 Redis 时的有序集合 timeline:{user_id}）
+- 大 V（粉丝数超过阈值）不写扩散，读时间线时再按 author_id 拉取（读扩散）；
+  一个用户关注的大 V 通常很少，这个查询走 (author_id) 过滤 + (created_at, id) 排序即可
+- 自己的帖子同样在读时拉取
+- 每个时间线最多保留 TIMELINE_MAX_LENGTH 条，Redis 写入时顺带截断，表存储由定时任务截断
+- 时间线可以随时从 posts + follows 重建（rebuild_timeline / rebuild_all_timelines）
+
+匿名帖子不进入他人的时间线（否则会暴露作者）；读的时候也再过滤一次，帖子之后改成匿名也不会泄露。
+"""
+import os
+from typing import Iterable, List, Optional
+from fastapi import Response
+from sqlalchemy import and_, desc, func, insert, literal, or_, select, tuple_
+from sqlalchemy.orm import Session
+from ..models import Post, Follow, User, TimelineEntry
+from ..cache import r, redis_available
+from ..celery_app import celery_app
+from ..database import SessionLocal
+from ..utils.pagination import keyset_paginate, decode_cursor, encode_cursor, NEXT_CURSOR_HEADER
+from .feed_service import with_feed_options
+
+TIMELINE_MAX_LENGTH = int(os.getenv("TIMELINE_MAX_LENGTH", 800))
+TIMELINE_FANOUT_THRESHOLD = int(os.getenv("TIMELINE_FANOUT_THRESHOLD", 1000))
+# "sql"（默认）或 "redis"；Redis 不可用时自动退回表存储
+TIMELINE_BACKEND = os.getenv("TIMELINE_BACKEND", "sql").lower()
+
+
+def _fanout_followees(user_id: int):
+    """user_id 关注的、走写扩散的作者"""
+    return select(Follow.following_id).join(User, User.id == Follow.following_id).where(
+        Follow.follower_id == user_id,
+        User.follower_count <= TIMELINE_FANOUT_THRESHOLD,
+    )
+
+
+def _recent_public_posts(author_filter, limit: int):
+    return select(Post.id, Post.author_id, Post.created_at).where(
+        author_filter, Post.is_anonymous.isnot(True)
+    ).order_by(desc(Post.created_at), desc(Post.id)).limit(limit)
+
+
+class SqlTimelineStore:
+    """时间线存在 timeline_entries 表里，(user_id, created_at, post_id) 索引分页"""
+
+    def fan_out(self, db: Session, post: Post):
+        followers = select(
+            Follow.follower_id, literal(post.id), literal(post.author_id),
+            literal(post.created_at, type_=TimelineEntry.created_at.type),
+        ).where(Follow.following_id == post.author_id)
+        db.execute(insert(TimelineEntry).from_select(
+            ["user_id", "post_id", "author_id", "created_at"], followers
+        ))
+
+    def _insert_posts(self, db: Session, user_id: int, posts):
+        posts = posts.subquery()
+        already = select(TimelineEntry.post_id).where(TimelineEntry.user_id == user_id)
+        db.execute(insert(TimelineEntry).from_select(
+            ["user_id", "post_id", "author_id", "created_at"],
+            select(literal(user_id), posts.c.id, posts.c.author_id, posts.c.created_at).where(
+                posts.c.id.not_in(already)
+            ),
+        ))
+
+    def add_author(self, db: Session, user_id: int, author_id: int):
+        self._insert_posts(db, user_id, _recent_public_posts(Post.author_id == author_id, TIMELINE_MAX_LENGTH))
+
+    def remove_author(self, db: Session, user_id: int, author_id: int):
+        db.query(TimelineEntry).filter(
+            TimelineEntry.user_id == user_id, TimelineEntry.author_id == author_id
+        ).delete(synchronize_session=False)
+
+    def remove_post(self, db: Session, post_id: int):
+        db.query(TimelineEntry).filter(TimelineEntry.post_id == post_id).delete(synchronize_session=False)
+
+    def page(self, db: Session, user_id: int, cursor: Optional[str], limit: int) -> List[int]:
+        query = db.query(TimelineEntry.post_id, TimelineEntry.created_at).filter(
+            TimelineEntry.user_id == user_id
+        )
+        rows = keyset_paginate(query, TimelineEntry.created_at, TimelineEntry.post_id, limit, cursor=cursor)
+        return [row.post_id for row in rows]
+
+    def rebuild(self, db: Session, user_id: int):
+        db.query(TimelineEntry).filter(TimelineEntry.user_id == user_id).delete(synchronize_session=False)
+        self._insert_posts(db, user_id, _recent_public_posts(
+            Post.author_id.in_(_fanout_followees(user_id)), TIMELINE_MAX_LENGTH
+        ))
+
+    def trim(self, db: Session) -> int:
+        """每个用户只保留最新的 TIMELINE_MAX_LENGTH 条，返回删除的条数"""
+        rn = func.row_number().over(
+            partition_by=TimelineEntry.user_id,
+            order_by=(desc(TimelineEntry.created_at), desc(TimelineEntry.post_id)),
+        ).label("rn")
+        ranked = select(TimelineEntry.user_id, TimelineEntry.post_id, rn).subquery()
+        overflow = select(ranked.c.user_id, ranked.c.post_id).where(ranked.c.rn > TIMELINE_MAX_LENGTH)
+        return db.query(TimelineEntry).filter(
+            tuple_(TimelineEntry.user_id, TimelineEntry.post_id).in_(overflow)
+        ).delete(synchronize_session=False)
+
+    def is_empty(self, db: Session) -> bool:
+        return db.query(TimelineEntry.user_id).first() is None
+
+
+class RedisTimelineStore:
+    """时间线存在 Redis 有序集合 timeline:{user_id} 里，score 为发帖时间戳，写入时截断长度"""
+
+    @staticmethod
+    def _key(user_id: int) -> str:
+        return f"timeline:{user_id}"
+
+    def _add(self, pipe, user_id: int, rows):
+        mapping = {str(post_id): created_at.timestamp() for post_id, created_at in rows}
+        if mapping:
+            key = self._key(user_id)
+            pipe.zadd(key, mapping)
+            pipe.zremrangebyrank(key, 0, -(TIMELINE_MAX_LENGTH + 1))
+
+    def fan_out(self, db: Session, post: Post):
+        followers = db.query(Follow.follower_id).filter(Follow.following_id == post.author_id).all()
+        pipe = r.pipeline(transaction=False)
+        for (follower_id,) in followers:
+            self._add(pipe, follower_id, [(post.id, post.created_at)])
+        pipe.execute()
+
+    def add_author(self, db: Session, user_id: int, author_id: int):
+        rows = db.execute(_recent_public_posts(Post.author_id == author_id, TIMELINE_MAX_LENGTH)).all()
+        pipe = r.pipeline(transaction=False)
+        self._add(pipe, user_id, [(row.id, row.created_at) for row in rows])
+        pipe.execute()
+
+    def remove_author(self, db: Session, user_id: int, author_id: int):
+        rows = db.execute(select(Post.id).where(Post.author_id == author_id).order_by(
+            desc(Post.created_at)
+        ).limit(TIMELINE_MAX_LENGTH)).all()
+        if rows:
+            r.zrem(self._key(user_id), *[str(row.id) for row in rows])
+
+    def remove_post(self, db: Session, post_id: int):
+        # 不知道哪些时间线里有这条帖子；读时间线时按 posts 表加载，已删除的帖子自然被过滤
+        pass
+
+    def page(self, db: Session, user_id: int, cursor: Optional[str], limit: int) -> List[int]:
+        # 同一时间戳（微秒级）的并列帖子在翻页边界可能被跳过，可以接受
+        max_score = "+inf"
+        if cursor:
+            created_at, _ = decode_cursor(cursor)
+            max_score = f"({created_at.timestamp()}"
+        members = r.zrevrangebyscore(self._key(user_id), max_score, "-inf", start=0, num=limit)
+        return [int(m) for m in members]
+
+    def rebuild(self, db: Session, user_id: int):
+        rows = db.execute(_recent_public_posts(
+            Post.author_id.in_(_fanout_followees(user_id)), TIMELINE_MAX_LENGTH
+        )).all()
+        pipe = r.pipeline(transaction=True)
+        pipe.delete(self._key(user_id))
+        self._add(pipe, user_id, [(row.id, row.created_at) for row in rows])
+        pipe.execute()
+
+    def trim(self, db: Session) -> int:
+        return 0  # 写入时已截断
+
+    def is_empty(self, db: Session) -> bool:
+        return next(iter(r.scan_iter(match="timeline:*", count=100)), None) is None
+
+
+def get_store():
+    if TIMELINE_BACKEND == "redis" and redis_available and r:
+        return RedisTimelineStore()
+    return SqlTimelineStore()
+
+
+def is_high_follower(user: User) -> bool:
+    return (user.follower_count or 0) > TIMELINE_FANOUT_THRESHOLD
+
+
+def fan_out_post(db: Session, post: Post):
+    """新帖写扩散到粉丝的时间线；匿名帖和大 V 的帖子不扩散（后者读时拉取），调用方负责 commit"""
+    if post.is_anonymous or post.author is None or is_high_follower(post.author):
+        return
+    get_store().fan_out(db, post)
+
+
+@celery_app.task
+def fan_out_post_task(post_id: int):
+    db = SessionLocal()
+    try:
+        post = db.query(Post).filter(Post.id == post_id).first()
+        if post:
+            fan_out_post(db, post)
+            db.commit()
+    finally:
+        db.close()
+
+
+def dispatch_fan_out(db: Session, post: Post):
+    """Redis 可用时交给 Celery worker 扩散，否则在当前请求里直接执行"""
+    if redis_available:
+        try:
+            fan_out_post_task.delay(post.id)
+            return
+        except Exception as e:
+            print(f"Timeline fan-out task dispatch failed, running inline: {e}")
+    fan_out_post(db, post)
+    db.commit()
+
+
+def on_follow(db: Session, follower_id: int, author: User):
+    """关注后把作者最近的帖子补进时间线（大 V 的帖子读时拉取，无需补），调用方负责 commit"""
+    if not is_high_follower(author):
+        get_store().add_author(db, follower_id, author.id)
+
+
+def on_unfollow(db: Session, follower_id: int, author_id: int):
+    get_store().remove_author(db, follower_id, author_id)
+
+
+def on_post_deleted(db: Session, post_id: int):
+    get_store().remove_post(db, post_id)
+
+
+def get_timeline(
+    db: Session,
+    user_id: int,
+    limit: int,
+    cursor: Optional[str] = None,
+    response: Optional[Response] = None,
+) -> List[Post]:
+    """
+    合并两路：时间线存储里的帖子（写扩散）+ 关注的大 V 和自己的帖子（读扩散），
+    各取 limit+1 条后按 (created_at, id) 归并，多出的一条用来判断是否还有下一页。
+    """
+    pushed_ids = get_store().page(db, user_id, cursor, limit + 1)
+
+    pull_authors = select(Follow.following_id).join(User, User.id == Follow.following_id).where(
+        Follow.follower_id == user_id,
+        User.follower_count > TIMELINE_FANOUT_THRESHOLD,
+    )
+    pulled = keyset_paginate(
+        db.query(Post.id, Post.created_at).filter(or_(
+            Post.author_id == user_id,
+            and_(Post.author_id.in_(pull_authors), Post.is_anonymous.isnot(True)),
+        )),
+        Post.created_at, Post.id, limit + 1, cursor=cursor,
+    )
+
+    post_ids = set(pushed_ids) | {row.id for row in pulled}
+    if not post_ids:
+        return []
+    posts = with_feed_options(db.query(Post)).filter(
+        Post.id.in_(post_ids),
+        or_(Post.author_id == user_id, Post.is_anonymous.isnot(True)),
+    ).all()
+    posts.sort(key=lambda p: (p.created_at, p.id), reverse=True)
+
+    page = posts[:limit]
+    if response is not None and len(posts) > limit and page:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(page[-1].created_at, page[-1].id)
+    return page
+
+
+def rebuild_timeline(db: Session, user_id: int):
+    get_store().rebuild(db, user_id)
+    db.commit()
+
+
+def rebuild_all_timelines(db: Session, batch_size: int = 500) -> int:
+    """按用户 id 分批重建所有有关注关系的用户的时间线，返回处理的用户数"""
+    total = 0
+    last_id = 0
+    while True:
+        user_ids = [row[0] for row in db.query(Follow.follower_id).filter(
+            Follow.follower_id > last_id
+        ).distinct().order_by(Follow.follower_id).limit(batch_size).all()]
+        if not user_ids:
+            return total
+        for user_id in user_ids:
+            rebuild_timeline(db, user_id)
+        total += len(user_ids)
+        last_id = user_ids[-1]
+
+
+def trim_timelines(db: Session) -> int:
+    removed = get_store().trim(db)
+    db.commit()
+    return removed
+
+
+def reconcile_follower_counts(db: Session, user_ids: Optional[Iterable[int]] = None) -> int:
+    """用 follows 重新计算 users.follower_count，只更新不一致的行，返回修复的行数"""
+    actual = select(func.count(Follow.id)).where(Follow.following_id == User.id).correlate(User).scalar_subquery()
+    query = db.query(User).filter(User.follower_count != actual)
+    if user_ids is not None:
+        query = query.filter(User.id.in_(list(user_ids)))
+    fixed = query.update({User.follower_count: actual}, synchronize_session=False)
+    db.commit()
+    return fixed
+
+
+@celery_app.task
+def trim_timelines_task():
+    db = SessionLocal()
+    try:
+        return f"Trimmed {trim_timelines(db)} timeline entries"
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    # python -m app.services.timeline_service
+    db = SessionLocal()
+    try:
+        print(f"Reconciled follower counts for {reconcile_follower_counts(db)} users")
+        print(f"Rebuilt timelines for {rebuild_all_timelines(db)} users")
+    finally:
+        db.close()
@@ -0,0 +1,169 @@
+"""
+LibreTranslate 客户端
+
+- 每个进程一个 httpx.Client（连接池复用 keep-alive 连接），Celery prefork 子进程里首次使用时才创建
+- 多个 (源语言, 目标语言) 的请求在线程池里并发执行
+- 同一语言对的多段文本合并成一次 /translate 调用（q 传数组），按 LT_BATCH_SIZE 条 / LT_BATCH_MAX_CHARS 字符分块
+- 每次调用有连接/读取超时；连接错误、超时、429 和 5xx 按指数退避重试 LT_MAX_RETRIES 次
+
+某一块最终失败时，该块的结果为 None（其他块不受影响），由调用方决定是否稍后重试。
+本地测试/压测可以用 benchmarks/libretranslate_stub.py 代替真实服务。
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+import httpx
+
+# 开发环境更常见的是在宿主机跑 LibreTranslate（localhost:5000）。
+# Docker 环境会通过 docker-compose 显式设置为 http://libretranslate:5000
+LIBRETRANSLATE_URL = os.getenv("LIBRETRANSLATE_URL", "http://localhost:5000")
+LT_TIMEOUT_SECONDS = float(os.getenv("LT_TIMEOUT_SECONDS", 15))
+LT_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LT_CONNECT_TIMEOUT_SECONDS", 3))
+LT_MAX_RETRIES = int(os.getenv("LT_MAX_RETRIES", 2))
+LT_RETRY_BACKOFF_SECONDS = float(os.getenv("LT_RETRY_BACKOFF_SECONDS", 0.5))
+LT_MAX_CONNECTIONS = int(os.getenv("LT_MAX_CONNECTIONS", 8))
+LT_BATCH_SIZE = int(os.getenv("LT_BATCH_SIZE", 32))
+LT_BATCH_MAX_CHARS = int(os.getenv("LT_BATCH_MAX_CHARS", 20000))
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+LanguagePair = Tuple[str, str]
+
+
+class TranslationError(Exception):
+    pass
+
+
+def chunk_texts(texts: Sequence[str], batch_size: int, max_chars: int) -> List[List[str]]:
+    """按条数和总字符数分块；单条超过 max_chars 的文本单独一块"""
+    chunks, current, size = [], [], 0
+    for text in texts:
+        if current and (len(current) >= batch_size or size + len(text) > max_chars):
+            chunks.append(current)
+            current, size = [], 0
+        current.append(text)
+        size += len(text)
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class LibreTranslateClient:
+    def __init__(
+        self,
+        base_url: str = LIBRETRANSLATE_URL,
+        timeout: float = LT_TIMEOUT_SECONDS,
+        connect_timeout: float = LT_CONNECT_TIMEOUT_SECONDS,
+        max_retries: int = LT_MAX_RETRIES,
+        backoff: float = LT_RETRY_BACKOFF_SECONDS,
+        max_connections: int = LT_MAX_CONNECTIONS,
+        batch_size: int = LT_BATCH_SIZE,
+        batch_max_chars: int = LT_BATCH_MAX_CHARS,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_connections = max_connections
+        self.batch_size = batch_size
+        self.batch_max_chars = batch_max_chars
+        self._pid = None
+        self._http: Optional[httpx.Client] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "texts": 0, "retries": 0, "failures": 0}
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self.stats[name] += n
+
+    def _resources(self) -> Tuple[httpx.Client, ThreadPoolExecutor]:
+        # fork 出来的子进程不能沿用父进程的连接和线程
+        with self._lock:
+            if self._pid != os.getpid():
+                self._http = httpx.Client(
+                    base_url=self.base_url,
+                    timeout=self.timeout,
+                    limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+                )
+                self._executor = ThreadPoolExecutor(max_workers=self.max_connections, thread_name_prefix="libretranslate")
+                self._pid = os.getpid()
+            return self._http, self._executor
+
+    def _post(self, payload: dict) -> dict:
+        http, _ = self._resources()
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self._count("retries")
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            self._count("requests")
+            try:
+                response = http.post("/translate", json=payload)
+            except httpx.TransportError as e:
+                error = TranslationError(f"LibreTranslate request failed: {e!r}")
+                continue
+            if response.status_code in RETRY_STATUS:
+                error = TranslationError(f"LibreTranslate returned {response.status_code}")
+                continue
+            if response.status_code != 200:
+                raise TranslationError(f"LibreTranslate returned {response.status_code}: {response.text[:200]}")
+            return response.json()
+        raise error
+
+    def translate_batch(self, texts: List[str], source: str, target: str) -> List[str]:
+        """一次调用翻译多段文本（同一语言对），失败抛 TranslationError"""
+        result = self._post({"q": texts, "source": source or "auto", "target": target, "format": "text"})
+        translated = result.get("translatedText")
+        if isinstance(translated, str):
+            translated = [translated]
+        if not isinstance(translated, list) or len(translated) != len(texts):
+            raise TranslationError("LibreTranslate returned an unexpected response")
+        self._count("texts", len(texts))
+        return translated
+
+    def _translate_chunk(self, texts: List[str], source: str, target: str) -> List[Optional[str]]:
+        try:
+            return self.translate_batch(texts, source, target)
+        except TranslationError as e:
+            self._count("failures")
+            print(f"Translation failed for {source}->{target} ({len(texts)} texts): {e}")
+            return [None] * len(texts)
+
+    def translate_pairs(self, jobs: Dict[LanguagePair, List[str]]) -> Dict[LanguagePair, List[Optional[str]]]:
+        """
+        jobs: {(源语言, 目标语言): [文本, ...]}，所有语言对、所有分块并发请求。
+        返回同样结构的译文列表，顺序与输入一致，失败的为 None。
+        """
+        _, executor = self._resources()
+        futures = []
+        for pair, texts in jobs.items():
+            for chunk in chunk_texts(texts, self.batch_size, self.batch_max_chars):
+                futures.append((pair, executor.submit(self._translate_chunk, chunk, *pair)))
+        results: Dict[LanguagePair, List[Optional[str]]] = {pair: [] for pair in jobs}
+        for pair, future in futures:
+            results[pair].extend(future.result())
+        return results
+
+    def translate_many(self, texts: List[str], source: str, targets: Sequence[str]) -> Dict[str, List[Optional[str]]]:
+        """同一批文本翻译成多个目标语言（各目标语言并发）"""
+        results = self.translate_pairs({(source, target): list(texts) for target in targets})
+        return {target: translated for (_, target), translated in results.items()}
+
+    def translate(self, text: str, source: str, target: str) -> Optional[str]:
+        return self.translate_many([text], source, [target])[target][0]
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return dict(self.stats)
+
+    def close(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                self._http.close()
+                self._executor.shutdown(wait=False)
+            self._pid = self._http = self._executor = None
+
+
+translation_client = LibreTranslateClient()
@@ -0,0 +1,136 @@
+"""
+翻译记忆（translation memory）
+
+按 (sha256(原文), 源语言, 目标语言) 保存 LibreTranslate 的翻译结果，所有帖子共用：
+转发、常见短句、编辑后没有变化的内容都不必再调用翻译服务。
+查找顺序：进程内 LRU → Redis（启用时）→ translation_memory 表，下层命中时回填上层。
+表里的记录不引用帖子，删除帖子后仍然保留；同一原文的翻译结果视为不变，不做失效。
+"""
+import hashlib
+import os
+import threading
+from typing import Dict, Iterable, Tuple
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+from ..models import TranslationMemory
+from ..cache import LRUCache, r, redis_available
+from ..utils.bulk import insert_ignore
+
+TM_LOCAL_MAX_ENTRIES = int(os.getenv("TM_LOCAL_MAX_ENTRIES", 10000))
+TM_CACHE_TTL_SECONDS = int(os.getenv("TM_CACHE_TTL_SECONDS", 86400))
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+# (原文, 源语言, 目标语言)
+MemoryKey = Tuple[str, str, str]
+
+
+class TranslationMemoryStore:
+    def __init__(self, max_entries: int, ttl: int, redis_prefix: str = "tm"):
+        self.ttl = ttl
+        self.redis_prefix = redis_prefix
+        self.local = LRUCache(max_entries, ttl)
+        self._lock = threading.Lock()
+        self.stats = {"local_hits": 0, "redis_hits": 0, "db_hits": 0, "misses": 0, "stored": 0, "redis_errors": 0}
+
+    def _count(self, name: str, n: int = 1):
+        if n:
+            with self._lock:
+                self.stats[name] += n
+
+    def _redis_key(self, key: Tuple[str, str, str]) -> str:
+        return f"{self.redis_prefix}:" + ":".join(key)
+
+    def lookup(self, db: Session, keys: Iterable[MemoryKey]) -> Dict[MemoryKey, str]:
+        """批量查找 (原文, 源语言, 目标语言)，返回已有的译文；数据库只查一次"""
+        hashed = {key: (text_hash(key[0]), key[1], key[2]) for key in dict.fromkeys(keys)}
+        found: Dict[MemoryKey, str] = {}
+        missing = []
+        for key, hkey in hashed.items():
+            value = self.local.get(hkey)
+            if value is not None:
+                found[key] = value
+            else:
+                missing.append(key)
+        self._count("local_hits", len(found))
+
+        if missing and redis_available and r:
+            try:
+                values = r.mget([self._redis_key(hashed[key]) for key in missing])
+                still_missing = []
+                for key, raw in zip(missing, values):
+                    if raw is None:
+                        still_missing.append(key)
+                        continue
+                    found[key] = raw.decode("utf-8")
+                    self.local.set(hashed[key], found[key])
+                    self._count("redis_hits")
+                missing = still_missing
+            except Exception:
+                self._count("redis_errors")
+
+        if missing:
+            by_hash = {hashed[key]: key for key in missing}
+            rows = db.query(
+                TranslationMemory.text_hash, TranslationMemory.source,
+                TranslationMemory.target, TranslationMemory.translated_text,
+            ).filter(
+                tuple_(TranslationMemory.text_hash, TranslationMemory.source, TranslationMemory.target).in_(list(by_hash))
+            ).all()
+            for digest, source, target, translated_text in rows:
+                hkey = (digest, source, target)
+                found[by_hash[hkey]] = translated_text
+                self._remember(hkey, translated_text)
+            self._count("db_hits", len(rows))
+            self._count("misses", len(missing) - len(rows))
+        return found
+
+    def lookup_many(self, db: Session, text: str, source: str, targets: Iterable[str]) -> Dict[str, str]:
+        """同一原文的多个目标语言，返回 {目标语言: 译文}，没有的目标语言不出现在结果里"""
+        found = self.lookup(db, [(text, source, target) for target in targets])
+        return {target: translated for (_, _, target), translated in found.items()}
+
+    def _remember(self, hkey: Tuple[str, str, str], translated_text: str):
+        self.local.set(hkey, translated_text)
+        if redis_available and r:
+            try:
+                r.setex(self._redis_key(hkey), self.ttl, translated_text.encode("utf-8"))
+            except Exception:
+                self._count("redis_errors")
+
+    def store_many(self, db: Session, translations: Dict[MemoryKey, str]):
+        """保存新翻译的结果（已有的记录保留），调用方负责 commit"""
+        if not translations:
+            return
+        rows = {}
+        for (text, source, target), translated_text in translations.items():
+            hkey = (text_hash(text), source, target)
+            rows[hkey] = translated_text
+            self._remember(hkey, translated_text)
+        insert_ignore(db, TranslationMemory, [
+            {"text_hash": digest, "source": source, "target": target, "translated_text": translated_text}
+            for (digest, source, target), translated_text in rows.items()
+        ], ("text_hash", "source", "target"))
+        self._count("stored", len(rows))
+
+    def store(self, db: Session, text: str, source: str, translations: Dict[str, str]):
+        """同一原文的多个目标语言的译文 {目标语言: 译文}"""
+        self.store_many(db, {(text, source, target): translated for target, translated in translations.items()})
+
+    def clear(self):
+        self.local.clear()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        hits = stats["local_hits"] + stats["redis_hits"] + stats["db_hits"]
+        lookups = hits + stats["misses"]
+        stats["hit_rate"] = round(hits / lookups, 4) if lookups else 0.0
+        stats["local_entries"] = len(self.local)
+        return stats
+
+
+translation_memory = TranslationMemoryStore(TM_LOCAL_MAX_ENTRIES, TM_CACHE_TTL_SECONDS)
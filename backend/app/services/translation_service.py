@@ -0,0 +1,193 @@
+"""
+按需翻译（GET /api/posts/{id}?lang=xx 和帖子列表的 lang 参数）
+
+有 lang 时响应里的 translated_cache 只保留该语言，并给出 translation_status：
+- "original"：帖子本身就是这个语言
+- "ready"：已有译文（posts.translated_cache / translations 表）
+- "pending"：还没有译文，已触发翻译，先返回原文；稍后再请求即可拿到
+- "failed"：最近一次翻译失败，TRANSLATION_RETRY_SECONDS 秒内不再重试
+
+缺译文时每个 (帖子, 语言) 同一时间只有一次翻译在进行（single-flight）：
+- 进程内：同一个 key 的并发请求共享同一个 threading.Event，等待最多 TRANSLATION_WAIT_SECONDS 秒
+- 跨 worker：Redis 可用时先 SET NX 占位，占不到说明别的 worker 正在翻译，直接返回 pending
+USE_CELERY_TRANSLATION=1 且 Redis 可用时交给 Celery（不等待），否则在本进程的线程池里执行；
+一页帖子缺的译文合并成一次 translate_posts（同一语言对只调用一次 LibreTranslate）。
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from ..models import Translation
+from ..cache import LRUCache, r, redis_available
+
+USE_CELERY_TRANSLATION = os.getenv("USE_CELERY_TRANSLATION", "0") == "1"
+TRANSLATION_WAIT_SECONDS = float(os.getenv("TRANSLATION_WAIT_SECONDS", 1.5))
+TRANSLATION_RETRY_SECONDS = float(os.getenv("TRANSLATION_RETRY_SECONDS", 30))
+TRANSLATION_LOCK_SECONDS = int(os.getenv("TRANSLATION_LOCK_SECONDS", 60))
+TRANSLATION_WORKERS = int(os.getenv("TRANSLATION_WORKERS", 4))
+
+LANG_PATTERN = "^(ja|zh|en)$"
+
+Key = Tuple[int, str]
+
+
+class SingleFlight:
+    def __init__(self, workers: int):
+        self._inflight: Dict[Key, threading.Event] = {}
+        self._failed = LRUCache(10000, TRANSLATION_RETRY_SECONDS)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="translation")
+        self.stats = {"started": 0, "coalesced": 0, "remote_inflight": 0, "failures": 0}
+
+    def _claim_remote(self, key: Key) -> bool:
+        """跨 worker 占位；Redis 不可用或出错时视为占到"""
+        if not (redis_available and r):
+            return True
+        try:
+            return bool(r.set(f"translating:{key[0]}:{key[1]}", 1, nx=True, ex=TRANSLATION_LOCK_SECONDS))
+        except Exception:
+            return True
+
+    def _release_remote(self, keys: Iterable[Key]):
+        if redis_available and r:
+            try:
+                r.delete(*(f"translating:{post_id}:{lang}" for post_id, lang in keys))
+            except Exception:
+                pass
+
+    def failed(self, key: Key) -> bool:
+        return bool(self._failed.get(key))
+
+    def start(self, post_ids: List[int], lang: str) -> Dict[Key, threading.Event]:
+        """
+        为缺译文的帖子触发翻译，返回本进程内可以等待的 Event（已在进行的翻译直接共享它的 Event）。
+        交给 Celery 或被其他 worker 占位的 key 不在返回值里。
+        """
+        events: Dict[Key, threading.Event] = {}
+        started: List[Key] = []
+        with self._lock:
+            for post_id in post_ids:
+                key = (post_id, lang)
+                if key in self._inflight:
+                    events[key] = self._inflight[key]
+                    self.stats["coalesced"] += 1
+                elif not self.failed(key):
+                    started.append(key)
+
+        owned = []
+        for key in started:
+            if self._claim_remote(key):
+                owned.append(key)
+            else:
+                self.stats["remote_inflight"] += 1
+        if not owned:
+            return events
+
+        from ..translator import translate_posts
+
+        if USE_CELERY_TRANSLATION and redis_available:
+            try:
+                # 占位在 TRANSLATION_LOCK_SECONDS 后过期，失败的翻译到时可以重试
+                translate_posts.delay([post_id for post_id, _ in owned], lang)
+                self.stats["started"] += len(owned)
+                return events
+            except Exception as e:
+                print(f"Translation task dispatch failed, running in process: {e}")
+
+        mine = []
+        with self._lock:
+            for key in owned:
+                # 占位和登记之间另一个线程可能已经登记了同一个 key
+                if key in self._inflight:
+                    events[key] = self._inflight[key]
+                    continue
+                events[key] = self._inflight[key] = threading.Event()
+                mine.append(key)
+            self.stats["started"] += len(mine)
+        if mine:
+            self._executor.submit(self._run, translate_posts, [post_id for post_id, _ in mine], lang, mine)
+        return events
+
+    def _run(self, translate_posts, ids: List[int], lang: str, keys: List[Key]):
+        try:
+            translate_posts(ids, lang)
+        except Exception as e:
+            print(f"On-demand translation failed for posts {ids} ({lang}): {e}")
+        finally:
+            self._release_remote(keys)
+            with self._lock:
+                events = [self._inflight.pop(key) for key in keys if key in self._inflight]
+            for event in events:
+                event.set()
+
+    def mark_failed(self, keys: Iterable[Key]):
+        for key in keys:
+            self._failed.set(key, True)
+            self.stats["failures"] += 1
+
+    def clear(self):
+        self._failed.clear()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["inflight"] = len(self._inflight)
+        return stats
+
+
+single_flight = SingleFlight(TRANSLATION_WORKERS)
+
+
+def _stored_translations(db: Session, post_ids: List[int], lang: str) -> Dict[int, str]:
+    rows = db.query(Translation.post_id, Translation.translated_text).filter(
+        Translation.post_id.in_(post_ids), Translation.lang == lang
+    ).all()
+    return dict(rows)
+
+
+def localize_posts(db: Session, posts: List[dict], lang: str, wait: Optional[float] = None) -> List[dict]:
+    """
+    把 PostOut 字典列表换成只带 lang 译文的版本（返回新字典，不修改可能来自缓存的原对象）。
+    缺译文的帖子合并触发一次翻译，最多等待 wait（默认 TRANSLATION_WAIT_SECONDS）秒，仍未完成的标记为 pending。
+    """
+    wait = TRANSLATION_WAIT_SECONDS if wait is None else wait
+    results = []
+    missing: List[int] = []
+    for post in posts:
+        post = dict(post)
+        cache = post.get("translated_cache") or {}
+        if post.get("source_language") == lang:
+            post["translated_cache"], post["translation_status"] = None, "original"
+        elif cache.get(lang):
+            post["translated_cache"], post["translation_status"] = {lang: cache[lang]}, "ready"
+        else:
+            post["translated_cache"], post["translation_status"] = None, "pending"
+            missing.append(post["id"])
+        results.append(post)
+    if not missing:
+        return results
+
+    events = single_flight.start(missing, lang)
+    deadline = time.monotonic() + wait
+    for event in events.values():
+        event.wait(max(deadline - time.monotonic(), 0))
+
+    translations = _stored_translations(db, missing, lang)
+    newly_failed = []
+    for post in results:
+        if post["translation_status"] != "pending":
+            continue
+        key = (post["id"], lang)
+        event = events.get(key)
+        if post["id"] in translations:
+            post["translated_cache"], post["translation_status"] = {lang: translations[post["id"]]}, "ready"
+        elif event is not None and event.is_set():
+            # 本进程的翻译已经结束，却没有得到译文
+            newly_failed.append(key)
+            post["translation_status"] = "failed"
+        elif single_flight.failed(key):
+            post["translation_status"] = "failed"
+    single_flight.mark_failed(newly_failed)
+    return results
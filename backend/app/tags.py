@@ -0,0 +1,19 @@
+from typing import List
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from sqlalchemy import desc
+from . import schemas, models, database
+
+router = APIRouter(prefix="/api/tags", tags=["tags"])
+
+@router.get("/", response_model=List[schemas.TagOut])
+def get_popular_tags(
+    kind: str = Query("post", pattern="^(post|item)$"),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(database.get_db)
+):
+    """热门标签：直接按 tags 表上的计数排序"""
+    count_column = models.Tag.post_count if kind == "post" else models.Tag.item_count
+    return db.query(models.Tag).filter(count_column > 0).order_by(
+        desc(count_column), models.Tag.id
+    ).limit(limit).all()
@@ -1,16 +1,116 @@
 import os
+from typing import Dict, List, Optional, Tuple
 from celery import Celery
-import requests
 import json
 from sqlalchemy.orm import Session
 from .database import SessionLocal
-from .models import Post, Translation, User, Badge, UserBadge
+from .models import Post, Translation
 
 from .celery_app import celery_app
+from .cache import response_cache, post_namespace
+from .services.translation_memory import translation_memory
+from .services.translation_client import translation_client
+from .services.segment_translation import segment_translator
+
+APP_LANGUAGES = ['ja', 'zh', 'en']
+
+
+def app_lang_to_lt(code: str) -> str:
+    if not code:
+        return code
+    if code == "zh":
+        return "zh-Hans"
+    return code
+
+
+def lt_lang_to_app(code: str) -> str:
+    # 反向映射：把 zh-Hans 存成应用的 zh，方便前端读取
+    return "zh" if code in ["zh-Hans", "zh-Hant"] else code
+
+
+def translation_targets(post: Post, target: Optional[str] = None) -> Tuple[str, List[str]]:
+    """返回 (LibreTranslate 源语言码, 目标语言码列表)"""
+    source_lang = app_lang_to_lt(post.source_language) if post.source_language else "auto"
+    if target:
+        # target 参数使用应用语言码（zh/en/ja），这里映射为 LibreTranslate 语言码
+        lt_target = app_lang_to_lt(target)
+        return source_lang, [lt_target] if lt_target != source_lang else []
+    # 自动翻译：应用层期望 ja/zh/en
+    app_targets = [l for l in APP_LANGUAGES if l != (post.source_language or '')]
+    return source_lang, [app_lang_to_lt(t) for t in app_targets if app_lang_to_lt(t) != source_lang]
+
+
+def set_post_translations(db: Session, post: Post, translations: Dict[str, str], replace: bool = False):
+    """
+    把 {应用语言码: 译文} 写入 posts.translated_cache 和 translations 表。
+    replace=True 时丢弃原有的翻译（内容被编辑后旧译文已不对应）。调用方负责 commit。
+    """
+    translations_cache = {} if replace else (post.translated_cache or {})
+    if not isinstance(translations_cache, dict):
+        translations_cache = {}
+    translations_cache = dict(translations_cache, **translations)
+
+    existing = {t.lang: t for t in db.query(Translation).filter(Translation.post_id == post.id).all()}
+    for lang, entry in existing.items():
+        if replace and lang not in translations:
+            db.delete(entry)
+    for lang, translated_text in translations.items():
+        if lang in existing:
+            existing[lang].translated_text = translated_text
+        else:
+            db.add(Translation(post_id=post.id, lang=lang, translated_text=translated_text))
+
+    post.translated_cache = translations_cache or None
+    post.is_translated = bool(translations_cache)
+
+
+def cached_translations(db: Session, post: Post) -> Dict[str, str]:
+    """只查翻译记忆、不调用 LibreTranslate，返回帖子当前内容已有的译文 {应用语言码: 译文}"""
+    source_lang, targets = translation_targets(post)
+    found = translation_memory.lookup_many(db, post.content, source_lang, targets)
+    return {lt_lang_to_app(target): text for target, text in found.items()}
+
+
+def translate_posts_now(db: Session, posts: List[Post], target: Optional[str] = None) -> Tuple[int, int]:
+    """
+    翻译一批帖子并提交，返回 (得到的译文数, 其中来自翻译记忆的数量)。
+    先查翻译记忆；没有的按句查句子记忆，缺的句子按 (源语言, 目标语言) 合并成一次调用（多篇帖子的句子放在同一个 q 数组里），
+    各语言对并发请求。
+    """
+    found: Dict[int, Dict[str, str]] = {}
+    # 相同原文只翻译一次（dict 去重并保持顺序）
+    pending: Dict[Tuple[str, str], Dict[str, None]] = {}
+    for post in posts:
+        source_lang, targets = translation_targets(post, target)
+        found[post.id] = translation_memory.lookup_many(db, post.content, source_lang, targets)
+        for lt_target in targets:
+            if lt_target not in found[post.id]:
+                pending.setdefault((source_lang, lt_target), {})[post.content] = None
+    from_memory = sum(len(f) for f in found.values())
+    jobs = {pair: list(texts) for pair, texts in pending.items()}
+
+    fresh: Dict[Tuple[str, str, str], str] = {}
+    for (source_lang, lt_target), translated in segment_translator.translate_pairs(db, translation_client, jobs).items():
+        for text, translated_text in zip(jobs[(source_lang, lt_target)], translated):
+            if translated_text:
+                fresh[(source_lang, lt_target, text)] = translated_text
+                translation_memory.store(db, text, source_lang, {lt_target: translated_text})
+
+    total = 0
+    for post in posts:
+        source_lang, targets = translation_targets(post, target)
+        translated = dict(found[post.id])
+        for lt_target in targets:
+            if (source_lang, lt_target, post.content) in fresh:
+                translated[lt_target] = fresh[(source_lang, lt_target, post.content)]
+        if translated:
+            set_post_translations(db, post, {lt_lang_to_app(t): text for t, text in translated.items()})
+            total += len(translated)
+    if total:
+        db.commit()
+        response_cache.invalidate("posts", *(post_namespace(post.id) for post in posts))
+    return total, from_memory
 
-# 开发环境更常见的是在宿主机跑 LibreTranslate（localhost:5000）。
-# Docker 环境会通过 docker-compose 显式设置为 http://libretranslate:5000
-LIBRETRANSLATE_URL = os.getenv("LIBRETRANSLATE_URL", "http://localhost:5000")
 
 @celery_app.task
 def translate_post(post_id: int, target: str = None):
@@ -19,82 +119,39 @@ def translate_post(post_id: int, target: str = None):
         post = db.query(Post).filter(Post.id == post_id).first()
         if not post:
             return "Post not found"
+        total, from_memory = translate_posts_now(db, [post], target)
+        return f"Translated {total} languages ({from_memory} from translation memory)"
+    finally:
+        db.close()
 
-        def app_lang_to_lt(code: str) -> str:
-            if not code:
-                return code
-            if code == "zh":
-                return "zh-Hans"
-            return code
-
-        source_lang = app_lang_to_lt(post.source_language) if post.source_language else "auto"
-        if target:
-            # target 参数使用应用语言码（zh/en/ja），这里映射为 LibreTranslate 语言码
-            lt_target = app_lang_to_lt(target)
-            targets = [lt_target] if lt_target != source_lang else []
-        else:
-            # 自动翻译：应用层期望 ja/zh/en
-            app_targets = [l for l in ['ja', 'zh', 'en'] if l != (post.source_language or '')]
-            targets = [app_lang_to_lt(t) for t in app_targets if app_lang_to_lt(t) != source_lang]
-        
-        translations_cache = post.translated_cache or {}
-        if not isinstance(translations_cache, dict):
-            translations_cache = {}
-
-        success_count = 0
-
-        for target in targets:
-            try:
-                # Call LibreTranslate
-                response = requests.post(
-                    f"{LIBRETRANSLATE_URL}/translate",
-                    json={
-                        "q": post.content,
-                        "source": source_lang or "auto",
-                        "target": target,
-                        "format": "text"
-                    },
-                    timeout=30
-                )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    translated_text = result.get("translatedText")
-                    if translated_text:
-                        # 反向映射：把 zh-Hans 存成应用的 zh，方便前端读取
-                        app_key = "zh" if target in ["zh-Hans", "zh-Hant"] else target
-                        # Update cache
-                        translations_cache[app_key] = translated_text
-                        
-                        # Update Translation table
-                        trans_entry = db.query(Translation).filter(
-                            Translation.post_id == post_id,
-                            Translation.lang == app_key
-                        ).first()
-                        
-                        if not trans_entry:
-                            trans_entry = Translation(
-                                post_id=post_id,
-                                lang=app_key,
-                                translated_text=translated_text
-                            )
-                            db.add(trans_entry)
-                        else:
-                            trans_entry.translated_text = translated_text
-                        
-                        success_count += 1
-            except Exception as e:
-                print(f"Translation failed for {target}: {e}")
-
-        if success_count > 0:
-            post.translated_cache = translations_cache
-            post.is_translated = True
-            db.commit()
-            
-            # Trigger badge check
-            from .services.badge_service import check_badges_for_user
-            check_badges_for_user(post.author_id, db)
-            
-        return f"Translated {success_count} languages"
+
+@celery_app.task
+def translate_posts(post_ids: List[int], target: str = None):
+    """多篇帖子一起翻译，同一语言对只调用一次 LibreTranslate"""
+    db = SessionLocal()
+    try:
+        posts = db.query(Post).filter(Post.id.in_(post_ids)).order_by(Post.id).all()
+        total, from_memory = translate_posts_now(db, posts, target)
+        return f"Translated {total} languages for {len(posts)} posts ({from_memory} from translation memory)"
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    # python -m app.translator [batch_size]：分批翻译所有尚未翻译的帖子
+    import sys
+
+    batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    db = SessionLocal()
+    try:
+        last_id = 0
+        while True:
+            ids = [row[0] for row in db.query(Post.id).filter(
+                Post.id > last_id, Post.is_translated.isnot(True)
+            ).order_by(Post.id).limit(batch_size).all()]
+            if not ids:
+                break
+            print(translate_posts(ids))
+            last_id = ids[-1]
     finally:
         db.close()
@@ -3,6 +3,8 @@ import os
 from datetime import datetime
 from . import auth, models, database, schemas
 from .storage import storage_available, upload_file as storage_upload_file
+from .cache import response_cache, USERS_NAMESPACE
+from .principal_cache import principal_cache
 from sqlalchemy.orm import Session
 
 router = APIRouter(prefix="/api/uploads", tags=["uploads"])
@@ -42,6 +44,8 @@ async def upload_avatar(
         # Update user profile
         current_user.avatar_url = avatar_url
         db.commit()
+        response_cache.invalidate(USERS_NAMESPACE)
+        principal_cache.invalidate(current_user.email)
         db.refresh(current_user)
         
         return current_user
@@ -87,6 +91,8 @@ async def upload_cover(
         # Update user profile
         current_user.cover_image_url = cover_url
         db.commit()
+        response_cache.invalidate(USERS_NAMESPACE)
+        principal_cache.invalidate(current_user.email)
         db.refresh(current_user)
         
         return current_user
@@ -1,22 +1,56 @@
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models, database, auth, schemas, replicas
+from .notifications import create_notification
+from .services.counter_service import reconcile_post_counters
+from .cache import response_cache, USERS_NAMESPACE
+from .principal_cache import principal_cache
+from .services.timeline_service import on_follow, on_unfollow
+from .utils.conditional import make_etag, check_not_modified
+
+
+def _bump_follower_count(db: Session, user_id: int, delta: int):
+    db.query(models.User).filter(models.User.id == user_id).update(
+        {models.User.follower_count: models.User.follower_count + delta},
+        synchronize_session=False,
+    )
+
 
-from . import models, database, auth, schemas
+def _touch_user(db: Session, user_id: int):
+    # 关注列表变化时更新关注者的行版本（version 随 UPDATE 自动 +1），使其 stats 的 ETag 失效
+    db.query(models.User).filter(models.User.id == user_id).update(
+        {models.User.updated_at: func.now()}, synchronize_session=False,
+    )
 
 router = APIRouter(prefix="/api/users", tags=["users"])
 
 
+async def _list_follow_users(db: AsyncSession, user_id: int, match_col, user_col, skip: int, limit: int):
+    """粉丝/关注列表：follows 里 match_col == user_id 的行对应的 user_col 用户，一次 JOIN 查询"""
+    if await db.get(models.User, user_id) is None:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    rows = await db.scalars(
+        select(models.User).join(models.Follow, user_col == models.User.id).where(
+            match_col == user_id
+        ).order_by(models.Follow.id).offset(skip).limit(limit)
+    )
+    return list(rows)
+
+
 @router.get("/me/following", response_model=List[int])
-def get_my_following(
-    db: Session = Depends(database.get_db),
+async def get_my_following(
+    db: AsyncSession = Depends(database.get_async_db),
     current_user: models.User = Depends(auth.get_current_user),
 ):
-    rows = db.query(models.Follow.following_id).filter(
-        models.Follow.follower_id == current_user.id
-    ).all()
-    return [r[0] for r in rows]
+    rows = await db.scalars(
+        select(models.Follow.following_id).where(models.Follow.follower_id == current_user.id)
+    )
+    return list(rows)
 
 
 @router.post("/{user_id}/follow", status_code=status.HTTP_200_OK)
@@ -40,18 +74,16 @@ def follow_user(
         return {"status": "following"}
 
     db.add(models.Follow(follower_id=current_user.id, following_id=user_id))
+    _bump_follower_count(db, user_id, 1)
+    _touch_user(db, current_user.id)
+    on_follow(db, current_user.id, target)
     db.commit()
+    # _touch_user 改了当前用户的行版本（stats 的 ETag 用到它）
+    principal_cache.invalidate(current_user.email)
     
     # Create notification for the user being followed
-    notification = models.Notification(
-        user_id=user_id,
-        type="follow",
-        actor_id=current_user.id,
-        target_type="user",
-        target_id=current_user.id,  # The follower
-    )
-    db.add(notification)
-    db.commit()
+    # target 是被关注的用户本人，同一时间窗口内的新关注合并成一条（actor 是最新的关注者）
+    create_notification(db, user_id, "follow", current_user.id, "user", user_id)
     
     return {"status": "following"}
 
@@ -73,33 +105,56 @@ def unfollow_user(
         return {"status": "not_following"}
 
     db.delete(row)
+    _bump_follower_count(db, user_id, -1)
+    _touch_user(db, current_user.id)
+    on_unfollow(db, current_user.id, user_id)
     db.commit()
+    principal_cache.invalidate(current_user.email)
     return {"status": "not_following"}
 
 
 @router.get("/{user_id}/stats", status_code=status.HTTP_200_OK)
-def get_user_stats(
+async def get_user_stats(
     user_id: int,
-    db: Session = Depends(database.get_db),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(replicas.get_async_read_db),
     current_user: models.User = Depends(auth.get_current_user_optional),
 ):
-    target = db.query(models.User).filter(models.User.id == user_id).first()
-    if not target:
+    # 关注/取关会更新双方的行版本，所以两个 version 就能判断响应是否变化；主键查询，不做计数
+    validator = (await db.execute(
+        select(models.User.version, models.User.updated_at).where(models.User.id == user_id)
+    )).first()
+    if not validator:
         raise HTTPException(status_code=404, detail="User not found")
+    viewer = f"{current_user.id}.{current_user.version}" if current_user else "0"
+    etag = make_etag("user_stats", user_id, validator.version, viewer)
+    # followed_by_me 随当前用户的关注变化
+    last_modified = max(
+        (t for t in (validator.updated_at, current_user.updated_at if current_user else None) if t is not None),
+        default=None,
+    )
+    not_modified = check_not_modified(request, response, etag, last_modified)
+    if not_modified:
+        return not_modified
 
-    follower_count = db.query(func.count(models.Follow.id)).filter(
-        models.Follow.following_id == user_id
-    ).scalar() or 0
-    following_count = db.query(func.count(models.Follow.id)).filter(
-        models.Follow.follower_id == user_id
-    ).scalar() or 0
+    target = await db.get(models.User, user_id)
+
+    follower_count = await db.scalar(
+        select(func.count(models.Follow.id)).where(models.Follow.following_id == user_id)
+    ) or 0
+    following_count = await db.scalar(
+        select(func.count(models.Follow.id)).where(models.Follow.follower_id == user_id)
+    ) or 0
 
     followed_by_me = False
     if current_user:
-        followed_by_me = db.query(models.Follow).filter(
-            models.Follow.follower_id == current_user.id,
-            models.Follow.following_id == user_id,
-        ).first() is not None
+        followed_by_me = await db.scalar(
+            select(models.Follow.id).where(
+                models.Follow.follower_id == current_user.id,
+                models.Follow.following_id == user_id,
+            ).limit(1)
+        ) is not None
 
     return {
         "user": schemas.UserOut.model_validate(target),
@@ -110,49 +165,27 @@ def get_user_stats(
 
 
 @router.get("/{user_id}/followers", response_model=List[schemas.UserOut])
-def get_followers(
+async def get_followers(
     user_id: int,
     skip: int = 0,
     limit: int = 50,
-    db: Session = Depends(database.get_db),
+    db: AsyncSession = Depends(replicas.get_async_read_db),
     current_user: models.User = Depends(auth.get_current_user_optional),
 ):
     """获取用户的粉丝列表"""
-    target = db.query(models.User).filter(models.User.id == user_id).first()
-    if not target:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    follows = db.query(models.Follow).filter(
-        models.Follow.following_id == user_id
-    ).offset(skip).limit(limit).all()
-    
-    follower_ids = [f.follower_id for f in follows]
-    followers = db.query(models.User).filter(models.User.id.in_(follower_ids)).all()
-    
-    return followers
+    return await _list_follow_users(db, user_id, models.Follow.following_id, models.Follow.follower_id, skip, limit)
 
 
 @router.get("/{user_id}/following", response_model=List[schemas.UserOut])
-def get_following(
+async def get_following(
     user_id: int,
     skip: int = 0,
     limit: int = 50,
-    db: Session = Depends(database.get_db),
+    db: AsyncSession = Depends(replicas.get_async_read_db),
     current_user: models.User = Depends(auth.get_current_user_optional),
 ):
     """获取用户的关注列表"""
-    target = db.query(models.User).filter(models.User.id == user_id).first()
-    if not target:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    follows = db.query(models.Follow).filter(
-        models.Follow.follower_id == user_id
-    ).offset(skip).limit(limit).all()
-    
-    following_ids = [f.following_id for f in follows]
-    following = db.query(models.User).filter(models.User.id.in_(following_ids)).all()
-    
-    return following
+    return await _list_follow_users(db, user_id, models.Follow.follower_id, models.Follow.following_id, skip, limit)
 
 
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -173,7 +206,22 @@ def delete_user(
     if user_id == current_user.id:
         raise HTTPException(status_code=400, detail="Cannot delete yourself")
     
+    # 该用户的点赞/收藏会被数据库级联删除（ON DELETE CASCADE），先记下受影响的帖子，删除后校正计数
+    affected_post_ids = set()
+    for model in (models.Like, models.Favorite):
+        affected_post_ids.update(
+            row[0] for row in db.query(model.post_id).filter(model.user_id == user_id).distinct().all()
+        )
+
+    target_email = target_user.email
     db.delete(target_user)
     db.commit()
+    # 已签发的 token 在过期前仍然有效，清掉快照后下一次请求查不到用户即返回 401
+    principal_cache.invalidate(target_email)
+
+    if affected_post_ids:
+        reconcile_post_counters(db, affected_post_ids)
+    # 作者信息、被级联删除的点赞/收藏都会影响帖子和商品的响应
+    response_cache.invalidate("posts", "items", USERS_NAMESPACE)
     return
 
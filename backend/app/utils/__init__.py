@@ -1,5 +1,13 @@
 # Utils package
 from .restriction_validators import validate_restriction, get_daily_restrictions
+from .pagination import encode_cursor, decode_cursor, encode_value_cursor, decode_value_cursor, keyset_paginate, keyset_paginate_async
+from .conditional import make_etag, http_date, check_not_modified
+from .segmenter import Segment, split_sentences, join_segments
 
-__all__ = ['validate_restriction', 'get_daily_restrictions']
-
+__all__ = [
+    'validate_restriction', 'get_daily_restrictions',
+    'encode_cursor', 'decode_cursor', 'encode_value_cursor', 'decode_value_cursor',
+    'keyset_paginate', 'keyset_paginate_async',
+    'make_etag', 'http_date', 'check_not_modified',
+    'Segment', 'split_sentences', 'join_segments',
+]
@@ -0,0 +1,38 @@
+"""
+批量写入辅助
+
+insert_ignore：INSERT ... ON CONFLICT DO NOTHING（PostgreSQL / SQLite 都支持），
+并发写入同一主键时不报错，先写入的行保留。
+upsert：INSERT ... ON CONFLICT DO UPDATE，已有的行用新值覆盖。
+"""
+from typing import List, Sequence
+from sqlalchemy.orm import Session
+
+
+def _insert(db: Session):
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+def insert_ignore(db: Session, model, rows: List[dict], index_elements: Sequence[str]) -> int:
+    """批量插入，冲突的行跳过；返回实际插入的行数（驱动不支持时可能为 -1）"""
+    if not rows:
+        return 0
+    stmt = _insert(db)(model).values(rows).on_conflict_do_nothing(index_elements=list(index_elements))
+    return db.execute(stmt).rowcount
+
+
+def upsert(db: Session, model, rows: List[dict], index_elements: Sequence[str]) -> int:
+    """批量插入或更新（rows 里除主键外的列全部覆盖）；各行的列必须相同"""
+    if not rows:
+        return 0
+    stmt = _insert(db)(model).values(rows)
+    columns = [column for column in rows[0] if column not in index_elements]
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(index_elements),
+        set_={column: stmt.excluded[column] for column in columns},
+    )
+    return db.execute(stmt).rowcount
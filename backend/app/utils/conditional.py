@@ -0,0 +1,76 @@
+"""
+条件请求（ETag / Last-Modified）
+
+响应带上弱 ETag（由行版本号 version、缓存命名空间版本号和当前用户等拼成的摘要）
+和 Last-Modified（行的 updated_at）。请求的 If-None-Match / If-Modified-Since
+仍然匹配时直接返回 304：不组装、不序列化响应体；校验值本身走响应缓存，通常也不查数据库。
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+from fastapi import Request, Response
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.sha1("|".join(str(p) for p in parts).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def _utc(value: datetime) -> datetime:
+    # SQLite 读出的是不带时区的 UTC 时间；HTTP 日期只精确到秒
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).replace(microsecond=0)
+
+
+def http_date(value: datetime) -> str:
+    return format_datetime(_utc(value), usegmt=True)
+
+
+def parse_http_date(value: str) -> Optional[datetime]:
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return _utc(parsed)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # 弱比较：忽略 W/ 前缀
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # 有 If-None-Match 时忽略 If-Modified-Since（RFC 9110）
+        return _etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        since = parse_http_date(if_modified_since)
+        return since is not None and _utc(last_modified) <= since
+    return False
+
+
+def check_not_modified(
+    request: Request,
+    response: Response,
+    etag: str,
+    last_modified: Optional[datetime] = None,
+) -> Optional[Response]:
+    """
+    给 response 设置校验头；客户端的副本仍然有效时返回 304 响应，调用方直接 return 它。
+    响应内容因登录用户而异（liked_by_me 等），所以带 Vary: Authorization，且要求客户端每次重新校验。
+    """
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Authorization"}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    response.headers.update(headers)
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    return None
@@ -0,0 +1,125 @@
+"""
+Keyset (cursor) pagination helpers
+
+列表按 (created_at DESC, id DESC) 排序，游标是上一页最后一行的 (created_at, id)，
+经 base64 编码后对客户端不透明。下一页游标通过响应头 X-Next-Cursor 返回，
+响应体保持原来的列表格式，旧客户端继续使用 skip 不受影响。
+
+定位条件写成行值比较 (created_at, id) < (:created_at, :id)，绑定参数带上列的类型，
+PostgreSQL 可以直接用 (created_at, id) 复合索引。SQLite 把时间存成字符串，
+server_default 写入的值没有小数秒而绑定参数带 6 位小数，直接按字符串比较会把
+同一秒内的行判错，因此在 SQLite 上排序和比较都先用 strftime 规范成同一格式。
+"""
+import base64
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+from fastapi import HTTPException, Response
+from sqlalchemy import Select, desc, func, literal, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        created_at, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def encode_value_cursor(value) -> str:
+    """单列游标（排名、物化路径等），同样 base64 编码"""
+    return base64.urlsafe_b64encode(str(value).encode("utf-8")).decode("ascii")
+
+
+def decode_value_cursor(cursor: str, cast: Callable = str):
+    try:
+        return cast(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _dialect_name(query) -> Optional[str]:
+    session = getattr(query, "session", None)
+    return session.get_bind().dialect.name if session is not None else None
+
+
+def _sort_key(dialect_name: Optional[str], column):
+    """SQLite 上把时间列规范成定长字符串（毫秒精度），其他数据库原样返回"""
+    if dialect_name == "sqlite":
+        return func.strftime("%Y-%m-%d %H:%M:%f", column)
+    return column
+
+
+def _keyset_window(stmt, created_col, id_col, limit: int, cursor: Optional[str], skip: int, dialect_name: Optional[str]):
+    """给 Query 或 select() 加上排序、游标定位和 limit（多取一行判断是否还有下一页）"""
+    sort_col = _sort_key(dialect_name, created_col)
+    stmt = stmt.order_by(desc(sort_col), desc(id_col))
+    if cursor:
+        created_at, last_id = decode_cursor(cursor)
+        stmt = stmt.filter(tuple_(sort_col, id_col) < tuple_(
+            _sort_key(dialect_name, literal(created_at, type_=created_col.type)),
+            literal(last_id, type_=id_col.type),
+        ))
+    elif skip:
+        stmt = stmt.offset(skip)
+    return stmt.limit(limit + 1)
+
+
+def _finish_page(rows: List, limit: int, created_col, id_col, response: Optional[Response], key: Optional[Callable]) -> List:
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if response is not None and has_more and rows:
+        if key is None:
+            last = rows[-1]
+            created_at, last_id = getattr(last, created_col.key), getattr(last, id_col.key)
+        else:
+            created_at, last_id = key(rows[-1])
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(created_at, last_id)
+
+    return rows
+
+
+def keyset_paginate(
+    query,
+    created_col,
+    id_col,
+    limit: int,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    response: Optional[Response] = None,
+    key: Optional[Callable] = None,
+) -> List:
+    """
+    按 (created_col, id_col) 倒序取一页。
+    有 cursor 时用 WHERE (created, id) < (cursor) 行值比较定位，否则退回 offset(skip)。
+    多取一行判断是否还有下一页；有则把游标写入 response 头。
+    key 用于从结果行中取出 (created_at, id)，默认直接读取同名属性。
+    """
+    window = _keyset_window(query, created_col, id_col, limit, cursor, skip, _dialect_name(query))
+    return _finish_page(window.all(), limit, created_col, id_col, response, key)
+
+
+async def keyset_paginate_async(
+    db: AsyncSession,
+    stmt: Select,
+    created_col,
+    id_col,
+    limit: int,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    response: Optional[Response] = None,
+    key: Optional[Callable] = None,
+) -> List:
+    """keyset_paginate 的 AsyncSession 版本，stmt 是只选一个实体的 select() 语句"""
+    window = _keyset_window(stmt, created_col, id_col, limit, cursor, skip, db.bind.dialect.name)
+    rows = (await db.execute(window)).unique().scalars().all()
+    return _finish_page(list(rows), limit, created_col, id_col, response, key)
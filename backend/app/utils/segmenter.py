@@ -0,0 +1,91 @@
+"""
+按句切分帖子内容（ja / zh / en），用于句子级翻译记忆
+
+切分结果保留句间的空白和换行（Segment.trailing），"".join(text + trailing) 与原文完全一致：
+- 中日文：遇到 。！？!?… 结束一句，后面紧跟的引号/括号（」』）等）归入本句
+- 英文：. ! ? 后面是空白或结尾才算句末，常见缩写（Mr. e.g. 等）和单个字母的缩写（U.S.）不切
+- 换行总是结束一句
+不含文字的片段（纯空白、表情、标点）不需要翻译，见 is_translatable。
+"""
+import re
+from typing import Dict, List, NamedTuple, Optional
+
+CJK_TERMINATORS = "。！？!?…"
+EN_TERMINATORS = ".!?"
+CLOSERS = "」』）)】〕\"'”’"
+ABBREVIATIONS = {"mr", "mrs", "ms", "dr", "prof", "st", "vs", "etc", "jr", "sr", "no", "fig", "approx"}
+SPACED_LANGUAGES = {"en"}
+
+_WORD_BEFORE = re.compile(r"([A-Za-z][A-Za-z.]*)$")
+
+
+class Segment(NamedTuple):
+    text: str
+    trailing: str
+
+
+def is_translatable(text: str) -> bool:
+    return any(ch.isalpha() for ch in text)
+
+
+def _is_english_stop(text: str, i: int) -> bool:
+    """text[i] 是 . ! ? 时，判断是否为英文句末"""
+    end = i + 1
+    while end < len(text) and text[end] in EN_TERMINATORS + CLOSERS:
+        end += 1
+    if end < len(text) and not text[end].isspace():
+        return False
+    if text[i] != ".":
+        return True
+    match = _WORD_BEFORE.search(text, 0, i)
+    if not match:
+        return True
+    word = match.group(1).lower()
+    # U.S. / e.g. 这类中间带点的、单个字母的（姓名首字母）都当作缩写
+    return "." not in word and len(word) > 1 and word not in ABBREVIATIONS
+
+
+def split_sentences(text: str, lang: Optional[str] = None) -> List[Segment]:
+    """lang 为 None / auto 时中日文和英文规则都用"""
+    segments: List[Segment] = []
+    english = lang not in ("ja", "zh", "zh-Hans", "zh-Hant")
+    start = i = 0
+    n = len(text or "")
+    while i < n:
+        ch = text[i]
+        if ch in "\r\n":
+            end = i
+        elif ch in CJK_TERMINATORS or (english and ch in EN_TERMINATORS and _is_english_stop(text, i)):
+            end = i + 1
+            while end < n and (text[end] in CJK_TERMINATORS or text[end] in EN_TERMINATORS or text[end] in CLOSERS):
+                end += 1
+        else:
+            i += 1
+            continue
+        after = end
+        while after < n and text[after].isspace():
+            after += 1
+        segments.append(Segment(text[start:end], text[end:after]))
+        start = i = after
+    if start < n:
+        body = text[start:].rstrip()
+        segments.append(Segment(body, text[start + len(body):]))
+    return segments
+
+
+def join_segments(segments: List[Segment], translations: Dict[str, str], target: Optional[str] = None) -> str:
+    """
+    用 {原句: 译句} 拼回全文，没有译文的片段保留原样。
+    译成英文时，原文句间没有空白（中日文）的地方补一个空格；译成中日文时去掉句间的空格（换行保留）。
+    """
+    parts = []
+    for index, segment in enumerate(segments):
+        parts.append(translations.get(segment.text, segment.text))
+        trailing = segment.trailing
+        if target in SPACED_LANGUAGES:
+            if not trailing and index < len(segments) - 1:
+                trailing = " "
+        elif target and "\n" not in trailing and index < len(segments) - 1:
+            trailing = ""
+        parts.append(trailing)
+    return "".join(parts)
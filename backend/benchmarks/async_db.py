@@ -0,0 +1,150 @@
+"""
+同步 Session 与 AsyncSession 的吞吐量对比
+
+同一条查询（最新 20 条帖子，可选地在数据库里额外等待 --db-latency 秒）分别由
+同步接口（线程池执行）和 async 接口（AsyncSession）提供，两者用同样的 uvicorn worker 数、
+同样的连接池大小和同样的并发请求数压测，输出 requests/sec 和延迟分位数。
+
+    cd backend
+    DATABASE_URL=postgresql://... python -m benchmarks.async_db --workers 1 --concurrency 200 --requests 4000 --db-latency 0.02
+
+--db-latency 在 PostgreSQL 上用 pg_sleep() 模拟慢查询/网络往返（SQLite 上忽略），
+正是这种“等数据库”的时间让同步接口占满线程池（默认 40 个线程）。
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app import database, models
+
+DB_LATENCY = float(os.getenv("BENCH_DB_LATENCY", 0))
+SLEEP_SQL = text("SELECT pg_sleep(:seconds)")
+LATEST_POSTS = select(models.Post.id, models.Post.title).order_by(models.Post.id.desc()).limit(20)
+SIMULATE_LATENCY = DB_LATENCY > 0 and database.engine.dialect.name == "postgresql"
+
+app = FastAPI(title="async db benchmark")
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+
+@app.get("/sync")
+def sync_endpoint(db: Session = Depends(database.get_db)):
+    if SIMULATE_LATENCY:
+        db.execute(SLEEP_SQL, {"seconds": DB_LATENCY})
+    return [row.id for row in db.execute(LATEST_POSTS)]
+
+
+@app.get("/async")
+async def async_endpoint(db: AsyncSession = Depends(database.get_async_db)):
+    if SIMULATE_LATENCY:
+        await db.execute(SLEEP_SQL, {"seconds": DB_LATENCY})
+    return [row.id for row in await db.execute(LATEST_POSTS)]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _wait_ready(base_url: str, server: subprocess.Popen, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise RuntimeError(f"benchmark server exited with code {server.returncode}")
+            try:
+                if (await client.get(f"{base_url}/health")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("benchmark server did not start")
+
+
+async def _load(url: str, total: int, concurrency: int) -> dict:
+    latencies = []
+    errors = 0
+    remaining = iter(range(total))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        async def worker():
+            nonlocal errors
+            for _ in remaining:
+                started = time.perf_counter()
+                try:
+                    response = await client.get(url)
+                    if response.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "rps": total / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "errors": errors,
+    }
+
+
+async def run(args) -> dict:
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = {**os.environ, "BENCH_DB_LATENCY": str(args.db_latency)}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.async_db:app", "--port", str(port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        await _wait_ready(base_url, server)
+        results = {}
+        for name in ("sync", "async"):
+            # 预热：建立连接池
+            await _load(f"{base_url}/{name}", args.concurrency, args.concurrency)
+            results[name] = await _load(f"{base_url}/{name}", args.requests, args.concurrency)
+        return results
+    finally:
+        server.terminate()
+        server.wait(10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--db-latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print(f"workers={args.workers} concurrency={args.concurrency} requests={args.requests} "
+          f"db_latency={args.db_latency}s dialect={database.engine.dialect.name}")
+    print(f"{'':8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, r in results.items():
+        print(f"{name:8}{r['rps']:>10.1f}{r['p50_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
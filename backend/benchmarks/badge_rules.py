@@ -0,0 +1,121 @@
+"""
+徽章规则：原来的 Python 全量加载 vs 数据库里的集合运算
+
+造一个发帖很多的用户（--posts 篇帖子分布在 --days 天里，每篇 --likes 个赞），比较
+streak_poster / polyglot / heart_collector 三条规则：
+- legacy：原来的写法，把该用户的所有帖子（和每篇帖子的赞）加载到 Python 里计算
+- set-based：badge_service 的 ThresholdRule.qualifying_users（窗口函数 / COUNT(DISTINCT) / 聚合 JOIN）
+
+    cd backend
+    python -m benchmarks.badge_rules --posts 5000 --likes 5
+    DATABASE_URL=postgresql://... python -m benchmarks.badge_rules --posts 20000
+
+默认使用 ./badge_bench.db（SQLite）；结束时删除造的数据。
+"""
+import argparse
+import os
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./badge_bench.db")
+
+from sqlalchemy import delete, insert  # noqa: E402
+
+from app import database, models  # noqa: E402
+from app.services.badge_service import RULES  # noqa: E402
+
+RULE_NAMES = ["streak_poster", "polyglot", "heart_collector"]
+LANGUAGES = ["ja", "zh", "en"]
+
+
+def seed(db, posts: int, days: int, likes: int) -> tuple:
+    stamp = int(time.time())
+    author = models.User(email=f"bench-{stamp}@example.com", password_hash="x", nickname="bench")
+    likers = [models.User(email=f"bench-{stamp}-{i}@example.com", password_hash="x", nickname=f"liker {i}")
+              for i in range(likes)]
+    db.add_all([author, *likers])
+    db.flush()
+
+    start = datetime(2025, 1, 1, 12)
+    db.execute(insert(models.Post), [
+        {"title": f"post {i}", "content": "benchmark", "author_id": author.id,
+         "source_language": LANGUAGES[i % len(LANGUAGES)], "created_at": start + timedelta(days=i % days, minutes=i)}
+        for i in range(posts)
+    ])
+    post_ids = [row[0] for row in db.query(models.Post.id).filter(models.Post.author_id == author.id)]
+    db.execute(insert(models.Like), [
+        {"post_id": post_id, "user_id": liker.id} for post_id in post_ids for liker in likers
+    ])
+    db.commit()
+    return author.id, [liker.id for liker in likers]
+
+
+def legacy(db, user_id: int) -> set:
+    """原来 check_badges_for_user 里这三条规则的写法"""
+    earned = set()
+    posts = db.query(models.Post).filter(models.Post.author_id == user_id).order_by(models.Post.created_at.desc()).all()
+    dates = sorted({p.created_at.date() for p in posts}, reverse=True)
+    consecutive = 1
+    for i in range(len(dates) - 1):
+        consecutive = consecutive + 1 if dates[i] - dates[i + 1] == timedelta(days=1) else 1
+        if consecutive >= 5:
+            earned.add("streak_poster")
+            break
+
+    posts = db.query(models.Post).filter(models.Post.author_id == user_id).all()
+    if len({p.source_language for p in posts if p.source_language}) >= 2:
+        earned.add("polyglot")
+
+    user_posts = db.query(models.Post).filter(models.Post.author_id == user_id).all()
+    if sum(len(p.likes) for p in user_posts) >= 10:
+        earned.add("heart_collector")
+    return earned
+
+
+def set_based(db, user_id: int) -> set:
+    return {rule.name for rule in RULES if rule.name in RULE_NAMES and user_id in rule.qualifying_users(db, [user_id])}
+
+
+def timed(fn, db, user_id: int, repeat: int):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        db.expunge_all()
+        started = time.perf_counter()
+        result = fn(db, user_id)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--likes", type=int, default=5, help="likes per post")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    database.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    author_id, liker_ids = seed(db, args.posts, args.days, args.likes)
+    try:
+        legacy_seconds, legacy_result = timed(legacy, db, author_id, args.repeat)
+        set_seconds, set_result = timed(set_based, db, author_id, args.repeat)
+        assert legacy_result == set_result, (legacy_result, set_result)
+
+        print(f"{args.posts} posts, {args.posts * args.likes} likes, badges: {sorted(set_result)}")
+        print(f"{'mode':<12}{'seconds':>10}")
+        print(f"{'legacy':<12}{legacy_seconds:>10.4f}")
+        print(f"{'set-based':<12}{set_seconds:>10.4f}")
+        print(f"speedup: {legacy_seconds / set_seconds:.1f}x")
+    finally:
+        db.rollback()
+        post_ids = [row[0] for row in db.query(models.Post.id).filter(models.Post.author_id == author_id)]
+        db.execute(delete(models.Like).where(models.Like.post_id.in_(post_ids)))
+        db.execute(delete(models.Post).where(models.Post.author_id == author_id))
+        db.execute(delete(models.User).where(models.User.id.in_([author_id, *liker_ids])))
+        db.commit()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+本地 LibreTranslate 替身，供测试和压测使用
+
+实现 POST /translate（q 可以是字符串或数组）和 GET /languages，译文为 "[目标语言] 原文"。
+可以设置每次请求的固定延迟（模拟翻译耗时）和让接下来的 N 个请求返回 503（测试重试），
+并记录请求数、文本数和最大并发数。
+
+    cd backend
+    python -m benchmarks.libretranslate_stub --port 5000 --latency 0.3
+
+测试里用 StubServer 在后台线程启动：
+
+    with StubServer(latency=0.2) as stub:
+        client = LibreTranslateClient(stub.url)
+"""
+import argparse
+import asyncio
+import socket
+import threading
+import time
+from typing import List, Union
+
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+LANGUAGES = [
+    {"code": "en", "name": "English", "targets": ["ja", "zh-Hans"]},
+    {"code": "ja", "name": "Japanese", "targets": ["en", "zh-Hans"]},
+    {"code": "zh-Hans", "name": "Chinese (Simplified)", "targets": ["en", "ja"]},
+]
+
+
+class TranslateRequest(BaseModel):
+    q: Union[str, List[str]]
+    source: str = "auto"
+    target: str
+    format: str = "text"
+
+
+def create_app(latency: float = 0.0) -> FastAPI:
+    app = FastAPI(title="LibreTranslate stub")
+    app.state.latency = latency
+    app.state.fail_next = 0
+    app.state.requests = []
+    app.state.in_flight = 0
+    app.state.max_in_flight = 0
+
+    @app.post("/translate")
+    async def translate(body: TranslateRequest):
+        state = app.state
+        state.requests.append(body.model_dump())
+        state.in_flight += 1
+        state.max_in_flight = max(state.max_in_flight, state.in_flight)
+        try:
+            if state.latency:
+                await asyncio.sleep(state.latency)
+            if state.fail_next > 0:
+                state.fail_next -= 1
+                return JSONResponse(status_code=503, content={"error": "Service unavailable"})
+            if isinstance(body.q, list):
+                return {"translatedText": [f"[{body.target}] {text}" for text in body.q]}
+            return {"translatedText": f"[{body.target}] {body.q}"}
+        finally:
+            state.in_flight -= 1
+
+    @app.get("/languages")
+    async def languages():
+        return LANGUAGES
+
+    return app
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class StubServer:
+    """在后台线程里运行替身服务，with 语句结束时停止"""
+
+    def __init__(self, latency: float = 0.0, port: int = 0):
+        self.app = create_app(latency)
+        self.port = port or _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self._server = uvicorn.Server(uvicorn.Config(self.app, host="127.0.0.1", port=self.port, log_level="warning"))
+        self._thread = threading.Thread(target=self._server.run, name="libretranslate-stub", daemon=True)
+
+    @property
+    def requests(self) -> List[dict]:
+        return self.app.state.requests
+
+    def start(self, timeout: float = 10):
+        self._thread.start()
+        deadline = time.monotonic() + timeout
+        while not self._server.started:
+            if not self._thread.is_alive() or time.monotonic() > deadline:
+                raise RuntimeError("LibreTranslate stub did not start")
+            time.sleep(0.02)
+        return self
+
+    def stop(self):
+        self._server.should_exit = True
+        self._thread.join(5)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait per /translate call")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency), host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
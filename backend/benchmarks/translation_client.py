@@ -0,0 +1,68 @@
+"""
+LibreTranslate 调用方式对比
+
+对本地替身服务（benchmarks/libretranslate_stub.py，每次 /translate 固定等待 --latency 秒）翻译
+--posts 篇帖子 × 2 个目标语言，比较：
+- sequential：原来的方式，每篇帖子每个语言一次 requests.post，不复用连接
+- pooled：LibreTranslateClient，连接池 + 各语言并发 + 多篇帖子合并成一次调用
+
+    cd backend
+    python -m benchmarks.translation_client --posts 50 --latency 0.2
+"""
+import argparse
+import time
+
+import requests
+
+from app.services.translation_client import LibreTranslateClient
+from benchmarks.libretranslate_stub import StubServer
+
+TARGETS = ["en", "zh-Hans"]
+
+
+def run_sequential(url: str, texts):
+    for text in texts:
+        for target in TARGETS:
+            response = requests.post(
+                f"{url}/translate",
+                json={"q": text, "source": "ja", "target": target, "format": "text"},
+                timeout=30,
+            )
+            response.raise_for_status()
+
+
+def run_pooled(client: LibreTranslateClient, texts):
+    results = client.translate_many(texts, "ja", TARGETS)
+    assert all(all(results[target]) for target in TARGETS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.2, help="stub latency per /translate call (seconds)")
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    texts = [f"テスト投稿 {i} の本文です。" for i in range(args.posts)]
+    with StubServer(latency=args.latency) as stub:
+        started = time.perf_counter()
+        run_sequential(stub.url, texts)
+        sequential = time.perf_counter() - started
+        sequential_calls = len(stub.requests)
+
+        client = LibreTranslateClient(stub.url, batch_size=args.batch_size)
+        stub.requests.clear()
+        started = time.perf_counter()
+        run_pooled(client, texts)
+        pooled = time.perf_counter() - started
+        pooled_calls = len(stub.requests)
+        client.close()
+
+    print(f"{'mode':<12}{'calls':>8}{'seconds':>10}")
+    print(f"{'sequential':<12}{sequential_calls:>8}{sequential:>10.2f}")
+    print(f"{'pooled':<12}{pooled_calls:>8}{pooled:>10.2f}")
+    print(f"speedup: {sequential / pooled:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,14 +8,27 @@ import os
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
 # テスト用に JWT_SECRET を事前設定
 os.environ.setdefault("JWT_SECRET", "test-secret-key-for-unit-tests")
 os.environ.setdefault("JWT_ALGORITHM", "HS256")
+# 周期任务はテストから明示的に呼び出す
+os.environ.setdefault("SCHEDULER_ENABLED", "false")
+# バッジ評価はテストから badge_queue.flush() で明示的に実行する
+os.environ.setdefault("BADGE_DEBOUNCE_SECONDS", "3600")
 
-from app.database import Base, get_db
+from app.database import Base, get_db, get_async_db
 from app.main import app
+from app.cache import response_cache
+from app.principal_cache import principal_cache
+from app.services.translation_memory import translation_memory
+from app.services.translation_service import single_flight
+from app.services.segment_translation import segment_memory
+from app.services.badge_service import clear_badge_cache
+from app.services.badge_queue import badge_queue
 
 SQLALCHEMY_TEST_URL = "sqlite:///./test.db"
 
@@ -24,6 +37,12 @@ engine = create_engine(
     connect_args={"check_same_thread": False},
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+badge_queue.session_factory = TestingSessionLocal
+
+# AsyncSession を使うルーター用（同じ SQLite ファイル）。
+# TestClient ごとにイベントループが変わるので接続はプールしない
+async_engine = create_async_engine("sqlite+aiosqlite:///./test.db", poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 
 @pytest.fixture(scope="function")
@@ -47,7 +66,20 @@ def client(db_session):
         finally:
             pass
 
+    async def override_get_async_db():
+        async with TestingAsyncSessionLocal() as session:
+            yield session
+
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    # テストごとに DB を作り直すので、プロセス内キャッシュもクリアする
+    response_cache.local.clear()
+    principal_cache.clear()
+    translation_memory.clear()
+    segment_memory.clear()
+    single_flight.clear()
+    clear_badge_cache()
+    badge_queue.clear()
     with TestClient(app) as c:
         yield c
     app.dependency_overrides.clear()
@@ -66,7 +98,7 @@ def test_user_data():
 def registered_user(client, test_user_data):
     """登録済みテストユーザーを返す"""
     response = client.post("/api/auth/register", json=test_user_data)
-    assert response.status_code == 200
+    assert response.status_code == 201
     return response.json()
 
 
@@ -83,3 +115,14 @@ def auth_headers(client, test_user_data, registered_user):
     assert response.status_code == 200
     token = response.json()["access_token"]
     return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def badges(client, db_session):
+    """バッジ定義を投入する（init_badges_data はテストごとに作り直す DB には入らない）"""
+    from app import models
+    from app.services.badge_service import RULES
+
+    existing = {name for (name,) in db_session.query(models.Badge.name)}
+    db_session.add_all(models.Badge(name=rule.name, description=rule.name, icon="🏅") for rule in RULES if rule.name not in existing)
+    db_session.commit()
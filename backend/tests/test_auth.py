@@ -94,3 +94,121 @@ class TestGetMe:
     def test_get_me_invalid_token(self, client):
         response = client.get("/api/auth/me", headers={"Authorization": "Bearer invalid.token.here"})
         assert response.status_code == 401
+
+
+class TestAuthConcurrency:
+    def test_user_lookup_does_not_block_event_loop(self, client, auth_headers):
+        """認証のユーザー検索が遅くても、同時リクエストは直列化されずに並行して処理される"""
+        import asyncio
+        import time
+        import httpx
+        from sqlalchemy import event
+        from app import principal_cache as principal_module
+        from app.main import app
+        from app.database import get_db
+        from tests.conftest import engine, TestingSessionLocal
+
+        delay, clients = 0.2, 8
+
+        def session_per_request():
+            # 同時リクエストで 1 つのセッションを共有しない
+            db = TestingSessionLocal()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        def slow_user_lookup(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith("SELECT") and "FROM users" in statement:
+                time.sleep(delay)
+
+        async def burst(n):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+                started = time.perf_counter()
+                responses = await asyncio.gather(*(
+                    ac.get("/api/notifications/unread/count", headers=auth_headers) for _ in range(n)
+                ))
+                elapsed = time.perf_counter() - started
+            assert all(r.status_code == 200 for r in responses)
+            return n / elapsed
+
+        original = app.dependency_overrides[get_db]
+        app.dependency_overrides[get_db] = session_per_request
+        # ユーザーキャッシュを無効にして、毎回 DB を参照させる
+        principal_module.PRINCIPAL_CACHE_ENABLED = False
+        event.listen(engine, "before_cursor_execute", slow_user_lookup)
+        try:
+            single = asyncio.run(burst(1))
+            concurrent = asyncio.run(burst(clients))
+        finally:
+            event.remove(engine, "before_cursor_execute", slow_user_lookup)
+            principal_module.PRINCIPAL_CACHE_ENABLED = True
+            app.dependency_overrides[get_db] = original
+
+        # イベントループをブロックしていればスループットは 1 クライアント時と変わらない
+        assert concurrent > single * clients / 2
+
+
+class TestPrincipalCache:
+    @staticmethod
+    def _count_user_selects():
+        from sqlalchemy import event
+        from tests.conftest import engine
+
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith("SELECT") and "FROM users" in statement:
+                statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", record)
+        return statements, lambda: event.remove(engine, "before_cursor_execute", record)
+
+    def test_cached_request_skips_user_query(self, client, auth_headers):
+        """2 回目以降の認証済みリクエストでは users テーブルを参照しない"""
+        from app.principal_cache import principal_cache
+
+        assert client.get("/api/auth/me", headers=auth_headers).status_code == 200
+        statements, stop = self._count_user_selects()
+        try:
+            response = client.get("/api/auth/me", headers=auth_headers)
+        finally:
+            stop()
+        assert response.status_code == 200
+        assert statements == []
+        assert principal_cache.get_stats()["user_hits"] >= 1
+
+    def test_profile_update_invalidates(self, client, auth_headers):
+        client.get("/api/auth/me", headers=auth_headers)
+        response = client.put("/api/auth/me", json={"nickname": "新しい名前"}, headers=auth_headers)
+        assert response.status_code == 200
+
+        me = client.get("/api/auth/me", headers=auth_headers).json()
+        assert me["nickname"] == "新しい名前"
+
+    def test_change_password_with_cached_user(self, client, test_user_data, auth_headers):
+        """キャッシュにない password_hash は必要になった時点で読み込まれる"""
+        client.get("/api/auth/me", headers=auth_headers)
+        response = client.put("/api/auth/password", json={
+            "old_password": test_user_data["password"],
+            "new_password": "newpassword456",
+        }, headers=auth_headers)
+        assert response.status_code == 200
+
+        login = client.post("/api/auth/login", data={
+            "username": test_user_data["email"],
+            "password": "newpassword456",
+        })
+        assert login.status_code == 200
+
+    def test_deleted_user_is_rejected(self, client, auth_headers, db_session):
+        from app import models
+        from app.principal_cache import principal_cache
+
+        me = client.get("/api/auth/me", headers=auth_headers).json()
+        db_session.query(models.User).filter(models.User.id == me["id"]).delete()
+        db_session.commit()
+        principal_cache.invalidate(me["email"])
+
+        assert client.get("/api/auth/me", headers=auth_headers).status_code == 401
@@ -62,6 +62,28 @@ class TestCreateItem:
         assert response.status_code in (400, 422)
 
 
+class TestItemSoldBadge:
+    def test_sold_transitions_update_progress(self, client, auth_headers, badges, db_session):
+        from app import models
+        from app.services.badge_queue import badge_queue
+        from app.services.badge_service import check_badges_for_user
+
+        ids = [client.post("/api/items/", json=SAMPLE_ITEM, headers=auth_headers).json()["id"] for _ in range(5)]
+        user_id = client.get("/api/auth/me", headers=auth_headers).json()["id"]
+        check_badges_for_user(user_id, db_session)
+        for item_id in ids:
+            client.put(f"/api/items/{item_id}", json={"status": "sold"}, headers=auth_headers)
+        # 売却済みに変えないステータス更新は数えない
+        client.put(f"/api/items/{ids[0]}", json={"status": "sold"}, headers=auth_headers)
+        client.put(f"/api/items/{ids[1]}", json={"status": "selling"}, headers=auth_headers)
+        badge_queue.flush()
+
+        progress = db_session.get(models.UserBadgeProgress, user_id)
+        db_session.refresh(progress)
+        assert progress.items_sold == 4
+        assert "top_seller" in progress.awarded.split(",")
+
+
 class TestItemDetail:
     def test_get_item_by_id(self, client, auth_headers):
         create_resp = client.post("/api/items/", json=SAMPLE_ITEM, headers=auth_headers)
@@ -74,3 +96,207 @@ class TestItemDetail:
     def test_get_nonexistent_item(self, client):
         response = client.get("/api/items/99999")
         assert response.status_code == 404
+
+
+class TestItemCursorPagination:
+    def test_cursor_walk_with_same_timestamp(self, client, auth_headers, db_session):
+        from datetime import datetime
+        from app import models
+
+        ids = [
+            client.post("/api/items/", json=SAMPLE_ITEM, headers=auth_headers).json()["id"]
+            for _ in range(5)
+        ]
+        # 一部を同一時刻にする（server_default とは書式の異なる値）
+        db_session.query(models.Item).filter(models.Item.id.in_(ids[1:4])).update(
+            {models.Item.created_at: datetime(2030, 1, 1, 12, 0, 0)}, synchronize_session=False
+        )
+        db_session.commit()
+
+        seen = []
+        cursor = None
+        for _ in range(10):
+            response = client.get("/api/items/?limit=2" + (f"&cursor={cursor}" if cursor else ""))
+            assert response.status_code == 200
+            seen.extend(i["id"] for i in response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        assert cursor is None
+        assert seen[:3] == sorted(ids[1:4], reverse=True)
+        assert sorted(seen) == sorted(ids)
+
+
+class TestItemTags:
+    def _item_counts(self, client):
+        return {t["name"]: t["item_count"] for t in client.get("/api/tags/", params={"kind": "item"}).json()}
+
+    def test_get_items_tag_filter(self, client, auth_headers):
+        tagged = SAMPLE_ITEM.copy()
+        tagged["tags"] = ["教科書", "情報"]
+        other = SAMPLE_ITEM.copy()
+        other["tags"] = ["家電"]
+        tagged_id = client.post("/api/items/", json=tagged, headers=auth_headers).json()["id"]
+        client.post("/api/items/", json=other, headers=auth_headers)
+
+        items = client.get("/api/items/", params={"tag": "教科書"}).json()
+        assert [i["id"] for i in items] == [tagged_id]
+        items = client.get("/api/items/", params={"tag": " 情報 "}).json()
+        assert [i["id"] for i in items] == [tagged_id]
+        assert client.get("/api/items/", params={"tag": "教科"}).json() == []
+
+    def test_item_count_follows_create_update_delete(self, client, auth_headers):
+        item = SAMPLE_ITEM.copy()
+        item["tags"] = ["教科書", "教科書"]
+        item_id = client.post("/api/items/", json=item, headers=auth_headers).json()["id"]
+        assert self._item_counts(client) == {"教科書": 1}
+
+        client.put(f"/api/items/{item_id}", json={"tags": ["家電"]}, headers=auth_headers)
+        assert self._item_counts(client) == {"家電": 1}
+
+        client.delete(f"/api/items/{item_id}", headers=auth_headers)
+        assert self._item_counts(client) == {}
+
+
+class TestItemCache:
+    def test_list_and_detail_follow_updates(self, client, auth_headers):
+        item_id = client.post("/api/items/", json=SAMPLE_ITEM, headers=auth_headers).json()["id"]
+        assert client.get(f"/api/items/{item_id}").json()["price"] == SAMPLE_ITEM["price"]
+        assert client.get("/api/items/").json()[0]["price"] == SAMPLE_ITEM["price"]
+
+        client.put(f"/api/items/{item_id}", json={"price": 800}, headers=auth_headers)
+        assert client.get(f"/api/items/{item_id}").json()["price"] == 800
+        assert client.get("/api/items/").json()[0]["price"] == 800
+
+        client.delete(f"/api/items/{item_id}", headers=auth_headers)
+        assert client.get(f"/api/items/{item_id}").status_code == 404
+        assert client.get("/api/items/").json() == []
+
+
+class TestItemConditionalGet:
+    def test_etag_and_last_modified(self, client, auth_headers):
+        item_id = client.post("/api/items/", json=SAMPLE_ITEM, headers=auth_headers).json()["id"]
+        first = client.get(f"/api/items/{item_id}")
+        etag = first.headers["ETag"]
+        assert etag.startswith('W/"')
+
+        cached = client.get(f"/api/items/{item_id}", headers={"If-None-Match": etag})
+        assert cached.status_code == 304
+        assert cached.content == b""
+        since = client.get(
+            f"/api/items/{item_id}", headers={"If-Modified-Since": first.headers["Last-Modified"]}
+        )
+        assert since.status_code == 304
+
+        listing = client.get("/api/items/")
+        assert client.get("/api/items/", headers={"If-None-Match": listing.headers["ETag"]}).status_code == 304
+
+        client.put(f"/api/items/{item_id}", json={"price": 800}, headers=auth_headers)
+        changed = client.get(f"/api/items/{item_id}", headers={"If-None-Match": etag})
+        assert changed.status_code == 200
+        assert changed.json()["price"] == 800
+        assert changed.headers["ETag"] != etag
+        assert client.get("/api/items/", headers={"If-None-Match": listing.headers["ETag"]}).status_code == 200
+
+
+class TestItemMessages:
+    def test_buyer_and_seller_conversation(self, client, auth_headers):
+        from tests.test_posts import other_user_headers
+
+        item_id = client.post("/api/items/", json=SAMPLE_ITEM, headers=auth_headers).json()["id"]
+        buyer = other_user_headers(client)
+        buyer_id = client.get("/api/auth/me", headers=buyer).json()["id"]
+
+        sent = client.post(f"/api/messages/items/{item_id}", json={"content": "まだありますか？"}, headers=buyer)
+        assert sent.status_code == 200
+        assert sent.json()["created_at"]
+        # 出品者は相手を指定しないと送れない
+        assert client.post(
+            f"/api/messages/items/{item_id}", json={"content": "はい"}, headers=auth_headers
+        ).status_code == 400
+        client.post(
+            f"/api/messages/items/{item_id}", json={"content": "あります", "receiver_id": buyer_id},
+            headers=auth_headers,
+        )
+
+        # 出品者は最後に連絡してきた買い手との会話を見る
+        thread = client.get(f"/api/messages/items/{item_id}", headers=auth_headers).json()
+        assert [m["content"] for m in thread] == ["まだありますか？", "あります"]
+        assert thread[0]["sender"]["id"] == buyer_id
+
+        conversations = client.get("/api/messages/items", headers=buyer).json()
+        assert len(conversations) == 1
+        assert conversations[0]["last_message"] == "あります"
+        assert conversations[0]["item"]["id"] == item_id
+
+        # メッセージ通知は非同期セッション側のルーターから読める
+        assert client.get("/api/notifications/unread/count", headers=auth_headers).json() == {"count": 1}
+        client.put("/api/notifications/read-all", headers=auth_headers)
+        assert client.get("/api/notifications/unread/count", headers=auth_headers).json() == {"count": 0}
+        assert client.put("/api/notifications/999/read", headers=auth_headers).status_code == 404
+
+
+class TestReadReplicas:
+    @pytest.fixture
+    def replica(self, client):
+        """スキーマだけの別 DB をレプリカとして登録する（プライマリの書き込みは反映されない）"""
+        import os
+        from sqlalchemy import create_engine
+        from app.database import Base
+        from app.replicas import replica_router
+
+        path = "./test_replica.db"
+        url = f"sqlite:///{path}"
+        replica_engine = create_engine(url)
+        Base.metadata.create_all(bind=replica_engine)
+        replica_engine.dispose()
+        replica_router.configure([url])
+        replica_router.check_lag()
+        try:
+            yield replica_router
+        finally:
+            replica_router.reset()
+            os.remove(path)
+
+    def test_reads_go_to_replica_except_right_after_own_write(self, client, auth_headers, replica):
+        from app.cache import response_cache
+
+        assert client.post("/api/items/", json=SAMPLE_ITEM, headers=auth_headers).status_code == 201
+
+        # 書き込んだ本人はしばらくプライマリから読む（キャッシュも使わない）
+        mine = client.get("/api/items/", headers=auth_headers)
+        assert len(mine.json()) == 1
+        # 他の閲覧者はレプリカ（まだ空）から読む
+        response_cache.local.clear()
+        assert client.get("/api/items/").json() == []
+
+        stats = client.get("/health/replicas").json()
+        assert stats["pinned_reads"] == 1
+        assert stats["replica_reads"] == 1
+        assert stats["replicas"][0]["available"] is True
+
+        # 書き込みマーカーが切れたらレプリカに戻る
+        replica._recent_writers.clear()
+        response_cache.local.clear()
+        assert client.get("/api/items/", headers=auth_headers).json() == []
+
+    def test_async_reads_follow_the_same_routing(self, client, auth_headers, replica):
+        from tests.test_posts import other_user_headers
+
+        other = other_user_headers(client)
+        me = client.get("/api/auth/me", headers=auth_headers).json()
+        assert client.post(f"/api/users/{me['id']}/follow", headers=other).status_code in (200, 201)
+
+        assert len(client.get(f"/api/users/{me['id']}/followers", headers=other).json()) == 1
+        # 匿名の閲覧者はレプリカから読む（ユーザー自体がまだ複製されていない）
+        assert client.get(f"/api/users/{me['id']}/followers").status_code == 404
+
+    def test_lagging_replica_falls_back_to_primary(self, client, auth_headers, replica):
+        from app.cache import response_cache
+
+        client.post("/api/items/", json=SAMPLE_ITEM, headers=auth_headers)
+        replica.replicas[0].lag = 60.0
+        response_cache.local.clear()
+
+        assert len(client.get("/api/items/").json()) == 1
+        assert client.get("/health/replicas").json()["lag_fallbacks"] == 1
@@ -113,3 +113,1277 @@ class TestDeletePost:
         # 別ユーザーが削除を試みる
         delete_resp = client.delete(f"/api/posts/{post_id}", headers=other_headers)
         assert delete_resp.status_code == 403
+
+
+class TestFeedQueries:
+    def _count_queries(self, client, url, headers):
+        from sqlalchemy import event
+        from tests.conftest import engine
+
+        statements = []
+
+        def before_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", before_execute)
+        try:
+            response = client.get(url, headers=headers)
+        finally:
+            event.remove(engine, "before_cursor_execute", before_execute)
+        assert response.status_code == 200
+        return len(statements), response.json()
+
+    def test_feed_query_count_independent_of_page_size(self, client, auth_headers):
+        for i in range(2):
+            p = SAMPLE_POST.copy()
+            p["title"] = f"投稿 {i}"
+            post_id = client.post("/api/posts/", json=p, headers=auth_headers).json()["id"]
+            client.post(f"/api/posts/{post_id}/like", headers=auth_headers)
+            client.post("/api/comments/", json={"post_id": post_id, "content": "コメント"}, headers=auth_headers)
+        small, _ = self._count_queries(client, "/api/posts/", auth_headers)
+
+        for i in range(2, 8):
+            p = SAMPLE_POST.copy()
+            p["title"] = f"投稿 {i}"
+            post_id = client.post("/api/posts/", json=p, headers=auth_headers).json()["id"]
+            client.post(f"/api/posts/{post_id}/like", headers=auth_headers)
+            client.post("/api/comments/", json={"post_id": post_id, "content": "コメント"}, headers=auth_headers)
+        large, posts = self._count_queries(client, "/api/posts/", auth_headers)
+
+        assert len(posts) == 8
+        assert large == small
+        assert all(p["likes"] == 1 and p["liked_by_me"] for p in posts)
+        assert all(len(p["comments"]) == 1 for p in posts)
+
+
+class TestPostCounters:
+    def test_like_unlike_updates_counter(self, client, auth_headers):
+        post_id = client.post("/api/posts/", json=SAMPLE_POST, headers=auth_headers).json()["id"]
+
+        like_resp = client.post(f"/api/posts/{post_id}/like", headers=auth_headers)
+        assert like_resp.json()["likes"] == 1
+        unlike_resp = client.delete(f"/api/posts/{post_id}/like", headers=auth_headers)
+        assert unlike_resp.json()["likes"] == 0
+
+    def test_comment_and_favorite_counters(self, client, auth_headers):
+        post_id = client.post("/api/posts/", json=SAMPLE_POST, headers=auth_headers).json()["id"]
+        comment_id = client.post(
+            "/api/comments/", json={"post_id": post_id, "content": "コメント"}, headers=auth_headers
+        ).json()["id"]
+        client.post(f"/api/favorites/posts/{post_id}", headers=auth_headers)
+
+        data = client.get(f"/api/posts/{post_id}").json()
+        assert data["comment_count"] == 1
+        assert data["favorite_count"] == 1
+
+        client.delete(f"/api/comments/{comment_id}", headers=auth_headers)
+        client.delete(f"/api/favorites/posts/{post_id}", headers=auth_headers)
+        data = client.get(f"/api/posts/{post_id}").json()
+        assert data["comment_count"] == 0
+        assert data["favorite_count"] == 0
+
+    def test_reconcile_repairs_drift(self, client, auth_headers, db_session):
+        from app import models
+        from app.services.counter_service import reconcile_post_counters
+
+        post_id = client.post("/api/posts/", json=SAMPLE_POST, headers=auth_headers).json()["id"]
+        client.post(f"/api/posts/{post_id}/like", headers=auth_headers)
+
+        db_session.query(models.Post).filter(models.Post.id == post_id).update({"like_count": 42})
+        db_session.commit()
+
+        assert reconcile_post_counters(db_session) == 1
+        assert client.get(f"/api/posts/{post_id}").json()["likes"] == 1
+        assert reconcile_post_counters(db_session) == 0
+
+
+def walk_cursor(client, url, headers=None, max_pages=50):
+    """X-Next-Cursor をたどって全ページの id を集める（無限ループ防止に上限あり）"""
+    seen = []
+    cursor = None
+    for _ in range(max_pages):
+        sep = "&" if "?" in url else "?"
+        response = client.get(url + (f"{sep}cursor={cursor}" if cursor else ""), headers=headers)
+        assert response.status_code == 200
+        seen.extend(row["id"] for row in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return seen
+    raise AssertionError("cursor pagination did not terminate")
+
+
+def other_user_headers(client, email="other@example.com"):
+    client.post("/api/auth/register", json={
+        "email": email,
+        "password": "OtherPass123!",
+        "nickname": "別ユーザー",
+    })
+    login = client.post("/api/auth/login", data={"username": email, "password": "OtherPass123!"})
+    return {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+
+def pin_created_at(db_session, model, ids):
+    """同一時刻の行を作る（server_default の値とは書式の異なる Python 側の値で上書き）"""
+    from datetime import datetime
+
+    db_session.query(model).filter(model.id.in_(ids)).update(
+        {model.created_at: datetime(2030, 1, 1, 12, 0, 0)}, synchronize_session=False
+    )
+    db_session.commit()
+
+
+class TestCursorPagination:
+    def _seed_posts(self, db_session, count):
+        from datetime import datetime, timedelta
+        from app import models
+
+        author = db_session.query(models.User).first()
+        base = datetime(2024, 1, 1, 12, 0, 0)
+        for i in range(count):
+            db_session.add(models.Post(
+                title=f"投稿 {i}",
+                content="内容",
+                source_language="ja",
+                category="life",
+                author_id=author.id,
+                # 2 件ずつ同じ時刻にして id による順序付けを確認する
+                created_at=base + timedelta(minutes=i // 2),
+            ))
+        db_session.commit()
+
+    def test_cursor_walks_all_posts_without_duplicates(self, client, auth_headers, db_session):
+        self._seed_posts(db_session, 7)
+
+        seen = walk_cursor(client, "/api/posts/?limit=3")
+        assert len(seen) == 7
+        assert len(set(seen)) == 7
+
+    def test_cursor_walk_api_rows_with_same_timestamp(self, client, auth_headers, db_session):
+        from app import models
+
+        ids = [
+            client.post("/api/posts/", json=SAMPLE_POST, headers=auth_headers).json()["id"]
+            for _ in range(5)
+        ]
+        pin_created_at(db_session, models.Post, ids[:3])
+
+        seen = walk_cursor(client, "/api/posts/?limit=2")
+        assert sorted(seen) == sorted(ids)
+        assert seen[:3] == sorted(ids[:3], reverse=True)
+
+    def test_notifications_cursor_walk(self, client, auth_headers, db_session):
+        from app import models
+
+        other = other_user_headers(client)
+        # 同じ投稿へのコメント通知は 1 件にまとめられるので、投稿ごとに 1 件
+        for i in range(5):
+            post_id = client.post("/api/posts/", json=SAMPLE_POST, headers=auth_headers).json()["id"]
+            client.post("/api/comments/", json={"post_id": post_id, "content": f"コメント {i}"}, headers=other)
+        ids = [n.id for n in db_session.query(models.Notification).all()]
+        assert len(ids) == 5
+        pin_created_at(db_session, models.Notification, ids[1:4])
+
+        seen = walk_cursor(client, "/api/notifications/?limit=2", headers=auth_headers)
+        assert sorted(seen) == sorted(ids)
+
+    def test_favorites_cursor_walk(self, client, auth_headers, db_session):
+        from app import models
+
+        post_ids = [
+            client.post("/api/posts/", json=SAMPLE_POST, headers=auth_headers).json()["id"]
+            for _ in range(5)
+        ]
+        for post_id in post_ids:
+            client.post(f"/api/favorites/posts/{post_id}", headers=auth_headers)
+        favorite_ids = [f.id for f in db_session.query(models.Favorite).all()]
+        pin_created_at(db_session, models.Favorite, favorite_ids[:2])
+
+        seen = walk_cursor(client, "/api/favorites/me?limit=2", headers=auth_headers)
+        assert sorted(seen) == sorted(post_ids)
+
+    def test_invalid_cursor(self, client):
+        response = client.get("/api/posts/?cursor=not-a-cursor")
+        assert response.status_code == 400
+
+
+class TestSearch:
+    def _create(self, client, auth_headers, title, content, lang="ja"):
+        p = SAMPLE_POST.copy()
+        p.update({"title": title, "content": content, "source_language": lang})
+        return client.post("/api/posts/", json=p, headers=auth_headers).json()["id"]
+
+    def test_search_cjk_and_english(self, client, auth_headers):
+        ja_id = self._create(client, auth_headers, "東京大学の授業", "今日はPythonを勉強しました")
+        en_id = self._create(client, auth_headers, "Rainy day", "Stayed home and studied", "en")
+
+        response = client.get("/api/posts/search", params={"q": "東京大学"})
+        assert response.status_code == 200
+        hits = response.json()
+        assert [h["post"]["id"] for h in hits] == [ja_id]
+        assert "<mark>東京大学</mark>" in hits[0]["title_snippet"]
+
+        hits = client.get("/api/posts/search", params={"q": "python"}).json()
+        assert [h["post"]["id"] for h in hits] == [ja_id]
+
+        # 部分文字列では一致しない（"AI" が "rainy" に当たらない）
+        assert client.get("/api/posts/search", params={"q": "ai"}).json() == []
+        hits = client.get("/api/posts/search", params={"q": "rainy"}).json()
+        assert [h["post"]["id"] for h in hits] == [en_id]
+
+    def test_single_cjk_character_query(self, client, auth_headers):
+        cat_id = self._create(client, auth_headers, "黒猫の写真", "近所で見かけた")
+        self._create(client, auth_headers, "犬の散歩", "毎朝の日課")
+
+        hits = client.get("/api/posts/search", params={"q": "猫"}).json()
+        assert [h["post"]["id"] for h in hits] == [cat_id]
+        assert "<mark>猫</mark>" in hits[0]["title_snippet"]
+        # 複数文字のクエリは従来どおり bigram で一致する
+        hits = client.get("/api/posts/search", params={"q": "黒猫"}).json()
+        assert [h["post"]["id"] for h in hits] == [cat_id]
+
+    def test_feed_q_uses_search_index(self, client, auth_headers):
+        post_id = self._create(client, auth_headers, "就活の話", "面接の準備について")
+        self._create(client, auth_headers, "別の投稿", "関係ない内容")
+
+        posts = client.get("/api/posts/", params={"q": "面接"}).json()
+        assert [p["id"] for p in posts] == [post_id]
+
+
+class TestTags:
+    def test_tag_filter_is_exact(self, client, auth_headers):
+        ai_post = SAMPLE_POST.copy()
+        ai_post.update({"title": "AI の話", "tags": ["AI"]})
+        rain_post = SAMPLE_POST.copy()
+        rain_post.update({"title": "雨の日", "tags": ["RAIN"]})
+        ai_id = client.post("/api/posts/", json=ai_post, headers=auth_headers).json()["id"]
+        client.post("/api/posts/", json=rain_post, headers=auth_headers)
+
+        posts = client.get("/api/posts/", params={"tag": "AI"}).json()
+        assert [p["id"] for p in posts] == [ai_id]
+        # フィルタ入力も書き込み時と同じ規則で正規化される
+        posts = client.get("/api/posts/", params={"tag": "  AI "}).json()
+        assert [p["id"] for p in posts] == [ai_id]
+
+    def test_recount_repairs_drift(self, client, auth_headers, db_session):
+        from app import models
+        from app.services.tag_service import recount_tags
+
+        p = SAMPLE_POST.copy()
+        p["tags"] = ["勉強"]
+        client.post("/api/posts/", json=p, headers=auth_headers)
+        db_session.query(models.Tag).update({"post_count": 7, "item_count": 3})
+        db_session.commit()
+
+        assert recount_tags(db_session) == 1
+        tag = db_session.query(models.Tag).one()
+        db_session.refresh(tag)
+        assert (tag.post_count, tag.item_count) == (1, 0)
+        assert recount_tags(db_session) == 0
+
+    def test_tag_counts_follow_updates(self, client, auth_headers):
+        p = SAMPLE_POST.copy()
+        p["tags"] = ["勉強", "勉強", " テスト "]
+        post_id = client.post("/api/posts/", json=p, headers=auth_headers).json()["id"]
+
+        tags = {t["name"]: t["post_count"] for t in client.get("/api/tags/").json()}
+        assert tags == {"勉強": 1, "テスト": 1}
+
+        p["tags"] = ["勉強", "就活"]
+        client.put(f"/api/posts/{post_id}", json=p, headers=auth_headers)
+        tags = {t["name"]: t["post_count"] for t in client.get("/api/tags/").json()}
+        assert tags == {"勉強": 1, "就活": 1}
+
+        client.delete(f"/api/posts/{post_id}", headers=auth_headers)
+        assert client.get("/api/tags/").json() == []
+
+
+class TestResponseCache:
+    def test_anonymous_feed_is_cached_and_invalidated(self, client, auth_headers):
+        from app.cache import response_cache
+
+        post_id = client.post("/api/posts/", json=SAMPLE_POST, headers=auth_headers).json()["id"]
+
+        before = response_cache.get_stats()
+        assert client.get("/api/posts/").json()[0]["likes"] == 0
+        assert client.get("/api/posts/").json()[0]["likes"] == 0
+        after = response_cache.get_stats()
+        assert after["misses"] - before["misses"] == 1
+        assert after["local_hits"] - before["local_hits"] == 1
+
+        client.post(f"/api/posts/{post_id}/like", headers=auth_headers)
+        assert client.get("/api/posts/").json()[0]["likes"] == 1
+        assert client.get(f"/api/posts/{post_id}").json()["likes"] == 1
+
+    def test_detail_invalidation_is_per_post(self, client, auth_headers):
+        from app.cache import response_cache
+
+        first = client.post("/api/posts/", json=SAMPLE_POST, headers=auth_headers).json()["id"]
+        second = client.post("/api/posts/", json=SAMPLE_POST, headers=auth_headers).json()["id"]
+        client.get(f"/api/posts/{first}")
+        client.get(f"/api/posts/{second}")
+
+        client.post(f"/api/posts/{first}/like", headers=auth_headers)
+        before = response_cache.get_stats()
+        assert client.get(f"/api/posts/{first}").json()["likes"] == 1
+        assert client.get(f"/api/posts/{second}").json()["likes"] == 0
+        after = response_cache.get_stats()
+        # いいねされた投稿だけ再読込、もう一方はキャッシュのまま（詳細と ETag 用バリデータの 2 エントリ）
+        assert after["misses"] - before["misses"] == 2
+        assert after["local_hits"] - before["local_hits"] == 2
+
+    def test_profile_update_refreshes_embedded_author(self, client, auth_headers):
+        post_id = client.post("/api/posts/", json=SAMPLE_POST, headers=auth_headers).json()["id"]
+        client.get(f"/api/posts/{post_id}")
+        client.get("/api/posts/")
+
+        client.put("/api/auth/me", json={"nickname": "新しい名前"}, headers=auth_headers)
+        assert client.get(f"/api/posts/{post_id}").json()["author"]["nickname"] == "新しい名前"
+        assert client.get("/api/posts/").json()[0]["author"]["nickname"] == "新しい名前"
+
+
+class TestComments:
+    def test_feed_embeds_latest_comments_only(self, client, auth_headers):
+        post_id = client.post("/api/posts/", json=SAMPLE_POST, headers=auth_headers).json()["id"]
+        comment_ids = [
+            client.post("/api/comments/", json={"post_id": post_id, "content": f"コメント {i}"},
+                        headers=auth_headers).json()["id"]
+            for i in range(5)
+        ]
+
+        post = client.get("/api/posts/").json()[0]
+        assert post["comment_count"] == 5
+        assert [c["id"] for c in post["comments"]] == comment_ids[-3:]
+
+    def test_comment_pages(self, client, auth_headers, db_session):
+        from datetime import datetime, timedelta
+        from app import models
+
+        post_id = client.post("/api/posts/", json=SAMPLE_POST, headers=auth_headers).json()["id"]
+        author = db_session.query(models.User).first()
+        base = datetime(2024, 1, 1, 12, 0, 0)
+        comments = [
+            models.Comment(post_id=post_id, author_id=author.id, content=f"コメント {i}",
+                           created_at=base + timedelta(minutes=i // 2))
+            for i in range(5)
+        ]
+        db_session.add_all(comments)
+        db_session.commit()
+        comment_ids = [c.id for c in comments]
+
+        seen = []
+        cursor = None
+        while True:
+            params = {"limit": 2}
+            if cursor:
+                params["cursor"] = cursor
+            response = client.get(f"/api/posts/{post_id}/comments", params=params)
+            assert response.status_code == 200
+            seen.extend(c["id"] for c in response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+
+        assert seen == list(reversed(comment_ids))
+        assert client.get("/api/posts/9999/comments").status_code == 404
+
+
+class TestCommentThreads:
+    def _comment(self, client, headers, post_id, content, parent_id=None):
+        body = {"post_id": post_id, "content": content, "parent_id": parent_id}
+        response = client.post("/api/comments/", json=body, headers=headers)
+        assert response.status_code == 201
+        return response.json()["id"]
+
+    def _thread(self, client, auth_headers):
+        """a ─ b ─ c、a ─ d、および別スレッド e を作る"""
+        post_id = client.post("/api/posts/", json=SAMPLE_POST, headers=auth_headers).json()["id"]
+        a = self._comment(client, auth_headers, post_id, "a")
+        b = self._comment(client, auth_headers, post_id, "b", a)
+        c = self._comment(client, auth_headers, post_id, "c", b)
+        d = self._comment(client, auth_headers, post_id, "d", a)
+        e = self._comment(client, auth_headers, post_id, "e")
+        return post_id, a, b, c, d, e
+
+    def test_threads_with_reply_preview_and_load_more(self, client, auth_headers):
+        post_id, a, b, c, d, e = self._thread(client, auth_headers)
+
+        threads = client.get(f"/api/posts/{post_id}/threads", params={"replies": 2}).json()
+        assert [t["id"] for t in threads] == [e, a]
+        thread = threads[1]
+        # 先行順（親の直後に子）、depth はネストの深さ
+        assert [(r["id"], r["depth"]) for r in thread["replies"]] == [(b, 1), (c, 2)]
+        assert thread["reply_count"] == 3
+        assert threads[0]["reply_count"] == 0 and threads[0]["replies_cursor"] is None
+
+        more = client.get(f"/api/comments/{a}/replies", params={"cursor": thread["replies_cursor"]})
+        assert [r["id"] for r in more.json()] == [d]
+
+        subtree = client.get(f"/api/comments/{b}/replies").json()
+        assert [r["id"] for r in subtree] == [c]
+
+    def test_reply_to_comment_of_other_post_is_rejected(self, client, auth_headers):
+        post_id, a, *_ = self._thread(client, auth_headers)
+        other_post = client.post("/api/posts/", json=SAMPLE_POST, headers=auth_headers).json()["id"]
+        response = client.post("/api/comments/", json={
+            "post_id": other_post, "content": "x", "parent_id": a
+        }, headers=auth_headers)
+        assert response.status_code == 400
+
+    def test_delete_promotes_replies(self, client, auth_headers):
+        post_id, a, b, c, d, e = self._thread(client, auth_headers)
+
+        client.delete(f"/api/comments/{a}", headers=auth_headers)
+        threads = client.get(f"/api/posts/{post_id}/threads").json()
+        by_id = {t["id"]: t for t in threads}
+        assert set(by_id) == {b, d, e}
+        assert [(r["id"], r["depth"], r["parent_id"]) for r in by_id[b]["replies"]] == [(c, 1, b)]
+        assert client.get(f"/api/posts/{post_id}").json()["comment_count"] == 4
+
+    def test_cascade_delete_removes_subtree(self, client, auth_headers):
+        post_id, a, b, c, d, e = self._thread(client, auth_headers)
+
+        response = client.delete(f"/api/comments/{a}", params={"cascade": True}, headers=auth_headers)
+        assert response.status_code == 204
+        threads = client.get(f"/api/posts/{post_id}/threads").json()
+        assert [t["id"] for t in threads] == [e]
+        assert client.get(f"/api/posts/{post_id}").json()["comment_count"] == 1
+
+    def test_backfill_paths_for_legacy_comments(self, client, auth_headers, db_session):
+        from app import models
+        from app.services.comment_service import backfill_comment_paths
+
+        post_id, a, b, c, d, e = self._thread(client, auth_headers)
+        db_session.query(models.Comment).update({"path": None, "depth": 0, "root_id": None})
+        db_session.commit()
+
+        assert backfill_comment_paths(db_session, batch_size=2) == 5
+        rows = {cm.id: cm for cm in db_session.query(models.Comment).all()}
+        for cm in rows.values():
+            db_session.refresh(cm)
+        assert rows[c].path == f"{a:010d}/{b:010d}/{c:010d}/"
+        assert (rows[c].depth, rows[c].root_id) == (2, a)
+        assert backfill_comment_paths(db_session) == 0
+
+
+class TestHomeTimeline:
+    def _setup(self, client, auth_headers):
+        """auth_headers のユーザーが other をフォローする"""
+        other = other_user_headers(client)
+        other_id = client.get("/api/auth/me", headers=other).json()["id"]
+        client.post(f"/api/users/{other_id}/follow", headers=auth_headers)
+        return other, other_id
+
+    def _post(self, client, headers, **overrides):
+        body = SAMPLE_POST.copy()
+        body.update(overrides)
+        return client.post("/api/posts/", json=body, headers=headers).json()["id"]
+
+    def _timeline(self, client, headers, **params):
+        response = client.get("/api/posts/timeline", params=params, headers=headers)
+        assert response.status_code == 200
+        return [p["id"] for p in response.json()]
+
+    def test_followed_and_own_posts(self, client, auth_headers, db_session):
+        from app import models
+
+        other, other_id = self._setup(client, auth_headers)
+        mine = self._post(client, auth_headers)
+        theirs = self._post(client, other)
+        self._post(client, other, is_anonymous=True)
+        # フォローしていないユーザーの投稿は出ない
+        self._post(client, other_user_headers(client, "third@example.com"))
+
+        assert self._timeline(client, auth_headers) == [theirs, mine]
+        # 通常の作者は書き込み時に配信される
+        assert db_session.query(models.TimelineEntry).filter_by(post_id=theirs).count() == 1
+
+        client.delete(f"/api/users/{other_id}/follow", headers=auth_headers)
+        assert self._timeline(client, auth_headers) == [mine]
+
+    def test_follow_backfills_recent_posts(self, client, auth_headers):
+        other = other_user_headers(client)
+        other_id = client.get("/api/auth/me", headers=other).json()["id"]
+        earlier = self._post(client, other)
+
+        client.post(f"/api/users/{other_id}/follow", headers=auth_headers)
+        assert self._timeline(client, auth_headers) == [earlier]
+
+    def test_high_follower_author_is_pulled_on_read(self, client, auth_headers, db_session, monkeypatch):
+        from app import models
+        from app.services import timeline_service
+
+        other, _ = self._setup(client, auth_headers)
+        monkeypatch.setattr(timeline_service, "TIMELINE_FANOUT_THRESHOLD", 0)
+        post_id = self._post(client, other)
+
+        assert db_session.query(models.TimelineEntry).filter_by(post_id=post_id).count() == 0
+        assert self._timeline(client, auth_headers) == [post_id]
+
+    def test_cursor_walk_and_rebuild(self, client, auth_headers, db_session):
+        from app import models
+        from app.services.timeline_service import rebuild_timeline
+
+        other, _ = self._setup(client, auth_headers)
+        ids = [self._post(client, other if i % 2 else auth_headers) for i in range(5)]
+
+        seen = walk_cursor(client, "/api/posts/timeline?limit=2", headers=auth_headers)
+        assert seen == list(reversed(ids))
+
+        me = db_session.query(models.User).filter_by(email="testuser@example.com").one()
+        db_session.query(models.TimelineEntry).delete()
+        db_session.commit()
+        rebuild_timeline(db_session, me.id)
+        assert self._timeline(client, auth_headers) == list(reversed(ids))
+
+
+class TestHotRanking:
+    def _post(self, client, headers, **overrides):
+        body = SAMPLE_POST.copy()
+        body.update(overrides)
+        return client.post("/api/posts/", json=body, headers=headers).json()["id"]
+
+    def _set_counts(self, db_session, post_id, likes=0, comments=0, favorites=0):
+        from app import models
+
+        db_session.query(models.Post).filter_by(id=post_id).update({
+            "like_count": likes, "comment_count": comments, "favorite_count": favorites,
+        })
+        db_session.commit()
+
+    def test_hot_sort_uses_engagement_and_age(self, client, auth_headers, db_session):
+        from datetime import datetime, timedelta, timezone
+        from app import models
+        from app.services.ranking_service import compute_hot_scores
+
+        quiet, popular, busy = (self._post(client, auth_headers) for _ in range(3))
+        self._set_counts(db_session, popular, likes=10)
+        self._set_counts(db_session, busy, comments=3, favorites=2)
+        # 同じ反応数でも古い投稿は下がる
+        old = self._post(client, auth_headers)
+        self._set_counts(db_session, old, likes=10)
+        db_session.query(models.Post).filter_by(id=old).update({
+            "created_at": datetime.now(timezone.utc) - timedelta(days=2)
+        })
+        db_session.commit()
+
+        assert compute_hot_scores(db_session) == 4
+        response = client.get("/api/posts/?sort=hot")
+        assert response.status_code == 200
+        # 2 日前の投稿は反応が多くても新しい投稿より下になる
+        assert [p["id"] for p in response.json()] == [busy, popular, quiet, old]
+        # 既定は新着順のまま
+        assert [p["id"] for p in client.get("/api/posts/").json()][-1] == old
+
+    def test_window_and_category_leaderboards(self, client, auth_headers, db_session):
+        from datetime import datetime, timedelta, timezone
+        from app import models
+        from app.services.ranking_service import compute_hot_scores
+
+        life = [self._post(client, auth_headers) for _ in range(3)]
+        study = [self._post(client, auth_headers, category="study") for _ in range(2)]
+        for likes, post_id in enumerate(life + study):
+            self._set_counts(db_session, post_id, likes=likes)
+        expired = self._post(client, auth_headers)
+        db_session.query(models.Post).filter_by(id=expired).update({
+            "created_at": datetime.now(timezone.utc) - timedelta(days=30)
+        })
+        db_session.commit()
+        compute_hot_scores(db_session)
+
+        hot = client.get("/api/posts/?sort=hot&category=study").json()
+        assert [p["id"] for p in hot] == list(reversed(study))
+
+        boards = client.get("/api/posts/leaderboards?per_category=2").json()
+        assert set(boards) == {"life", "study"}
+        assert [p["id"] for p in boards["life"]] == [life[2], life[1]]
+        assert expired not in [p["id"] for p in client.get("/api/posts/?sort=hot").json()]
+
+    def test_hot_cursor_walk(self, client, auth_headers, db_session):
+        from app.services.ranking_service import compute_hot_scores
+
+        ids = [self._post(client, auth_headers) for _ in range(5)]
+        for likes, post_id in enumerate(ids):
+            self._set_counts(db_session, post_id, likes=likes)
+        compute_hot_scores(db_session)
+
+        assert walk_cursor(client, "/api/posts/?sort=hot&limit=2") == list(reversed(ids))
+
+    def test_in_process_scheduler_runs_jobs(self):
+        import threading
+        from app.scheduler import IntervalScheduler
+
+        ran = threading.Event()
+        scheduler = IntervalScheduler()
+        scheduler.add_job("probe", 60, ran.set)
+        scheduler.start()
+        try:
+            assert ran.wait(5)
+        finally:
+            scheduler.stop()
+        assert scheduler.get_stats()["probe"]["runs"] == 1
+
+
+class TestConditionalGet:
+    def test_post_detail_304_until_changed(self, client, auth_headers, db_session):
+        from app import models
+
+        post_id = client.post("/api/posts/", json=SAMPLE_POST, headers=auth_headers).json()["id"]
+        etag = client.get(f"/api/posts/{post_id}").headers["ETag"]
+        assert client.get(f"/api/posts/{post_id}", headers={"If-None-Match": etag}).status_code == 304
+        # 弱比較・複数指定
+        assert client.get(
+            f"/api/posts/{post_id}", headers={"If-None-Match": f'"other", {etag[2:]}'}
+        ).status_code == 304
+
+        version = db_session.query(models.Post.version).filter_by(id=post_id).scalar()
+        client.post(f"/api/posts/{post_id}/like", headers=auth_headers)
+        db_session.expire_all()
+        # カウンタの一括 UPDATE でも行バージョンが上がる
+        assert db_session.query(models.Post.version).filter_by(id=post_id).scalar() == version + 1
+        response = client.get(f"/api/posts/{post_id}", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.json()["likes"] == 1
+
+    def test_etag_depends_on_viewer_and_author(self, client, auth_headers):
+        post_id = client.post("/api/posts/", json=SAMPLE_POST, headers=auth_headers).json()["id"]
+        anonymous = client.get(f"/api/posts/{post_id}").headers["ETag"]
+        mine = client.get(f"/api/posts/{post_id}", headers=auth_headers)
+        assert mine.headers["ETag"] != anonymous
+        assert "Authorization" in mine.headers["Vary"]
+
+        feed_etag = client.get("/api/posts/").headers["ETag"]
+        client.put("/api/auth/me", json={"nickname": "改名"}, headers=auth_headers)
+        assert client.get(f"/api/posts/{post_id}", headers={"If-None-Match": anonymous}).status_code == 200
+        assert client.get("/api/posts/", headers={"If-None-Match": feed_etag}).status_code == 200
+
+    def test_user_stats_follow_changes_etag(self, client, auth_headers):
+        other = other_user_headers(client)
+        other_id = client.get("/api/auth/me", headers=other).json()["id"]
+        url = f"/api/users/{other_id}/stats"
+        etag = client.get(url, headers=auth_headers).headers["ETag"]
+        assert client.get(url, headers={**auth_headers, "If-None-Match": etag}).status_code == 304
+
+        client.post(f"/api/users/{other_id}/follow", headers=auth_headers)
+        response = client.get(url, headers={**auth_headers, "If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.json()["followed_by_me"] is True
+        assert response.json()["follower_count"] == 1
+
+
+class TestFollowLists:
+    def test_followers_and_following(self, client, auth_headers):
+        me = client.get("/api/auth/me", headers=auth_headers).json()["id"]
+        others = []
+        for email in ("a@example.com", "b@example.com"):
+            headers = other_user_headers(client, email)
+            others.append(client.get("/api/auth/me", headers=headers).json()["id"])
+            client.post(f"/api/users/{me}/follow", headers=headers)
+
+        assert [u["id"] for u in client.get(f"/api/users/{me}/followers").json()] == others
+        assert client.get(f"/api/users/{others[0]}/following").json()[0]["id"] == me
+        assert client.get(f"/api/users/{me}/followers?skip=1").json()[0]["id"] == others[1]
+        assert client.get("/api/users/999/followers").status_code == 404
+
+        client.post(f"/api/users/{others[1]}/follow", headers=auth_headers)
+        assert client.get("/api/users/me/following", headers=auth_headers).json() == [others[1]]
+
+
+class TestConnectionPool:
+    def test_pool_exhaustion_returns_503(self, client):
+        """プールが埋まっていれば待ち続けずに 503 を返し、待ち時間とタイムアウトが記録される"""
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from app.main import app
+        from app.database import get_db, MeteredQueuePool, pool_stats
+
+        tiny = create_engine(
+            "sqlite:///./test.db", poolclass=MeteredQueuePool,
+            pool_size=1, max_overflow=0, pool_timeout=0.1,
+            connect_args={"check_same_thread": False},
+        )
+        TinySession = sessionmaker(bind=tiny, autoflush=False)
+
+        def tiny_db():
+            db = TinySession()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        original = app.dependency_overrides[get_db]
+        app.dependency_overrides[get_db] = tiny_db
+        try:
+            held = tiny.connect()
+            response = client.get("/api/posts/")
+            assert response.status_code == 503
+            assert response.headers["Retry-After"] == "1"
+            stats = pool_stats(tiny)
+            assert stats["timeouts"] == 1
+            assert stats["checked_out"] == 1
+            assert stats["wait_max_seconds"] >= 0.1
+
+            held.close()
+            assert client.get("/api/posts/").status_code == 200
+        finally:
+            app.dependency_overrides[get_db] = original
+            tiny.dispose()
+
+    def test_pool_stats_endpoint(self, client):
+        response = client.get("/health/db")
+        assert response.status_code == 200
+        assert set(response.json()) == {"sync", "async"}
+
+
+@pytest.fixture
+def libretranslate(monkeypatch, client):
+    """ローカルの LibreTranslate 代替サーバー（訳文は "[target] 原文"）に向けたクライアントを差し込む"""
+    from benchmarks.libretranslate_stub import StubServer
+    from app import translator
+    from app.services.translation_client import LibreTranslateClient
+    from tests.conftest import TestingSessionLocal
+
+    with StubServer() as stub:
+        lt_client = LibreTranslateClient(stub.url, timeout=2, backoff=0.01)
+        monkeypatch.setattr(translator, "translation_client", lt_client)
+        monkeypatch.setattr(translator, "SessionLocal", TestingSessionLocal)
+        stub.client = lt_client
+        yield stub
+        lt_client.close()
+
+
+def translated_texts(stub):
+    return [(req["target"], text) for req in stub.requests for text in req["q"]]
+
+
+class TestTranslationMemory:
+    def test_same_text_is_translated_once_and_survives_deletion(self, client, auth_headers, libretranslate):
+        from app.translator import translate_post
+        from app.services.translation_memory import translation_memory
+
+        first = client.post("/api/posts/", json=SAMPLE_POST, headers=auth_headers).json()
+        translate_post(first["id"])
+        assert sorted(target for target, _ in translated_texts(libretranslate)) == ["en", "zh-Hans"]
+
+        # 同じ本文の別投稿はメモリから翻訳される
+        second = client.post("/api/posts/", json=SAMPLE_POST, headers=auth_headers).json()
+        assert "2 from translation memory" in translate_post(second["id"])
+        assert len(translated_texts(libretranslate)) == 2
+
+        # 元の投稿を削除してもメモリは残る（プロセス内キャッシュも消して DB から読む）
+        assert client.delete(f"/api/posts/{first['id']}", headers=auth_headers).status_code == 204
+        translation_memory.clear()
+        third = client.post("/api/posts/", json=SAMPLE_POST, headers=auth_headers).json()
+        translate_post(third["id"])
+        assert len(translated_texts(libretranslate)) == 2
+
+        post = client.get(f"/api/posts/{third['id']}").json()
+        assert post["is_translated"] is True
+        assert post["translated_cache"]["zh"] == f"[zh-Hans] {SAMPLE_POST['content']}"
+        assert translation_memory.get_stats()["db_hits"] == 2
+
+    def test_edit_reuses_memory_for_known_content(self, client, auth_headers, libretranslate):
+        from app.translator import translate_post
+
+        post = client.post("/api/posts/", json=SAMPLE_POST, headers=auth_headers).json()
+        translate_post(post["id"])
+
+        # 本文を変えると古い翻訳は消える
+        edited = dict(SAMPLE_POST, content="編集後の本文です。")
+        body = client.put(f"/api/posts/{post['id']}", json=edited, headers=auth_headers).json()
+        assert body["is_translated"] is False
+        assert body["translated_cache"] is None
+
+        # 元の本文に戻すと、LibreTranslate を呼ばずにメモリから翻訳が戻る
+        body = client.put(f"/api/posts/{post['id']}", json=SAMPLE_POST, headers=auth_headers).json()
+        assert body["is_translated"] is True
+        assert body["translated_cache"]["en"] == f"[en] {SAMPLE_POST['content']}"
+        assert len(translated_texts(libretranslate)) == 2
+
+
+class TestTranslationClient:
+    def test_posts_are_batched_per_language_pair(self, client, auth_headers, libretranslate):
+        from app.translator import translate_posts
+
+        ids = []
+        for i in range(3):
+            body = dict(SAMPLE_POST, content=f"本文 {i}")
+            ids.append(client.post("/api/posts/", json=body, headers=auth_headers).json()["id"])
+        translate_posts(ids)
+
+        # 3 投稿 × 2 言語が、言語ごとに 1 回の呼び出しにまとまる
+        assert sorted((req["target"], len(req["q"])) for req in libretranslate.requests) == [("en", 3), ("zh-Hans", 3)]
+        post = client.get(f"/api/posts/{ids[1]}").json()
+        assert post["translated_cache"] == {"en": "[en] 本文 1", "zh": "[zh-Hans] 本文 1"}
+
+    def test_target_languages_run_concurrently(self, libretranslate):
+        import time
+
+        libretranslate.app.state.latency = 0.3
+        started = time.perf_counter()
+        result = libretranslate.client.translate_many(["こんにちは"], "ja", ["en", "zh-Hans"])
+        elapsed = time.perf_counter() - started
+
+        assert result == {"en": ["[en] こんにちは"], "zh-Hans": ["[zh-Hans] こんにちは"]}
+        assert libretranslate.app.state.max_in_flight == 2
+        assert elapsed < 0.55
+
+    def test_retries_transient_errors(self, libretranslate):
+        libretranslate.app.state.fail_next = 1
+        assert libretranslate.client.translate("こんにちは", "ja", "en") == "[en] こんにちは"
+        assert libretranslate.client.get_stats()["retries"] == 1
+
+    def test_timeout_gives_up(self, libretranslate):
+        from app.services.translation_client import LibreTranslateClient
+
+        libretranslate.app.state.latency = 0.5
+        impatient = LibreTranslateClient(libretranslate.url, timeout=0.1, max_retries=1, backoff=0.01)
+        try:
+            assert impatient.translate("こんにちは", "ja", "en") is None
+            assert impatient.get_stats()["failures"] == 1
+            assert impatient.get_stats()["requests"] == 2
+        finally:
+            impatient.close()
+
+
+class TestSegmentTranslation:
+    def test_split_sentences_round_trips(self):
+        from app.utils.segmenter import split_sentences
+
+        cases = [
+            ("今日は晴れ。散歩に行った！\n楽しかった「ね」。", "ja", ["今日は晴れ。", "散歩に行った！", "楽しかった「ね」。"]),
+            ("你好。我很好！", "zh", ["你好。", "我很好！"]),
+            ("Hi Mr. Smith. I moved to the U.S. last year! Pi is 3.14 ok", "en",
+             ["Hi Mr. Smith.", "I moved to the U.S. last year!", "Pi is 3.14 ok"]),
+        ]
+        for text, lang, expected in cases:
+            segments = split_sentences(text, lang)
+            assert [segment.text for segment in segments] == expected
+            assert "".join(segment.text + segment.trailing for segment in segments) == text
+
+    def test_only_new_sentences_are_sent(self, client, auth_headers, libretranslate):
+        from app.translator import translate_post
+        from app.services.segment_translation import segment_translator
+
+        before = segment_translator.get_stats()
+        first = dict(SAMPLE_POST, content="おはようございます。今日は雨です。")
+        translate_post(client.post("/api/posts/", json=first, headers=auth_headers).json()["id"])
+        assert len(translated_texts(libretranslate)) == 4
+
+        # 共通の文はメモリから、新しい文だけを翻訳する
+        libretranslate.requests.clear()
+        second = dict(SAMPLE_POST, content="おはようございます。\n明日は晴れです。")
+        post_id = client.post("/api/posts/", json=second, headers=auth_headers).json()["id"]
+        translate_post(post_id)
+        assert sorted(translated_texts(libretranslate)) == [("en", "明日は晴れです。"), ("zh-Hans", "明日は晴れです。")]
+
+        post = client.get(f"/api/posts/{post_id}").json()
+        assert post["translated_cache"]["en"] == "[en] おはようございます。\n[en] 明日は晴れです。"
+        stats = client.get("/health/translation-memory").json()["segments"]
+        assert stats["segments"] - before["segments"] == 8
+        assert stats["segment_hits"] - before["segment_hits"] == 2
+        assert stats["segments_sent"] - before["segments_sent"] == 6
+
+    def test_shared_sentences_are_deduplicated_in_one_call(self, client, auth_headers, libretranslate):
+        from app.translator import translate_posts
+
+        ids = []
+        for content in ["ありがとう。一つ目です。", "ありがとう。二つ目です。"]:
+            body = dict(SAMPLE_POST, content=content)
+            ids.append(client.post("/api/posts/", json=body, headers=auth_headers).json()["id"])
+        translate_posts(ids, "en")
+
+        assert [req["q"] for req in libretranslate.requests] == [["ありがとう。", "一つ目です。", "二つ目です。"]]
+        post = client.get(f"/api/posts/{ids[1]}").json()
+        assert post["translated_cache"] == {"en": "[en] ありがとう。 [en] 二つ目です。"}
+
+    def test_failed_sentence_keeps_post_untranslated(self, client, auth_headers, libretranslate):
+        from app.translator import translate_post
+
+        libretranslate.client.max_retries = 0
+        libretranslate.app.state.fail_next = 2
+        body = dict(SAMPLE_POST, content="失敗する文。もう一つの文。")
+        post_id = client.post("/api/posts/", json=body, headers=auth_headers).json()["id"]
+        translate_post(post_id)
+        assert client.get(f"/api/posts/{post_id}").json()["is_translated"] is False
+
+
+class TestOnDemandTranslation:
+    def test_without_lang_returns_all_translations(self, client, auth_headers, libretranslate):
+        from app.translator import translate_post
+
+        post = client.post("/api/posts/", json=SAMPLE_POST, headers=auth_headers).json()
+        translate_post(post["id"])
+        body = client.get(f"/api/posts/{post['id']}").json()
+        assert set(body["translated_cache"]) == {"en", "zh"}
+        assert body["translation_status"] is None
+
+    def test_returns_only_requested_language(self, client, auth_headers, libretranslate):
+        from app.translator import translate_post
+
+        post = client.post("/api/posts/", json=SAMPLE_POST, headers=auth_headers).json()
+        translate_post(post["id"])
+        calls = len(libretranslate.requests)
+
+        body = client.get(f"/api/posts/{post['id']}?lang=en").json()
+        assert body["translated_cache"] == {"en": f"[en] {SAMPLE_POST['content']}"}
+        assert body["translation_status"] == "ready"
+        assert client.get(f"/api/posts/{post['id']}?lang=ja").json()["translation_status"] == "original"
+        assert len(libretranslate.requests) == calls
+
+        feed = client.get("/api/posts/?lang=zh").json()
+        assert feed[0]["translated_cache"] == {"zh": f"[zh-Hans] {SAMPLE_POST['content']}"}
+
+    def test_concurrent_misses_share_one_translation(self, client, auth_headers, libretranslate):
+        """同じ (投稿, 言語) への同時リクエストは 1 回の翻訳を共有する"""
+        import asyncio
+        import httpx
+        from app.main import app
+        from app.database import get_db
+        from tests.conftest import TestingSessionLocal
+
+        post = client.post("/api/posts/", json=SAMPLE_POST, headers=auth_headers).json()
+        libretranslate.app.state.latency = 0.3
+
+        def session_per_request():
+            db = TestingSessionLocal()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        async def burst(n):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+                return await asyncio.gather(*(ac.get(f"/api/posts/{post['id']}?lang=en") for _ in range(n)))
+
+        original = app.dependency_overrides[get_db]
+        app.dependency_overrides[get_db] = session_per_request
+        try:
+            responses = asyncio.run(burst(6))
+        finally:
+            app.dependency_overrides[get_db] = original
+
+        assert all(r.json()["translation_status"] == "ready" for r in responses)
+        assert [req["target"] for req in libretranslate.requests] == ["en"]
+
+    def test_slow_translation_returns_original_as_pending(self, client, auth_headers, libretranslate, monkeypatch):
+        import time
+        from app.services import translation_service
+
+        post = client.post("/api/posts/", json=SAMPLE_POST, headers=auth_headers).json()
+        libretranslate.app.state.latency = 0.5
+        monkeypatch.setattr(translation_service, "TRANSLATION_WAIT_SECONDS", 0.05)
+
+        body = client.get(f"/api/posts/{post['id']}?lang=en").json()
+        assert body["translation_status"] == "pending"
+        assert body["content"] == SAMPLE_POST["content"]
+        assert body["translated_cache"] is None
+
+        deadline = time.monotonic() + 5
+        while translation_service.single_flight.get_stats()["inflight"] and time.monotonic() < deadline:
+            time.sleep(0.05)
+        body = client.get(f"/api/posts/{post['id']}?lang=en").json()
+        assert body["translation_status"] == "ready"
+        assert len(libretranslate.requests) == 1
+
+    def test_failed_translation_is_not_retried_immediately(self, client, auth_headers, libretranslate):
+        post = client.post("/api/posts/", json=SAMPLE_POST, headers=auth_headers).json()
+        libretranslate.app.state.fail_next = 100
+
+        assert client.get(f"/api/posts/{post['id']}?lang=en").json()["translation_status"] == "failed"
+        calls = len(libretranslate.requests)
+        assert client.get(f"/api/posts/{post['id']}?lang=en").json()["translation_status"] == "failed"
+        assert len(libretranslate.requests) == calls
+
+
+class TestBadgeEngine:
+    def _me(self, client, auth_headers):
+        return client.get("/api/auth/me", headers=auth_headers).json()["id"]
+
+    def _awarded(self, client, auth_headers):
+        return {b["badge"]["name"] for b in client.get("/api/badges/me", headers=auth_headers).json()}
+
+    def test_post_events_award_badges(self, client, auth_headers, badges, db_session):
+        from app import models
+        from app.services.badge_queue import badge_queue
+
+        client.post("/api/posts/", json=SAMPLE_POST, headers=auth_headers)
+        # 評価はバックグラウンドで行われ、レスポンスの時点ではまだ付与されていない
+        assert self._awarded(client, auth_headers) == set()
+        badge_queue.flush()
+        assert "first_post" in self._awarded(client, auth_headers)
+        assert "polyglot" not in self._awarded(client, auth_headers)
+
+        client.post("/api/posts/", json=dict(SAMPLE_POST, source_language="zh"), headers=auth_headers)
+        badge_queue.flush()
+        assert "polyglot" in self._awarded(client, auth_headers)
+
+        progress = db_session.get(models.UserBadgeProgress, self._me(client, auth_headers))
+        assert progress.post_count == 2
+        assert progress.languages == "ja,zh"
+        assert progress.current_streak == 1
+        assert set(progress.awarded.split(",")) >= {"first_post", "polyglot"}
+
+    def test_streak_and_likes_are_counted_incrementally(self, client, auth_headers, badges, db_session):
+        from datetime import datetime, timedelta
+        from app import models
+        from app.services.badge_service import check_badges_for_user, record_event
+
+        user_id = self._me(client, auth_headers)
+        # 計数行を作っておく（無い場合は履歴から作り直され、そのイベントは履歴に含まれているものとして扱う）
+        check_badges_for_user(user_id, db_session)
+        start = datetime(2026, 3, 1, 12)
+        for day in [0, 1, 1, 2, 3]:
+            record_event(db_session, "post_created", user_id, at=start + timedelta(days=day), language="ja")
+        assert "streak_poster" not in self._awarded(client, auth_headers)
+        assert record_event(db_session, "post_created", user_id, at=start + timedelta(days=4)) == ["streak_poster"]
+
+        for _ in range(9):
+            record_event(db_session, "like_received", user_id)
+        record_event(db_session, "like_received", user_id, delta=-1)
+        assert record_event(db_session, "like_received", user_id) == []
+        assert record_event(db_session, "like_received", user_id) == ["heart_collector"]
+
+        progress = db_session.get(models.UserBadgeProgress, user_id)
+        assert (progress.post_count, progress.longest_streak, progress.likes_received) == (6, 5, 10)
+
+    def test_event_cost_does_not_grow_with_history(self, client, auth_headers, badges, db_session):
+        from sqlalchemy import event
+        from app.services.badge_queue import badge_queue
+        from app.services.badge_service import record_event
+        from tests.conftest import engine
+
+        user_id = self._me(client, auth_headers)
+        record_event(db_session, "like_received", user_id)
+
+        def statements_for_like():
+            seen = []
+            listener = lambda *args: seen.append(args[2])
+            event.listen(engine, "before_cursor_execute", listener)
+            try:
+                record_event(db_session, "like_received", user_id)
+            finally:
+                event.remove(engine, "before_cursor_execute", listener)
+            return len(seen)
+
+        few = statements_for_like()
+        for i in range(30):
+            client.post("/api/posts/", json=dict(SAMPLE_POST, title=f"投稿 {i}"), headers=auth_headers)
+        badge_queue.flush()
+        assert statements_for_like() == few
+
+    def test_backfill_rebuilds_progress_from_history(self, client, auth_headers, badges, db_session):
+        from datetime import datetime, timedelta
+        from app import models
+        from app.services.badge_service import backfill
+
+        user_id = self._me(client, auth_headers)
+        start = datetime(2026, 3, 1, 3)
+        for day in range(5):
+            db_session.add(models.Post(title="t", content="c", source_language="ja", author_id=user_id,
+                                       created_at=start + timedelta(days=day)))
+        db_session.add(models.Post(title="t", content="c", source_language="en", author_id=user_id,
+                                   created_at=start + timedelta(days=10, hours=12)))
+        db_session.commit()
+        assert self._awarded(client, auth_headers) == set()
+
+        assert backfill(db_session, batch_size=1) == (1, 4)
+        progress = db_session.get(models.UserBadgeProgress, user_id)
+        assert (progress.post_count, progress.night_post_count, progress.languages) == (6, 5, "en,ja")
+        assert (progress.current_streak, progress.longest_streak) == (1, 5)
+        assert self._awarded(client, auth_headers) == {"first_post", "night_owl", "streak_poster", "polyglot"}
+
+
+class TestBadgeBackfill:
+    def _users_with_posts(self, db_session, count):
+        from app import models
+
+        users = [models.User(email=f"backfill{i}@example.com", password_hash="x", nickname=f"user {i}") for i in range(count)]
+        db_session.add_all(users)
+        db_session.flush()
+        db_session.add_all(models.Post(title="t", content="c", source_language="ja", author_id=user.id) for user in users)
+        db_session.commit()
+        return [user.id for user in users]
+
+    def _badge_counts(self, db_session):
+        from sqlalchemy import func
+        from app import models
+
+        return dict(db_session.query(models.UserBadge.user_id, func.count()).group_by(models.UserBadge.user_id))
+
+    def test_resumes_from_checkpoint(self, client, badges, db_session, tmp_path):
+        import json
+        from app.services.badge_service import backfill
+
+        ids = self._users_with_posts(db_session, 3)
+        checkpoint = tmp_path / "backfill.checkpoint"
+        checkpoint.write_text(json.dumps({"last_id": ids[0], "users": 1, "awarded": 1}))
+
+        assert backfill(db_session, batch_size=1, checkpoint=str(checkpoint)) == (2, 2)
+        # チェックポイントより前のユーザーは処理しない
+        assert self._badge_counts(db_session) == {ids[1]: 1, ids[2]: 1}
+        assert not checkpoint.exists()
+
+    def test_parallel_workers_award_in_bulk(self, client, badges, db_session, tmp_path):
+        from app import models
+        from app.services.badge_service import backfill
+
+        ids = self._users_with_posts(db_session, 5)
+        checkpoint = tmp_path / "backfill.checkpoint"
+        assert backfill(db_session, batch_size=2, workers=2, checkpoint=str(checkpoint)) == (5, 5)
+        assert self._badge_counts(db_session) == {user_id: 1 for user_id in ids}
+        assert db_session.query(models.UserBadgeProgress).count() == 5
+
+        # 再実行しても重複して付与しない
+        assert backfill(db_session, batch_size=2, workers=2, checkpoint=str(checkpoint)) == (5, 0)
+
+
+class TestBadgeRules:
+    def test_set_based_rules_match_progress(self, client, auth_headers, db_session):
+        from datetime import datetime, timedelta
+        from app import models
+        from app.services.badge_service import RULES, compute_progress, qualified_badges
+
+        user_id = client.get("/api/auth/me", headers=auth_headers).json()["id"]
+        start = datetime(2026, 3, 1, 12)
+        # 0-2 日目と 4-8 日目の 2 つの連続（最長 5 日、最後の連続も 5 日）
+        for day in [0, 1, 2, 4, 5, 6, 7, 8, 8]:
+            db_session.add(models.Post(title="t", content="c", author_id=user_id,
+                                       source_language="ja" if day < 8 else "en", created_at=start + timedelta(days=day)))
+        db_session.commit()
+
+        progress = compute_progress(db_session, [user_id])[user_id]
+        assert (progress["longest_streak"], progress["current_streak"]) == (5, 5)
+        assert progress["last_post_date"] == (start + timedelta(days=8)).date()
+        assert qualified_badges(db_session, [user_id])[user_id] == {"first_post", "streak_poster", "polyglot"}
+
+        row = models.UserBadgeProgress(**progress)
+        assert {rule.name for rule in RULES if rule.reached(row)} == qualified_badges(db_session, [user_id])[user_id]
+
+    def test_broken_streak_is_not_qualified(self, client, auth_headers, db_session):
+        from datetime import datetime, timedelta
+        from app import models
+        from app.services.badge_service import compute_progress, qualified_badges
+
+        user_id = client.get("/api/auth/me", headers=auth_headers).json()["id"]
+        start = datetime(2026, 3, 1, 12)
+        for day in [0, 1, 2, 3, 5, 6]:
+            db_session.add(models.Post(title="t", content="c", author_id=user_id, source_language="ja",
+                                       created_at=start + timedelta(days=day)))
+        db_session.commit()
+
+        progress = compute_progress(db_session, [user_id])[user_id]
+        assert (progress["longest_streak"], progress["current_streak"]) == (4, 2)
+        assert "streak_poster" not in qualified_badges(db_session, [user_id])[user_id]
+
+
+class TestBadgeQueue:
+    def test_like_burst_is_evaluated_once(self, client, auth_headers, badges, db_session):
+        from app.services.badge_queue import badge_queue
+        from app.services.badge_service import check_badges_for_user
+
+        post = client.post("/api/posts/", json=SAMPLE_POST, headers=auth_headers).json()
+        author_id = post["author_id"]
+        badge_queue.flush()
+        check_badges_for_user(author_id, db_session)
+
+        # いいねのエンドポイントは評価せずにキューへ積むだけ
+        assert client.post(f"/api/posts/{post['id']}/like", headers=auth_headers).status_code == 200
+        for _ in range(49):
+            badge_queue.enqueue("like_received", author_id)
+        before = badge_queue.get_stats()
+        assert before["pending_users"] == 1
+        assert before["pending_events"] == 50
+
+        badge_queue.flush()
+        stats = client.get("/health/badges").json()
+        assert stats["evaluations"] - before["evaluations"] == 1
+        assert stats["pending_events"] == 0
+        assert stats["mode"] == "in_process"
+        awarded = {b["badge"]["name"] for b in client.get("/api/badges/me", headers=auth_headers).json()}
+        assert "heart_collector" in awarded
+
+    def test_in_process_worker_runs_after_debounce(self, client, auth_headers, badges, monkeypatch):
+        import time
+        from app.services.badge_queue import badge_queue
+
+        monkeypatch.setattr(badge_queue, "debounce", 0.05)
+        before = badge_queue.get_stats()["evaluations"]
+        client.post("/api/posts/", json=SAMPLE_POST, headers=auth_headers)
+
+        deadline = time.monotonic() + 5
+        while badge_queue.get_stats()["evaluations"] == before and time.monotonic() < deadline:
+            time.sleep(0.02)
+        stats = badge_queue.get_stats()
+        assert stats["evaluations"] == before + 1
+        assert stats["wait_seconds_max"] >= 0.05
+        awarded = {b["badge"]["name"] for b in client.get("/api/badges/me", headers=auth_headers).json()}
+        assert "first_post" in awarded
+
+
+class TestNotificationGroups:
+    def test_likes_on_one_post_become_one_notification(self, client, auth_headers, db_session):
+        from app import models
+
+        post_id = client.post("/api/posts/", json=SAMPLE_POST, headers=auth_headers).json()["id"]
+        likers = []
+        for i in range(5):
+            headers = other_user_headers(client, f"liker{i}@example.com")
+            likers.append(client.get("/api/auth/me", headers=headers).json()["id"])
+            client.post(f"/api/posts/{post_id}/like", headers=headers)
+        # いいねを取り消してもう一度押しても人数は増えない
+        client.delete(f"/api/posts/{post_id}/like", headers=headers)
+        client.post(f"/api/posts/{post_id}/like", headers=headers)
+
+        assert db_session.query(models.Notification).count() == 1
+        notifications = client.get("/api/notifications/", headers=auth_headers).json()
+        assert len(notifications) == 1
+        group = notifications[0]
+        assert (group["type"], group["target_id"], group["actor_count"]) == ("like", post_id, 5)
+        assert group["actor"]["id"] == likers[-1]
+        assert [a["id"] for a in group["actors"]] == likers[::-1][:3]
+        assert client.get("/api/notifications/unread/count", headers=auth_headers).json() == {"count": 1}
+
+    def test_groups_split_by_type_target_and_read_state(self, client, auth_headers):
+        first = client.post("/api/posts/", json=SAMPLE_POST, headers=auth_headers).json()["id"]
+        second = client.post("/api/posts/", json=SAMPLE_POST, headers=auth_headers).json()["id"]
+        a = other_user_headers(client, "a@example.com")
+        b = other_user_headers(client, "b@example.com")
+        client.post(f"/api/posts/{first}/like", headers=a)
+        client.post(f"/api/favorites/posts/{first}", headers=a)
+        client.post(f"/api/posts/{second}/like", headers=a)
+        client.put("/api/notifications/read-all", headers=auth_headers)
+        # 既読になった通知にはまとめず、新しい通知を作る
+        client.post(f"/api/posts/{first}/like", headers=b)
+
+        notifications = client.get("/api/notifications/", headers=auth_headers).json()
+        assert len(notifications) == 4
+        newest = notifications[0]
+        assert (newest["type"], newest["target_id"], newest["actor_count"], newest["read"]) == ("like", first, 1, False)
+
+    def test_follows_and_comments_are_grouped(self, client, auth_headers):
+        me = client.get("/api/auth/me", headers=auth_headers).json()["id"]
+        post_id = client.post("/api/posts/", json=SAMPLE_POST, headers=auth_headers).json()["id"]
+        for email in ("a@example.com", "b@example.com"):
+            headers = other_user_headers(client, email)
+            client.post(f"/api/users/{me}/follow", headers=headers)
+            client.post("/api/comments/", json={"post_id": post_id, "content": "コメント"}, headers=headers)
+            client.post("/api/comments/", json={"post_id": post_id, "content": "もう一つ"}, headers=headers)
+
+        groups = {n["type"]: n for n in client.get("/api/notifications/", headers=auth_headers).json()}
+        assert set(groups) == {"follow", "comment"}
+        assert groups["follow"]["actor_count"] == 2
+        assert groups["follow"]["target_id"] == me
+        assert groups["comment"]["actor_count"] == 2
+
+    def test_window_zero_disables_grouping(self, client, auth_headers, monkeypatch):
+        from app import notifications
+
+        monkeypatch.setattr(notifications, "NOTIFICATION_GROUP_WINDOW_SECONDS", 0)
+        post_id = client.post("/api/posts/", json=SAMPLE_POST, headers=auth_headers).json()["id"]
+        for email in ("a@example.com", "b@example.com"):
+            client.post(f"/api/posts/{post_id}/like", headers=other_user_headers(client, email))
+
+        notifications_out = client.get("/api/notifications/", headers=auth_headers).json()
+        assert [n["actor_count"] for n in notifications_out] == [1, 1]
+        assert all(len(n["actors"]) == 1 for n in notifications_out)
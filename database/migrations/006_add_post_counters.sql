@@ -0,0 +1,17 @@
+-- 为帖子添加反规范化计数字段（点赞数 / 评论数 / 收藏数）
+-- Migration: 006_add_post_counters.sql
+
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS like_count INT NOT NULL DEFAULT 0;
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS comment_count INT NOT NULL DEFAULT 0;
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS favorite_count INT NOT NULL DEFAULT 0;
+
+-- 用现有数据回填计数
+UPDATE posts p SET
+  like_count = (SELECT COUNT(*) FROM likes l WHERE l.post_id = p.id),
+  comment_count = (SELECT COUNT(*) FROM comments c WHERE c.post_id = p.id),
+  favorite_count = (SELECT COUNT(*) FROM favorites f WHERE f.post_id = p.id);
+
+-- 添加注释
+COMMENT ON COLUMN posts.like_count IS 'Number of likes, kept in sync on write';
+COMMENT ON COLUMN posts.comment_count IS 'Number of comments, kept in sync on write';
+COMMENT ON COLUMN posts.favorite_count IS 'Number of favorites, kept in sync on write';
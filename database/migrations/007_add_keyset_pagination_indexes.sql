@@ -0,0 +1,8 @@
+-- 为游标（keyset）分页添加复合索引
+-- Migration: 007_add_keyset_pagination_indexes.sql
+-- 列表按 (created_at DESC, id DESC) 排序，B-tree 索引可反向扫描
+
+CREATE INDEX IF NOT EXISTS idx_posts_created_id ON posts (created_at, id);
+CREATE INDEX IF NOT EXISTS idx_items_created_id ON items (created_at, id);
+CREATE INDEX IF NOT EXISTS idx_favorites_user_created_id ON favorites (user_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_notifications_user_created_id ON notifications (user_id, created_at, id);
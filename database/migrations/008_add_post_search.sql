@@ -0,0 +1,19 @@
+-- 帖子全文检索：应用层分词 + tsvector 生成列 + GIN 索引
+-- Migration: 008_add_post_search.sql
+-- 分词（CJK bigram / 小写单词）由后端 services/search_service.py 完成并写入 search_title / search_body，
+-- 历史数据在后端启动时自动回填，也可手动执行: python -m app.services.search_service
+
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS search_title TEXT;
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS search_body TEXT;
+
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+  setweight(to_tsvector('simple', coalesce(search_title, '')), 'A') ||
+  setweight(to_tsvector('simple', coalesce(search_body, '')), 'B')
+) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_posts_search_vector ON posts USING GIN (search_vector);
+
+-- 添加注释
+COMMENT ON COLUMN posts.search_title IS 'Space separated search tokens of the title';
+COMMENT ON COLUMN posts.search_body IS 'Space separated search tokens of the content';
+COMMENT ON COLUMN posts.search_vector IS 'Weighted tsvector (title A, body B) for full-text search';
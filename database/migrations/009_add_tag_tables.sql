@@ -0,0 +1,55 @@
+-- 规范化标签：tags / post_tags / item_tags，并从逗号分隔字符串回填
+-- Migration: 009_add_tag_tables.sql
+-- 也可以在后端执行: python -m app.services.tag_service
+
+CREATE TABLE IF NOT EXISTS tags (
+  id SERIAL PRIMARY KEY,
+  name VARCHAR UNIQUE NOT NULL,
+  post_count INT NOT NULL DEFAULT 0,
+  item_count INT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS post_tags (
+  post_id INT REFERENCES posts(id) ON DELETE CASCADE,
+  tag_id INT REFERENCES tags(id) ON DELETE CASCADE,
+  PRIMARY KEY(post_id, tag_id)
+);
+
+CREATE TABLE IF NOT EXISTS item_tags (
+  item_id INT REFERENCES items(id) ON DELETE CASCADE,
+  tag_id INT REFERENCES tags(id) ON DELETE CASCADE,
+  PRIMARY KEY(item_id, tag_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_post_tags_tag_post ON post_tags(tag_id, post_id);
+CREATE INDEX IF NOT EXISTS idx_item_tags_tag_item ON item_tags(tag_id, item_id);
+
+-- 回填标签名
+INSERT INTO tags (name)
+SELECT DISTINCT left(trim(t), 64) FROM posts, unnest(string_to_array(posts.tags, ',')) AS t
+WHERE trim(t) <> ''
+UNION
+SELECT DISTINCT left(trim(t), 64) FROM items, unnest(string_to_array(items.tags, ',')) AS t
+WHERE trim(t) <> ''
+ON CONFLICT (name) DO NOTHING;
+
+-- 回填关联
+INSERT INTO post_tags (post_id, tag_id)
+SELECT DISTINCT p.id, tg.id
+FROM posts p, unnest(string_to_array(p.tags, ',')) AS t
+JOIN tags tg ON tg.name = left(trim(t), 64)
+ON CONFLICT DO NOTHING;
+
+INSERT INTO item_tags (item_id, tag_id)
+SELECT DISTINCT i.id, tg.id
+FROM items i, unnest(string_to_array(i.tags, ',')) AS t
+JOIN tags tg ON tg.name = left(trim(t), 64)
+ON CONFLICT DO NOTHING;
+
+-- 回填计数
+UPDATE tags SET
+  post_count = (SELECT COUNT(*) FROM post_tags pt WHERE pt.tag_id = tags.id),
+  item_count = (SELECT COUNT(*) FROM item_tags it WHERE it.tag_id = tags.id);
+
+-- 旧的 GIN 索引（to_tsvector('english', tags)）从未被查询使用
+DROP INDEX IF EXISTS idx_posts_tags;
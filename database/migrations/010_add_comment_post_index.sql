@@ -0,0 +1,4 @@
+-- 评论按帖子分页 / 最新评论预览用的复合索引
+-- Migration: 010_add_comment_post_index.sql
+
+CREATE INDEX IF NOT EXISTS idx_comments_post_created_id ON comments (post_id, created_at, id);
@@ -0,0 +1,22 @@
+-- 全文检索：英文帖子使用 'english' 配置，CJK 单字可检索
+-- Migration: 011_search_unigrams_and_english_config.sql
+-- search_vector 原来只用 'simple' 配置；生成列的表达式不能直接修改，需要删除后重建（GIN 索引随之重建）。
+-- 检索文本里新增了 CJK 单字（unigram）：这里清空旧的检索文本，后端启动时自动重建，
+-- 也可手动执行: python -m app.services.search_service
+
+ALTER TABLE posts DROP COLUMN IF EXISTS search_vector;
+UPDATE posts SET search_title = NULL, search_body = NULL;
+
+ALTER TABLE posts ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+  CASE WHEN source_language = 'en' THEN
+    setweight(to_tsvector('english', coalesce(search_title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(search_body, '')), 'B')
+  ELSE
+    setweight(to_tsvector('simple', coalesce(search_title, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(search_body, '')), 'B')
+  END
+) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_posts_search_vector ON posts USING GIN (search_vector);
+
+COMMENT ON COLUMN posts.search_vector IS 'Weighted tsvector (title A, body B); english config for en posts, simple otherwise';
@@ -0,0 +1,30 @@
+-- 评论树：物化路径 + 层级 + 线程根
+-- Migration: 012_add_comment_tree.sql
+-- path 为祖先链上每个 id 补零到 10 位后以 '/' 连接（含自身），按 path 排序即为树的先序。
+-- 新评论由后端写入；历史评论在这里用递归 CTE 一次性回填（后端启动时也会补齐遗漏的行）。
+
+ALTER TABLE comments ADD COLUMN IF NOT EXISTS path VARCHAR(1024);
+ALTER TABLE comments ADD COLUMN IF NOT EXISTS depth INT NOT NULL DEFAULT 0;
+ALTER TABLE comments ADD COLUMN IF NOT EXISTS root_id INT;
+
+WITH RECURSIVE tree AS (
+  SELECT id, lpad(id::text, 10, '0') || '/' AS path, 0 AS depth, id AS root_id
+  FROM comments
+  WHERE parent_id IS NULL
+  UNION ALL
+  SELECT c.id, t.path || lpad(c.id::text, 10, '0') || '/', t.depth + 1, t.root_id
+  FROM comments c
+  JOIN tree t ON c.parent_id = t.id
+)
+UPDATE comments
+SET path = tree.path, depth = tree.depth, root_id = tree.root_id
+FROM tree
+WHERE comments.id = tree.id AND comments.path IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_comments_root_path ON comments (root_id, path);
+-- LIKE 'prefix%' 子树查询需要 text_pattern_ops
+CREATE INDEX IF NOT EXISTS idx_comments_path ON comments (path text_pattern_ops);
+
+COMMENT ON COLUMN comments.path IS 'Materialized path of zero padded ancestor ids, ''/'' terminated';
+COMMENT ON COLUMN comments.depth IS 'Nesting level, 0 for top-level comments';
+COMMENT ON COLUMN comments.root_id IS 'Top-level comment of the thread';
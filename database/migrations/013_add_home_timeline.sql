@@ -0,0 +1,26 @@
+-- 关注时间线：粉丝数（反规范化）+ 时间线表
+-- Migration: 013_add_home_timeline.sql
+-- 粉丝数超过 TIMELINE_FANOUT_THRESHOLD 的作者读时拉取，其余作者发帖时写入粉丝的时间线。
+-- 时间线可随时重建: python -m app.services.timeline_service（表为空时后端启动也会自动重建）
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS follower_count INT NOT NULL DEFAULT 0;
+
+UPDATE users SET follower_count = sub.cnt
+FROM (SELECT following_id, COUNT(*) AS cnt FROM follows GROUP BY following_id) sub
+WHERE users.id = sub.following_id AND users.follower_count <> sub.cnt;
+
+CREATE INDEX IF NOT EXISTS idx_follows_following_follower ON follows (following_id, follower_id);
+
+CREATE TABLE IF NOT EXISTS timeline_entries (
+  user_id INT REFERENCES users(id) ON DELETE CASCADE,
+  post_id INT REFERENCES posts(id) ON DELETE CASCADE,
+  author_id INT NOT NULL,
+  created_at TIMESTAMPTZ NOT NULL,
+  PRIMARY KEY(user_id, post_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_timeline_user_created_post ON timeline_entries (user_id, created_at, post_id);
+CREATE INDEX IF NOT EXISTS idx_timeline_user_author ON timeline_entries (user_id, author_id);
+
+COMMENT ON COLUMN users.follower_count IS 'Denormalized follower count, maintained on follow/unfollow';
+COMMENT ON TABLE timeline_entries IS 'Per-user home timeline (fan-out on write), bounded by TIMELINE_MAX_LENGTH';
@@ -0,0 +1,18 @@
+-- 热门排行：定时任务预计算的分数和排名
+-- Migration: 014_add_post_scores.sql
+-- 由 app/services/ranking_service.py 每 HOT_SCORE_INTERVAL_SECONDS 秒整体重写（Celery beat 或进程内调度器）。
+-- 手动重算: python -m app.services.ranking_service
+
+CREATE TABLE IF NOT EXISTS post_scores (
+  post_id INT PRIMARY KEY REFERENCES posts(id) ON DELETE CASCADE,
+  category VARCHAR(50),
+  score DOUBLE PRECISION NOT NULL,
+  rank INT NOT NULL,
+  category_rank INT NOT NULL,
+  computed_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_post_scores_rank ON post_scores (rank);
+CREATE INDEX IF NOT EXISTS idx_post_scores_category_rank ON post_scores (category, category_rank);
+
+COMMENT ON TABLE post_scores IS 'Precomputed hot ranking over the last HOT_WINDOW_DAYS days, rewritten on a schedule';
@@ -0,0 +1,19 @@
+-- 行版本号：ETag / Last-Modified（条件 GET 返回 304）
+-- Migration: 015_add_row_versions.sql
+-- version 由 ORM 在每次 UPDATE 时 +1，updated_at 同时刷新（见 app/models.py、app/utils/conditional.py）。
+-- 已有行的 updated_at 取 created_at。
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS version INT NOT NULL DEFAULT 1;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT now();
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS version INT NOT NULL DEFAULT 1;
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT now();
+ALTER TABLE items ADD COLUMN IF NOT EXISTS version INT NOT NULL DEFAULT 1;
+ALTER TABLE items ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT now();
+
+UPDATE users SET updated_at = created_at WHERE created_at IS NOT NULL;
+UPDATE posts SET updated_at = created_at WHERE created_at IS NOT NULL;
+UPDATE items SET updated_at = created_at WHERE created_at IS NOT NULL;
+
+COMMENT ON COLUMN posts.version IS 'Row version, bumped on every UPDATE; ETag validator';
+COMMENT ON COLUMN items.version IS 'Row version, bumped on every UPDATE; ETag validator';
+COMMENT ON COLUMN users.version IS 'Row version, bumped on every UPDATE; ETag validator';
@@ -0,0 +1,14 @@
+-- 翻译记忆：按原文哈希共用的翻译结果
+-- Migration: 016_add_translation_memory.sql
+-- 由 app/services/translation_memory.py 读写；不引用 posts，删除帖子后记录仍然保留。
+
+CREATE TABLE IF NOT EXISTS translation_memory (
+  text_hash CHAR(64) NOT NULL, -- sha256 hex of the source text
+  source VARCHAR(16) NOT NULL, -- LibreTranslate language code, may be 'auto'
+  target VARCHAR(16) NOT NULL,
+  translated_text TEXT NOT NULL,
+  created_at TIMESTAMPTZ DEFAULT now(),
+  PRIMARY KEY (text_hash, source, target)
+);
+
+COMMENT ON TABLE translation_memory IS 'LibreTranslate results keyed by (sha256(text), source, target), shared across posts and edits';
@@ -0,0 +1,20 @@
+-- 徽章进度计数：由徽章事件增量维护
+-- Migration: 017_add_user_badge_progress.sql
+-- 由 app/services/badge_service.py 读写；上线后运行一次 `python -m app.services.badge_service backfill` 从历史数据重建。
+
+CREATE TABLE IF NOT EXISTS user_badge_progress (
+  user_id INT PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+  post_count INT NOT NULL DEFAULT 0,
+  night_post_count INT NOT NULL DEFAULT 0, -- posts created between 0:00 and 6:00
+  languages VARCHAR NOT NULL DEFAULT '', -- comma-separated source languages seen
+  last_post_date DATE,
+  current_streak INT NOT NULL DEFAULT 0, -- consecutive posting days ending at last_post_date
+  longest_streak INT NOT NULL DEFAULT 0,
+  likes_received INT NOT NULL DEFAULT 0,
+  comment_count INT NOT NULL DEFAULT 0,
+  items_sold INT NOT NULL DEFAULT 0,
+  awarded VARCHAR NOT NULL DEFAULT '', -- comma-separated badge names already awarded
+  updated_at TIMESTAMPTZ DEFAULT now()
+);
+
+COMMENT ON TABLE user_badge_progress IS 'Per-user badge counters updated in O(1) per event; rebuild with the badge_service backfill command';
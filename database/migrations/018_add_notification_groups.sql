@@ -0,0 +1,13 @@
+-- 通知写入时聚合："A 和其他 12 人赞了你的帖子"
+-- Migration: 018_add_notification_groups.sql
+-- 同一 (user_id, type, target_type, target_id) 的 like / favorite / comment / follow 在时间窗口内合并到一条未读通知上
+-- （见 app/notifications.py create_notification）：actor_id 是最近的人，created_at 是最近一次动作的时间。
+-- 已有的通知每条算 1 人，不回填合并。
+
+ALTER TABLE notifications ADD COLUMN IF NOT EXISTS actor_count INT NOT NULL DEFAULT 1;
+ALTER TABLE notifications ADD COLUMN IF NOT EXISTS actor_ids JSON;
+
+CREATE INDEX IF NOT EXISTS idx_notifications_group ON notifications (user_id, type, target_type, target_id, created_at);
+
+COMMENT ON COLUMN notifications.actor_count IS 'Distinct actors merged into this notification';
+COMMENT ON COLUMN notifications.actor_ids IS 'Latest actor ids, newest first (at most NOTIFICATION_GROUP_MAX_ACTORS)';
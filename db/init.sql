@@ -12,6 +12,9 @@ CREATE TABLE IF NOT EXISTS users (
   cover_image_url TEXT,
   bio TEXT,
   role VARCHAR(20) DEFAULT 'user',
+  follower_count INT NOT NULL DEFAULT 0, -- denormalized, decides timeline fan-out on write vs. on read
+  version INT NOT NULL DEFAULT 1, -- bumped on every UPDATE (ETag validator)
+  updated_at TIMESTAMPTZ DEFAULT now(), -- Last-Modified
   created_at TIMESTAMPTZ DEFAULT now()
 );
 
@@ -38,6 +41,22 @@ CREATE TABLE IF NOT EXISTS posts (
   translated_cache JSONB, -- {"ja":"..","zh":"..","en":".."}
   is_translated BOOLEAN DEFAULT FALSE,
   is_anonymous BOOLEAN DEFAULT FALSE,
+  like_count INT NOT NULL DEFAULT 0, -- denormalized counters, maintained on write
+  comment_count INT NOT NULL DEFAULT 0,
+  favorite_count INT NOT NULL DEFAULT 0,
+  search_title TEXT, -- tokenized title (CJK bigrams / lowercased words), written by the API
+  search_body TEXT, -- tokenized content
+  search_vector tsvector GENERATED ALWAYS AS (
+    CASE WHEN source_language = 'en' THEN
+      setweight(to_tsvector('english', coalesce(search_title, '')), 'A') ||
+      setweight(to_tsvector('english', coalesce(search_body, '')), 'B')
+    ELSE
+      setweight(to_tsvector('simple', coalesce(search_title, '')), 'A') ||
+      setweight(to_tsvector('simple', coalesce(search_body, '')), 'B')
+    END
+  ) STORED, -- 'english' for en posts (stemming), 'simple' otherwise
+  version INT NOT NULL DEFAULT 1, -- bumped on every UPDATE (ETag validator)
+  updated_at TIMESTAMPTZ DEFAULT now(), -- Last-Modified
   created_at TIMESTAMPTZ DEFAULT now()
 );
 
@@ -51,6 +70,16 @@ CREATE TABLE IF NOT EXISTS translations (
   UNIQUE(post_id, lang)
 );
 
+-- translation memory (shared by content hash, kept after post deletion)
+CREATE TABLE IF NOT EXISTS translation_memory (
+  text_hash CHAR(64) NOT NULL, -- sha256 hex of the source text
+  source VARCHAR(16) NOT NULL,
+  target VARCHAR(16) NOT NULL,
+  translated_text TEXT NOT NULL,
+  created_at TIMESTAMPTZ DEFAULT now(),
+  PRIMARY KEY(text_hash, source, target)
+);
+
 -- comments
 CREATE TABLE IF NOT EXISTS comments (
   id SERIAL PRIMARY KEY,
@@ -58,6 +87,9 @@ CREATE TABLE IF NOT EXISTS comments (
   author_id INT REFERENCES users(id) ON DELETE SET NULL,
   content TEXT NOT NULL,
   parent_id INT REFERENCES comments(id) ON DELETE CASCADE,
+  path VARCHAR(1024), -- materialized path: zero padded ancestor ids + own id, '/' terminated
+  depth INT NOT NULL DEFAULT 0,
+  root_id INT, -- top-level comment of the thread (own id for top-level comments)
   created_at TIMESTAMPTZ DEFAULT now()
 );
 
@@ -82,9 +114,50 @@ CREATE TABLE IF NOT EXISTS items (
   tags TEXT, -- comma separated
   image_urls TEXT, -- comma separated
   contact_method TEXT,
+  version INT NOT NULL DEFAULT 1, -- bumped on every UPDATE (ETag validator)
+  updated_at TIMESTAMPTZ DEFAULT now(), -- Last-Modified
   created_at TIMESTAMPTZ DEFAULT now()
 );
 
+-- normalized tags (posts.tags / items.tags keep the comma separated display copy)
+CREATE TABLE IF NOT EXISTS tags (
+  id SERIAL PRIMARY KEY,
+  name VARCHAR UNIQUE NOT NULL,
+  post_count INT NOT NULL DEFAULT 0,
+  item_count INT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS post_tags (
+  post_id INT REFERENCES posts(id) ON DELETE CASCADE,
+  tag_id INT REFERENCES tags(id) ON DELETE CASCADE,
+  PRIMARY KEY(post_id, tag_id)
+);
+
+CREATE TABLE IF NOT EXISTS item_tags (
+  item_id INT REFERENCES items(id) ON DELETE CASCADE,
+  tag_id INT REFERENCES tags(id) ON DELETE CASCADE,
+  PRIMARY KEY(item_id, tag_id)
+);
+
+-- home timelines (fan-out on write; rebuildable from posts + follows)
+CREATE TABLE IF NOT EXISTS timeline_entries (
+  user_id INT REFERENCES users(id) ON DELETE CASCADE,
+  post_id INT REFERENCES posts(id) ON DELETE CASCADE,
+  author_id INT NOT NULL,
+  created_at TIMESTAMPTZ NOT NULL, -- copied from posts.created_at
+  PRIMARY KEY(user_id, post_id)
+);
+
+-- hot ranking (rewritten on a schedule by ranking_service)
+CREATE TABLE IF NOT EXISTS post_scores (
+  post_id INT PRIMARY KEY REFERENCES posts(id) ON DELETE CASCADE,
+  category VARCHAR(50),
+  score DOUBLE PRECISION NOT NULL,
+  rank INT NOT NULL, -- 1 = hottest overall
+  category_rank INT NOT NULL, -- 1 = hottest within the category
+  computed_at TIMESTAMPTZ NOT NULL
+);
+
 -- badges relationship
 CREATE TABLE IF NOT EXISTS user_badges (
   user_id INT REFERENCES users(id) ON DELETE CASCADE,
@@ -93,6 +166,22 @@ CREATE TABLE IF NOT EXISTS user_badges (
   PRIMARY KEY(user_id, badge_id)
 );
 
+-- badge progress counters (maintained by badge events, rebuildable from history)
+CREATE TABLE IF NOT EXISTS user_badge_progress (
+  user_id INT PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+  post_count INT NOT NULL DEFAULT 0,
+  night_post_count INT NOT NULL DEFAULT 0,
+  languages VARCHAR NOT NULL DEFAULT '',
+  last_post_date DATE,
+  current_streak INT NOT NULL DEFAULT 0,
+  longest_streak INT NOT NULL DEFAULT 0,
+  likes_received INT NOT NULL DEFAULT 0,
+  comment_count INT NOT NULL DEFAULT 0,
+  items_sold INT NOT NULL DEFAULT 0,
+  awarded VARCHAR NOT NULL DEFAULT '',
+  updated_at TIMESTAMPTZ DEFAULT now()
+);
+
 -- favorites (收藏)
 CREATE TABLE IF NOT EXISTS favorites (
   id SERIAL PRIMARY KEY,
@@ -105,7 +194,20 @@ CREATE TABLE IF NOT EXISTS favorites (
 -- index for posts search
 CREATE INDEX IF NOT EXISTS idx_posts_created ON posts(created_at DESC);
 CREATE INDEX IF NOT EXISTS idx_posts_category ON posts(category);
-CREATE INDEX IF NOT EXISTS idx_posts_tags ON posts USING GIN (to_tsvector('english', coalesce(tags,'')));
+-- composite indexes for keyset (cursor) pagination
+CREATE INDEX IF NOT EXISTS idx_posts_created_id ON posts(created_at, id);
+CREATE INDEX IF NOT EXISTS idx_items_created_id ON items(created_at, id);
+CREATE INDEX IF NOT EXISTS idx_favorites_user_created_id ON favorites(user_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_comments_post_created_id ON comments(post_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_comments_root_path ON comments(root_id, path);
+CREATE INDEX IF NOT EXISTS idx_comments_path ON comments(path text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_posts_search_vector ON posts USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_post_tags_tag_post ON post_tags(tag_id, post_id);
+CREATE INDEX IF NOT EXISTS idx_item_tags_tag_item ON item_tags(tag_id, item_id);
+CREATE INDEX IF NOT EXISTS idx_timeline_user_created_post ON timeline_entries(user_id, created_at, post_id);
+CREATE INDEX IF NOT EXISTS idx_timeline_user_author ON timeline_entries(user_id, author_id);
+CREATE INDEX IF NOT EXISTS idx_post_scores_rank ON post_scores(rank);
+CREATE INDEX IF NOT EXISTS idx_post_scores_category_rank ON post_scores(category, category_rank);
 
 -- Initial Badges Data
 INSERT INTO badges (name, description, icon) VALUES
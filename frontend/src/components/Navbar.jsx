@@ -70,7 +70,12 @@ const Navbar = () => {
 
   // 格式化通知文本
   const formatNotificationText = (notification) => {
-    const actorName = notification.actor?.nickname || notification.actor?.email || 'ユーザー';
+    const latestName = notification.actor?.nickname || notification.actor?.email || 'ユーザー';
+    // 同じ対象への通知はサーバー側で 1 件にまとめられる（actor は最新のユーザー）
+    const others = (notification.actor_count || 1) - 1;
+    const actorName = others > 0
+      ? `${latestName}${(t.notifications?.andOthers || 'ほか{count}人').replace('{count}', others)}`
+      : latestName;
     
     switch (notification.type) {
       case 'like':
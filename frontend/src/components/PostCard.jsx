@@ -15,6 +15,9 @@ const PostCard = ({ post, highlight = false }) => {
     const [showComments, setShowComments] = useState(false);
     const [commentText, setCommentText] = useState('');
     const [lightboxImage, setLightboxImage] = useState(null);
+    // 帖子里只内嵌最新几条评论，展开评论区时再分页加载完整列表（新→旧）
+    const [loadedComments, setLoadedComments] = useState(null);
+    const [commentsCursor, setCommentsCursor] = useState(null);
     const postRef = React.useRef(null);
 
     // 如果被高亮，滚动到该帖子
@@ -51,6 +54,25 @@ const PostCard = ({ post, highlight = false }) => {
         isFavorited: isFavorited
     });
 
+    const loadComments = async (cursor = null) => {
+        try {
+            const res = await client.get(`/posts/${post.id}/comments`, { params: cursor ? { cursor } : {} });
+            setLoadedComments(prev => (cursor && prev ? [...prev, ...res.data] : res.data));
+            setCommentsCursor(res.headers['x-next-cursor'] || null);
+        } catch (error) {
+            console.error('Load comments failed:', error);
+        }
+    };
+
+    React.useEffect(() => {
+        if (showComments) {
+            loadComments();
+        }
+        // eslint-disable-next-line react-hooks/exhaustive-deps
+    }, [showComments, post.comment_count]);
+
+    const visibleComments = loadedComments || post.comments || [];
+
     const handleLike = () => {
         console.log('Like button clicked, post.id:', post.id);
         toggleLike(post.id);
@@ -247,7 +269,7 @@ const PostCard = ({ post, highlight = false }) => {
                     style={{ cursor: user ? 'pointer' : 'not-allowed' }}
                 >
                     <MessageCircle size={20} strokeWidth={2.5} />
-                    <span>{post.comments ? post.comments.length : 0}</span>
+                    <span>{post.comment_count ?? (post.comments ? post.comments.length : 0)}</span>
                 </button>
                 <button 
                     className="action-btn"
@@ -275,9 +297,9 @@ const PostCard = ({ post, highlight = false }) => {
             {showComments && (
                 <div className="comments-section">
                     {/* 显示现有评论 */}
-                    {post.comments && post.comments.length > 0 && (
+                    {visibleComments.length > 0 && (
                         <div className="comments-list">
-                            {post.comments.map((comment) => (
+                            {visibleComments.map((comment) => (
                                 <div key={comment.id} className="comment-item">
                                     <div className="comment-avatar">
                                         <img 
@@ -306,6 +328,12 @@ const PostCard = ({ post, highlight = false }) => {
                         </div>
                     )}
                     
+                    {commentsCursor && (
+                        <button className="btn-load-more" onClick={() => loadComments(commentsCursor)}>
+                            もっと見る
+                        </button>
+                    )}
+                    
                     {/* 评论输入框 */}
                     <div className="comment-input-wrapper">
                         <input